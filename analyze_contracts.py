@@ -1,25 +1,40 @@
 import argparse
+import configparser
 import multiprocessing
+from pathlib import Path
 
 from sqlalchemy import create_engine, text
 
 from code_analyzer.time_locked_contracts import parallel_analysis
 from utils.db import get_inspect_database_uri
+from utils.profiling import clear_profiles, configure_profiler, write_report
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-p', '--para', type=int, help='Number of analyzers', default=2)
+    parser.add_argument('-pf', '--profile', type=float, nargs='?', const=1.0,
+                        help='Profile the analysis of this fraction of the contracts (default: all)', default=None)
     args = parser.parse_args()
 
     analyzer_cnt = args.para
 
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    profile_path = Path(config['profiling']['profile_path'])
+    if args.profile is not None:
+        clear_profiles(profile_path)
+        configure_profiler(args.profile, profile_path, "analyzer")
+
     # fetch contract bytecodes and addresses from the database
     conn = create_engine(get_inspect_database_uri()).connect()
     # fetch only the active contracts whose addresses are stored in contracts_info table
-    query = f"SELECT contracts.contract_address, contracts.bytecode " \
+    query = f"SELECT '0x' || encode(contracts.contract_address, 'hex'), contracts.bytecode " \
             "FROM contracts " \
             "INNER JOIN contracts_info ON contracts.contract_address = contracts_info.contract_address "
     contracts = conn.execute(text(query))
     contracts = [(row[0], row[1]) for row in contracts]
 
     parallel_analysis(contracts=contracts, analyzer_cnt=analyzer_cnt)
+
+    if args.profile is not None:
+        print(f"Stage breakdown written to {write_report(profile_path)}")
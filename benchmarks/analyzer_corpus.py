@@ -0,0 +1,133 @@
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from sqlalchemy import create_engine, text
+
+from code_analyzer.opcodes import OPCODES, ADDRESS
+from inspector.utils import json_dumps, json_loads
+
+# EIP-170 limit on the size of the runtime bytecode
+MAX_CODE_SIZE = 24_576
+TIMESTAMP = OPCODES["TIMESTAMP"][ADDRESS]
+NUMBER = OPCODES["NUMBER"][ADDRESS]
+# EIP-1167 minimal proxy, the 20 bytes of the implementation address go in between
+MINIMAL_PROXY_PREFIX = bytes.fromhex("363d3d373d3d3d363d73")
+MINIMAL_PROXY_SUFFIX = bytes.fromhex("5af43d82803e903d91602b57fd5bf3")
+# solc metadata trailers: ipfs (solc >= 0.6) and bzzr0 (older contracts, skipped by the disassembler)
+IPFS_METADATA = (bytes.fromhex("a2646970667358221220"), bytes.fromhex("64736f6c63430008110033"))
+BZZR_METADATA = (bytes.fromhex("a165627a7a72305820"), bytes.fromhex("0029"))
+
+# rough opcode mix of solc output, the other opcodes share the remaining weight
+OPCODE_WEIGHTS = {
+    "PUSH1": 22, "PUSH2": 9, "PUSH4": 1, "PUSH20": 0.3, "PUSH32": 0.5,
+    "DUP1": 4, "DUP2": 4, "DUP3": 3, "DUP4": 2, "DUP5": 1, "DUP6": 1,
+    "SWAP1": 5, "SWAP2": 3, "SWAP3": 2, "SWAP4": 1,
+    "JUMPDEST": 5, "JUMP": 3, "JUMPI": 3, "POP": 6,
+    "MSTORE": 3, "MLOAD": 3, "SLOAD": 1, "SSTORE": 0.5,
+    "ADD": 3, "SUB": 1.5, "AND": 2, "EQ": 1, "ISZERO": 2, "LT": 1, "GT": 1, "SHL": 1, "SHR": 1,
+    "CALLDATALOAD": 0.5, "CALLER": 0.3, "CALLVALUE": 0.2, "REVERT": 0.5, "RETURN": 0.3, "SHA3": 0.5,
+}
+OTHER_WEIGHT = 0.1
+
+# (count, smallest size, largest size, share of time-locked contracts) of each kind
+CORPUS_MIX = {
+    "proxy": (1000, 45, 1_200, 0.05),
+    "erc20": (1500, 2_000, 8_000, 0.2),
+    "max_size": (150, MAX_CODE_SIZE, MAX_CODE_SIZE, 0.5),
+}
+
+
+def _opcode_table() -> Tuple[List[int], List[float]]:
+    names = [name for name in OPCODES if name not in ("TIMESTAMP", "NUMBER")]
+    weights = [OPCODE_WEIGHTS.get(name, OTHER_WEIGHT) for name in names]
+    return [OPCODES[name][ADDRESS] for name in names], weights
+
+
+def _body(rng: random.Random, size: int, opcodes: List[int], weights: List[float]) -> bytearray:
+    """
+    Generates size bytes of code: a function dispatcher followed by instructions drawn from the opcode mix,
+    without TIMESTAMP or NUMBER instructions (push arguments may still contain those bytes).
+    """
+    code = bytearray(bytes.fromhex("6080604052348015600f57600080fd5b50"))
+    for _ in range(rng.randint(1, max(1, size // 400))):
+        # PUSH4 selector DUP2 EQ PUSH2 destination JUMPI
+        code += b"\x63" + rng.randbytes(4) + b"\x81\x14\x61" + rng.randbytes(2) + b"\x57"
+    while len(code) < size:
+        for opcode in rng.choices(opcodes, weights, k=64):
+            code.append(opcode)
+            if 0x60 <= opcode <= 0x7F:
+                code += rng.randbytes(opcode - 0x5F)
+    del code[size:]
+    return code
+
+
+def _instruction_start(code: bytearray, target: int) -> int:
+    """
+    Returns the start of the instruction at target, so that an opcode placed there is not a push argument.
+    """
+    address = 0
+    while True:
+        length = 1 + (code[address] - 0x5F if 0x60 <= code[address] <= 0x7F else 0)
+        if address + length > target:
+            return address
+        address += length
+
+
+def _contract(rng: random.Random, size: int, time_locked: bool, opcodes: List[int],
+              weights: List[float]) -> bytes:
+    prefix, suffix = BZZR_METADATA if rng.random() < 0.3 else IPFS_METADATA
+    metadata = prefix + rng.randbytes(32) + suffix
+    body = _body(rng, max(1, size - len(metadata)), opcodes, weights)
+    if time_locked:
+        # the disassembler stops at the first time lock opcode, so its position matters
+        body[_instruction_start(body, rng.randrange(len(body)))] = rng.choice((TIMESTAMP, NUMBER))
+    return bytes(body) + metadata
+
+
+def generate_corpus(seed: int = 0, scale: float = 1.0) -> List[Dict]:
+    """
+    Generates a deterministic corpus of runtime bytecodes: minimal and small proxies, token-sized contracts
+    and contracts at the 24 KB limit, a share of them with a time lock opcode.
+    As in real contracts, metadata hashes and unreachable bytes may still decode to one.
+    :param seed: Seed of the generator
+    :param scale: Multiplies the number of contracts of each kind
+    :return: Entries with the kind and the hex bytecode
+    """
+    rng = random.Random(seed)
+    opcodes, weights = _opcode_table()
+    corpus = []
+    for kind, (count, smallest, largest, time_locked_share) in CORPUS_MIX.items():
+        for index in range(max(1, round(count * scale))):
+            time_locked = rng.random() < time_locked_share
+            if kind == "proxy" and index % 2 == 0 and not time_locked:
+                code = MINIMAL_PROXY_PREFIX + rng.randbytes(20) + MINIMAL_PROXY_SUFFIX
+            else:
+                code = _contract(rng, rng.randint(smallest, largest), time_locked, opcodes, weights)
+            corpus.append({"kind": kind, "bytecode": "0x" + code.hex()})
+    return corpus
+
+
+def load_database_corpus(db_uri: str, limit: int) -> List[Dict]:
+    """
+    Loads real bytecodes found by the tlsc inspector, sized into the same kinds as the generated corpus.
+    """
+    engine = create_engine(db_uri)
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT bytecode FROM contracts ORDER BY random() LIMIT :limit"),
+                            {"limit": limit}).all()
+    engine.dispose()
+    corpus = []
+    for (bytecode,) in rows:
+        size = (len(bytecode) - 2) // 2
+        kind = "proxy" if size <= 1_200 else "erc20" if size < 20_000 else "max_size"
+        corpus.append({"kind": kind, "bytecode": bytecode})
+    return corpus
+
+
+def save_corpus(corpus: List[Dict], path: Path) -> None:
+    path.write_bytes(json_dumps(corpus))
+
+
+def load_corpus(path: Path) -> List[Dict]:
+    return json_loads(path.read_bytes())
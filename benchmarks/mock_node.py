@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import random
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from inspector.cache import BlockCache
+
+GAS_LIMIT = 30_000_000
+BASE_FEE_PER_GAS = 20 * 10 ** 9
+BLOCK_REWARD_WEI = 2 * 10 ** 18
+# TIMESTAMP PUSH1 0 SSTORE STOP, flagged by the time lock check
+TIME_LOCK_CODE = "0x4260005500"
+# PUSH1 1 PUSH1 0 SSTORE STOP
+PLAIN_CODE = "0x600160005500"
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha256(":".join(map(str, parts)).encode()).hexdigest()
+
+
+class SyntheticChain:
+    """
+    Deterministic synthetic chain, generated on the fly so that any block range can be served without storing it.
+    Every creation_interval-th transaction creates a contract, every other transaction is a value transfer
+    from an EOA to a contract created in one of the previous lookback blocks, so the block inspector finds
+    transactions of known contracts.
+    Transaction hashes and contract addresses encode their (block, index), receipts and code need no state.
+    """
+
+    def __init__(self, txs_per_block: int = 150, creation_interval: int = 25, lookback: int = 50, seed: int = 0):
+        self.txs_per_block = txs_per_block
+        self.creation_interval = creation_interval
+        self.lookback = lookback
+        self.seed = seed
+
+    def is_creation(self, block_number: int, index: int) -> bool:
+        return (block_number * 31 + index) % self.creation_interval == 0
+
+    @staticmethod
+    def tx_hash(block_number: int, index: int) -> str:
+        return "0x" + f"{block_number:016x}{index:08x}".rjust(64, "0")
+
+    @staticmethod
+    def contract_address(block_number: int, index: int) -> str:
+        return "0xc0de" + f"{block_number:016x}{index:08x}".rjust(36, "0")
+
+    @staticmethod
+    def decode_tx_hash(tx_hash: str) -> tuple:
+        return int(tx_hash[-24:-8], 16), int(tx_hash[-8:], 16)
+
+    def first_creation_index(self, block_number: int) -> Optional[int]:
+        index = (-block_number * 31) % self.creation_interval
+        return index if index < self.txs_per_block else None
+
+    def transaction(self, block_number: int, index: int) -> Dict:
+        rng = random.Random(_hash(self.seed, block_number, index))
+        sender = "0x" + _hash("eoa", rng.randrange(10_000))[:40]
+        to_address = None
+        if not self.is_creation(block_number, index):
+            created_in = block_number - 1 - rng.randrange(self.lookback)
+            creation_index = self.first_creation_index(created_in)
+            to_address = (self.contract_address(created_in, creation_index) if creation_index is not None
+                          else "0x" + _hash("eoa", rng.randrange(10_000))[:40])
+        return {
+            "hash": self.tx_hash(block_number, index),
+            "blockHash": "0x" + _hash("block", block_number),
+            "blockNumber": hex(block_number),
+            "transactionIndex": hex(index),
+            "from": sender,
+            "to": to_address,
+            "value": hex(rng.randrange(10 ** 15, 10 ** 20)),
+            "gas": hex(21000),
+            "gasPrice": hex(BASE_FEE_PER_GAS),
+            "nonce": hex(rng.randrange(1000)),
+            "input": "0x",
+            "type": "0x0",
+        }
+
+    def block(self, block_number: int, full_transactions: bool) -> Dict:
+        transactions = [self.transaction(block_number, index) for index in range(self.txs_per_block)]
+        return {
+            "number": hex(block_number),
+            "hash": "0x" + _hash("block", block_number),
+            "parentHash": "0x" + _hash("block", block_number - 1),
+            "miner": "0x" + _hash("miner", block_number % 7)[:40],
+            "gasUsed": hex(21000 * self.txs_per_block),
+            "gasLimit": hex(GAS_LIMIT),
+            "baseFeePerGas": hex(BASE_FEE_PER_GAS),
+            "timestamp": hex(1_600_000_000 + block_number * 12),
+            "transactions": transactions if full_transactions else [tx["hash"] for tx in transactions],
+        }
+
+    def receipt(self, tx_hash: str) -> Dict:
+        block_number, index = self.decode_tx_hash(tx_hash)
+        return {
+            "transactionHash": tx_hash,
+            "blockHash": "0x" + _hash("block", block_number),
+            "blockNumber": hex(block_number),
+            "transactionIndex": hex(index),
+            "contractAddress": (self.contract_address(block_number, index)
+                                if self.is_creation(block_number, index) else None),
+            "gasUsed": hex(21000),
+            "cumulativeGasUsed": hex(21000 * (index + 1)),
+            "effectiveGasPrice": hex(BASE_FEE_PER_GAS),
+            "status": "0x1",
+            "logs": [],
+            "logsBloom": "0x" + "0" * 512,
+            "type": "0x0",
+        }
+
+    def code(self, address: str) -> str:
+        if not address.lower().startswith("0xc0de"):
+            return "0x"
+        return TIME_LOCK_CODE if int(address[-8:], 16) % 2 == 0 else PLAIN_CODE
+
+    def balance(self, address: str, block_identifier: str) -> int:
+        # a third of the addresses hold no ETH
+        weight = int(_hash("balance", address.lower(), block_identifier)[:8], 16)
+        return 0 if weight % 3 == 0 else weight * 10 ** 9
+
+    def fee_history(self, block_count: int, newest_block: int) -> Dict:
+        return {
+            "oldestBlock": hex(newest_block - block_count + 1),
+            "baseFeePerGas": [hex(BASE_FEE_PER_GAS)] * (block_count + 1),
+            "gasUsedRatio": [0.5] * block_count,
+            "reward": [[hex(10 ** 9), hex(2 * 10 ** 9)]] * block_count,
+        }
+
+    def block_traces(self, block_number: int) -> List[Dict]:
+        traces = []
+        for index in range(self.txs_per_block):
+            tx = self.transaction(block_number, index)
+            call_type = "create" if tx["to"] is None else "call"
+            action = {"from": tx["from"], "value": tx["value"], "gas": tx["gas"]}
+            if tx["to"] is not None:
+                action.update({"to": tx["to"], "callType": "call", "input": "0x"})
+            traces.append({
+                "type": call_type,
+                "action": action,
+                "blockNumber": block_number,
+                "transactionHash": tx["hash"],
+                "transactionPosition": index,
+                "traceAddress": [],
+                "subtraces": 0,
+                "result": {"gasUsed": hex(21000)},
+            })
+        return traces
+
+
+class MockNode:
+    """
+    Local stand-in for an Erigon JSON-RPC node and the Etherscan API.
+    Results come from a recorded BlockCache when one is given and has them, otherwise from the synthetic chain.
+    Latency, jitter and failures are injected per HTTP request, failures are answered with a 503,
+    which the clients retry.
+    """
+
+    def __init__(
+            self,
+            chain: SyntheticChain,
+            head_block: int,
+            latency_ms: float = 0,
+            jitter_ms: float = 0,
+            error_rate: float = 0,
+            recorded: BlockCache = None,
+            seed: int = 0,
+    ):
+        self.chain = chain
+        self.head_block = head_block
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.recorded = recorded
+        self.rng = random.Random(seed)
+        self.calls: Counter = Counter()
+        self.http_requests = 0
+        self.injected_errors = 0
+
+    def result(self, method: str, params: List) -> Any:
+        if self.recorded is not None:
+            result = self.recorded.get_result(method, params)
+            if result is not None:
+                return result
+
+        if method == "eth_blockNumber":
+            return hex(self.head_block)
+        if method == "eth_chainId":
+            return "0x1"
+        if method == "eth_getBlockByNumber":
+            return self.chain.block(int(params[0], 16), params[1])
+        if method == "eth_getTransactionReceipt":
+            return self.chain.receipt(params[0])
+        if method == "eth_getBlockReceipts":
+            block = self.chain.block(int(params[0], 16), False)
+            return [self.chain.receipt(tx_hash) for tx_hash in block["transactions"]]
+        if method == "eth_getCode":
+            return self.chain.code(params[0])
+        if method == "eth_getBalance":
+            return hex(self.chain.balance(params[0], params[1]))
+        if method == "eth_getTransactionCount":
+            return "0x0"
+        if method == "eth_feeHistory":
+            block_count = params[0] if isinstance(params[0], int) else int(params[0], 16)
+            newest_block = params[1] if isinstance(params[1], int) else int(params[1], 16)
+            return self.chain.fee_history(block_count, newest_block)
+        if method == "trace_block":
+            return self.chain.block_traces(int(params[0], 16))
+        if method in ("trace_filter", "eth_getLogs"):
+            return []
+        raise KeyError(method)
+
+    def answer(self, call: Dict) -> Dict:
+        self.calls[call["method"]] += 1
+        try:
+            return {"jsonrpc": "2.0", "id": call["id"], "result": self.result(call["method"], call["params"])}
+        except KeyError:
+            return {"jsonrpc": "2.0", "id": call["id"],
+                    "error": {"code": -32601, "message": f"the method {call['method']} does not exist"}}
+
+    async def delay(self) -> bool:
+        """
+        Waits for the injected latency and tells whether the request fails.
+        """
+        self.http_requests += 1
+        latency = max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms)) / 1000 if self.latency_ms else 0
+        if latency:
+            await asyncio.sleep(latency)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.injected_errors += 1
+            return True
+        return False
+
+    async def handle_rpc(self, request: web.Request) -> web.Response:
+        if await self.delay():
+            return web.Response(status=503)
+        payload = await request.json()
+        if isinstance(payload, list):
+            return web.json_response([self.answer(call) for call in payload])
+        return web.json_response(self.answer(payload))
+
+    async def handle_etherscan(self, request: web.Request) -> web.Response:
+        if await self.delay():
+            return web.Response(status=503)
+        action = request.query.get("action")
+        self.calls[f"etherscan_{action}"] += 1
+        if action == "getblockreward":
+            result = {"blockNumber": request.query["blockno"], "blockReward": str(BLOCK_REWARD_WEI)}
+        elif action == "getsourcecode":
+            result = [{"SourceCode": "", "ContractName": "", "CompilerVersion": ""}]
+        else:
+            return web.json_response({"status": "0", "message": "NOTOK", "result": "Error! Invalid action"})
+        return web.json_response({"status": "1", "message": "OK", "result": result})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"calls": dict(self.calls), "http_requests": self.http_requests,
+                                  "injected_errors": self.injected_errors})
+
+    async def handle_reset(self, request: web.Request) -> web.Response:
+        self.calls.clear()
+        self.http_requests = 0
+        self.injected_errors = 0
+        return web.json_response({})
+
+    def application(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 ** 2)
+        app.router.add_post("/", self.handle_rpc)
+        app.router.add_get("/api", self.handle_etherscan)
+        app.router.add_get("/stats", self.handle_stats)
+        app.router.add_post("/reset", self.handle_reset)
+        return app
+
+
+def serve(port: int, head_block: int, chain_kwargs: Dict, node_kwargs: Dict, recorded_path: str = None) -> None:
+    """
+    Runs the mock node until the process is terminated, meant to be the target of a separate process
+    so that its CPU and memory are not measured with the inspectors.
+    """
+    recorded = BlockCache(Path(recorded_path), max_size_bytes=2 ** 62) if recorded_path else None
+    node = MockNode(SyntheticChain(**chain_kwargs), head_block, recorded=recorded, **node_kwargs)
+    web.run_app(node.application(), host="127.0.0.1", port=port, print=None, access_log=None)
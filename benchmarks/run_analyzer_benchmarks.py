@@ -0,0 +1,196 @@
+import argparse
+import gc
+import hashlib
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks.analyzer_corpus import generate_corpus, load_corpus, load_database_corpus, save_corpus
+from code_analyzer.disasm import disassemble_for_time_lock
+from code_analyzer.time_lock.time_lock_detector import bytecode_has_potential_time_lock
+from inspector.utils import json_dumps, json_loads
+
+# functions of the analyzer hot path, each takes a hex bytecode; add static pre-screens here
+TARGETS: Dict[str, Callable] = {
+    "disassemble_for_time_lock": disassemble_for_time_lock,
+    "bytecode_has_potential_time_lock": bytecode_has_potential_time_lock,
+}
+# kinds with fewer bytes run too briefly for their ns/byte to gate a run, the all row always does
+MIN_GATED_BYTES = 1_000_000
+
+
+def corpus_fingerprint(corpus: List[Dict]) -> str:
+    digest = hashlib.sha256()
+    for entry in corpus:
+        digest.update(entry["bytecode"].encode())
+    return digest.hexdigest()[:16]
+
+
+def flagged(result) -> bool:
+    # the disassembler returns None for a time lock, the detector returns True
+    return result is None or result is True
+
+
+def time_target(func: Callable, bytecodes: List[str], repeats: int) -> float:
+    """
+    :return: The median wall time of the passes over the bytecodes, in nanoseconds
+    """
+    elapsed = []
+    for _ in range(repeats):
+        cache_clear = getattr(func, "cache_clear", None)
+        if cache_clear is not None:
+            cache_clear()
+        gc.collect()
+        start = time.perf_counter_ns()
+        for bytecode in bytecodes:
+            func(bytecode)
+        elapsed.append(time.perf_counter_ns() - start)
+    return statistics.median(elapsed)
+
+
+def measure_allocations(func: Callable, bytecodes: List[str]) -> Dict:
+    """
+    Runs a separate pass under tracemalloc, which slows the calls down too much to be timed.
+    :return: The mean peak of traced memory per call and the mean number of memory blocks held by a result
+    """
+    peak_total = 0
+    retained_blocks = 0
+    tracemalloc.start()
+    try:
+        for bytecode in bytecodes:
+            gc.collect()
+            blocks = sys.getallocatedblocks()
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            result = func(bytecode)
+            peak_total += tracemalloc.get_traced_memory()[1] - current
+            retained_blocks += sys.getallocatedblocks() - blocks
+            del result
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_kib_per_call": peak_total / len(bytecodes) / 1024,
+        "retained_blocks_per_call": retained_blocks / len(bytecodes),
+    }
+
+
+def run_benchmarks(corpus: List[Dict], targets: List[str], repeats: int, allocations: bool) -> Dict:
+    kinds = sorted({entry["kind"] for entry in corpus})
+    results = {"corpus": {"contracts": len(corpus), "fingerprint": corpus_fingerprint(corpus)}, "targets": {}}
+    for name in targets:
+        func = TARGETS[name]
+        target_results = {}
+        total = {"contracts": 0, "bytes": 0, "nanoseconds": 0, "flagged": 0}
+        for kind in kinds:
+            bytecodes = [entry["bytecode"] for entry in corpus if entry["kind"] == kind]
+            size = sum((len(bytecode) - 2) // 2 for bytecode in bytecodes)
+            nanoseconds = time_target(func, bytecodes, repeats)
+            flagged_count = sum(flagged(func(bytecode)) for bytecode in bytecodes)
+            target_results[kind] = {
+                "contracts": len(bytecodes),
+                "bytes": size,
+                "ns_per_byte": nanoseconds / size,
+                "contracts_per_second": len(bytecodes) / (nanoseconds / 1e9),
+                "flagged": flagged_count,
+            }
+            if allocations:
+                target_results[kind].update(measure_allocations(func, bytecodes))
+            for key, value in (("contracts", len(bytecodes)), ("bytes", size), ("nanoseconds", nanoseconds),
+                               ("flagged", flagged_count)):
+                total[key] += value
+        target_results["all"] = {
+            "contracts": total["contracts"],
+            "bytes": total["bytes"],
+            "ns_per_byte": total["nanoseconds"] / total["bytes"],
+            "contracts_per_second": total["contracts"] / (total["nanoseconds"] / 1e9),
+            "flagged": total["flagged"],
+        }
+        results["targets"][name] = target_results
+    return results
+
+
+def print_results(results: Dict, baseline: Dict = None) -> None:
+    print(f"corpus: {results['corpus']['contracts']} contracts ({results['corpus']['fingerprint']})")
+    for name, target_results in results["targets"].items():
+        print(f"\n{name}")
+        print(f"{'kind':<10}{'contracts':>10}{'ns/byte':>10}{'contracts/s':>13}{'flagged':>9}{'peak KiB':>10}"
+              f"{'blocks':>9}{'vs base':>9}")
+        for kind, kind_results in target_results.items():
+            line = (f"{kind:<10}{kind_results['contracts']:>10}{kind_results['ns_per_byte']:>10.1f}"
+                    f"{kind_results['contracts_per_second']:>13.0f}{kind_results['flagged']:>9}")
+            if "peak_kib_per_call" in kind_results:
+                line += f"{kind_results['peak_kib_per_call']:>10.1f}{kind_results['retained_blocks_per_call']:>9.0f}"
+            else:
+                line += f"{'':>10}{'':>9}"
+            base = (baseline or {}).get("targets", {}).get(name, {}).get(kind)
+            if base:
+                line += f"{kind_results['ns_per_byte'] / base['ns_per_byte'] - 1:>+9.1%}"
+            print(line)
+
+
+def compare(results: Dict, baseline: Dict, max_regression: float, min_gated_bytes: int = MIN_GATED_BYTES) -> List[str]:
+    """
+    :return: The regressions of ns/byte above max_regression, of the all row and of the kinds of at least
+        min_gated_bytes bytes, and the changes of the flagged contracts of any kind
+    """
+    same_corpus = results["corpus"]["fingerprint"] == baseline["corpus"]["fingerprint"]
+    problems = [] if same_corpus else ["the baseline was measured on another corpus"]
+    for name, target_results in results["targets"].items():
+        for kind, kind_results in target_results.items():
+            base = baseline["targets"].get(name, {}).get(kind)
+            if base is None:
+                continue
+            slowdown = kind_results["ns_per_byte"] / base["ns_per_byte"] - 1
+            if slowdown > max_regression and (kind == "all" or kind_results["bytes"] >= min_gated_bytes):
+                problems.append(f"{name} {kind}: {slowdown:+.1%} ns/byte")
+            if same_corpus and kind_results["flagged"] != base["flagged"]:
+                problems.append(f"{name} {kind}: {kind_results['flagged']} flagged contracts instead of "
+                                f"{base['flagged']}")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the code analyzer hot path")
+    parser.add_argument('-c', '--corpus', type=str, default=None,
+                        help='Corpus file to load (default: the generated corpus)')
+    parser.add_argument('-wc', '--write-corpus', type=str, default=None, help='Writes the corpus to this file')
+    parser.add_argument('-db', '--db-uri', type=str, default=None,
+                        help='Takes the corpus from the contracts table of this database instead')
+    parser.add_argument('-l', '--limit', type=int, help='Number of contracts taken from the database', default=3000)
+    parser.add_argument('-s', '--scale', type=float, help='Scale of the generated corpus', default=1.0)
+    parser.add_argument('--seed', type=int, help='Seed of the generated corpus', default=0)
+    parser.add_argument('-t', '--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS),
+                        help='Functions to benchmark')
+    parser.add_argument('-r', '--repeats', type=int, help='Timed passes, their median is kept', default=7)
+    parser.add_argument('-na', '--no-allocations', action='store_true', default=False,
+                        help='Skip the tracemalloc pass')
+    parser.add_argument('-o', '--output', type=str, default=None, help='Saves the results as a baseline')
+    parser.add_argument('-bl', '--baseline', type=str, default=None, help='Baseline to compare against')
+    parser.add_argument('-mr', '--max-regression', type=float, default=0.1,
+                        help='Slowdown of ns/byte over the baseline that fails the run')
+    parser.add_argument('-mb', '--min-bytes', type=int, default=MIN_GATED_BYTES,
+                        help='Bytes of a kind below which its slowdown is only reported (the all row always gates)')
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(Path(args.corpus))
+    elif args.db_uri:
+        corpus = load_database_corpus(args.db_uri, args.limit)
+    else:
+        corpus = generate_corpus(args.seed, args.scale)
+    if args.write_corpus:
+        save_corpus(corpus, Path(args.write_corpus))
+
+    results = run_benchmarks(corpus, args.targets, args.repeats, not args.no_allocations)
+    baseline = json_loads(Path(args.baseline).read_bytes()) if args.baseline else None
+    print_results(results, baseline)
+    if args.output:
+        Path(args.output).write_bytes(json_dumps(results))
+    if baseline:
+        problems = compare(results, baseline, args.max_regression, args.min_bytes)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        sys.exit(1 if problems else 0)
@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import multiprocessing
+import resource
+import tempfile
+import time
+import traceback
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.mock_node import serve
+from inspector.inspectors.block.block import BlockInspector
+from inspector.inspectors.contract.contract import ContractInspector
+from inspector.inspectors.tlsc.tlsc import TLSCInspector
+from inspector.models.base import Base
+from inspector.models.block.model import Block
+from inspector.models.contract.model import Contract
+from inspector.models.contract_info.model import ContractInfo
+from inspector.utils import json_dumps, json_loads, set_logs_path
+
+# in pipeline order: the contracts found by the tlsc inspector are the input of the contract inspector,
+# whose balances make the contracts known to the block inspector
+BENCHMARKS = ("tlsc", "contract", "block")
+TABLES = {"tlsc": Contract, "contract": ContractInfo, "block": Block}
+
+
+def run_inspector(name: str, rpc: str, etherscan_url: str, db_uri: str, task_batch, raw: bool,
+                  max_concurrency: int, logs_path: Path) -> Dict:
+    """
+    Runs one inspector end-to-end, in its own process so that its peak RSS is its own.
+    """
+    set_logs_path(logs_path)
+    inspect_db_session = sessionmaker(bind=create_engine(db_uri))()
+    if name == "tlsc":
+        inspector = TLSCInspector(rpc, max_concurrency=max_concurrency, raw=raw)
+    elif name == "contract":
+        inspector = ContractInspector(rpc, max_concurrency=max_concurrency, raw=raw)
+    else:
+        inspector = BlockInspector(rpc, max_concurrency=max_concurrency, raw=raw, etherscan_api_key="benchmark",
+                                   etherscan_api_url=etherscan_url)
+
+    start = time.perf_counter()
+    error = None
+    try:
+        asyncio.run(inspector.inspect_many(inspect_db_session=inspect_db_session, task_batch=task_batch))
+    except Exception:
+        error = traceback.format_exc(limit=3)
+    seconds = time.perf_counter() - start
+    rows = inspect_db_session.execute(select(func.count()).select_from(TABLES[name])).scalar()
+    inspect_db_session.close()
+    return {
+        "seconds": seconds,
+        "rows": rows,
+        # kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "error": error,
+    }
+
+
+def node_request(url: str, method: str = "GET") -> Dict:
+    with urllib.request.urlopen(urllib.request.Request(url, method=method), timeout=5) as response:
+        return json_loads(response.read())
+
+
+def wait_for_node(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            node_request(f"{base_url}/stats")
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict:
+    work_dir = Path(tempfile.mkdtemp(prefix="tlsc_benchmark_"))
+    db_uri = args.db_uri or f"sqlite:///{work_dir / 'benchmark.sqlite'}"
+    engine = create_engine(db_uri)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    # the logs of the inspectors stay in the work directory, next to the benchmark DB
+    logs_path = work_dir / "log"
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    node = multiprocessing.Process(target=serve, daemon=True, kwargs={
+        "port": args.port,
+        "head_block": args.before + 64,
+        "chain_kwargs": {"txs_per_block": args.txs_per_block, "seed": args.seed},
+        "node_kwargs": {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate,
+                        "seed": args.seed},
+        "recorded_path": args.recorded,
+    })
+    node.start()
+    results = {}
+    try:
+        wait_for_node(base_url)
+        block_count = args.before - args.after
+        for name in args.inspectors:
+            node_request(f"{base_url}/reset", method="POST")
+            # the contract inspector selects the contracts by creation block, both ends included
+            task_batch = (args.after, args.before - 1) if name == "contract" else (args.after, args.before)
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(run_inspector, name, f"{base_url}/", f"{base_url}/api", db_uri, task_batch,
+                                         args.raw, args.concurrency, logs_path).result()
+            stats = node_request(f"{base_url}/stats")
+            rpc_calls = sum(count for method, count in stats["calls"].items() if not method.startswith("etherscan"))
+            result.update({
+                "blocks_per_second": block_count / result["seconds"],
+                "rpc_calls": rpc_calls,
+                "rpc_calls_per_block": rpc_calls / block_count,
+                "http_requests": stats["http_requests"],
+                "injected_errors": stats["injected_errors"],
+                "calls": stats["calls"],
+            })
+            results[name] = result
+    finally:
+        node.terminate()
+        node.join()
+    return results
+
+
+def print_results(results: Dict) -> None:
+    print(f"{'inspector':<12}{'seconds':>10}{'blocks/s':>10}{'rpc/block':>11}{'http req':>10}{'errors':>8}"
+          f"{'rows':>8}{'peak MB':>9}")
+    for name, result in results.items():
+        print(f"{name:<12}{result['seconds']:>10.2f}{result['blocks_per_second']:>10.1f}"
+              f"{result['rpc_calls_per_block']:>11.1f}{result['http_requests']:>10}{result['injected_errors']:>8}"
+              f"{result['rows']:>8}{result['peak_rss_mb']:>9.1f}")
+        if result["error"]:
+            print(f"  {name} failed:\n{result['error']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the inspectors end-to-end against a local mock node")
+    parser.add_argument('-a', '--after', type=int, help='Block number to start from', default=16_000_000)
+    parser.add_argument('-b', '--before', type=int, help='Block number to end with', default=16_000_200)
+    parser.add_argument('-i', '--inspectors', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS),
+                        help='Inspectors to benchmark, in pipeline order')
+    parser.add_argument('-tx', '--txs-per-block', type=int, help='Transactions per synthetic block', default=150)
+    parser.add_argument('-l', '--latency-ms', type=float, help='Mean latency of the mock node', default=5)
+    parser.add_argument('-j', '--jitter-ms', type=float, help='Standard deviation of the latency', default=2)
+    parser.add_argument('-e', '--error-rate', type=float, help='Fraction of requests answered with a 503',
+                        default=0)
+    parser.add_argument('-rc', '--recorded', type=str, default=None,
+                        help='Block cache directory (from a run with -ca) to serve recorded results from')
+    parser.add_argument('-db', '--db-uri', type=str, default=None,
+                        help='Throwaway database, all its tables are dropped (default: a temporary SQLite file)')
+    parser.add_argument('-r', '--raw', action='store_true', help='Use the raw JSON-RPC client', default=False)
+    parser.add_argument('-cc', '--concurrency', type=int, help='Batches in flight per inspector', default=1)
+    parser.add_argument('--port', type=int, help='Port of the mock node', default=18545)
+    parser.add_argument('--seed', type=int, help='Seed of the synthetic chain', default=0)
+    parser.add_argument('-o', '--output', type=str, help='Writes the results as JSON to this file', default=None)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args)
+    print_results(results)
+    if args.output:
+        Path(args.output).write_bytes(json_dumps(results))
@@ -4,6 +4,7 @@ import traceback
 from typing import List, Tuple, Dict
 
 from code_analyzer.time_lock.time_lock_detector import bytecode_has_time_lock
+from utils.profiling import profile_batch, profiler, span
 
 BATCH_SIZE = 2
 
@@ -29,24 +30,30 @@ def analyze_bytecodes(analyzer_idx: int, contracts: List[Tuple[str, str]]) -> No
     logger.setLevel(logging.INFO)
     logger.addHandler(_setup_console_handler())
 
+    if profiler.enabled:
+        profiler.start()
     try:
         tlsc.clear()
         batch_cnt = 0
         for address, bytecode in contracts:
             batch_cnt += 1
             logger.info(f"{analyzer_idx}: Analyzing {address}")
-            tlsc[address] = bytecode_has_time_lock(bytecode)
-            if batch_cnt % BATCH_SIZE == 0:
-                with open(f"tlsc_{analyzer_idx}.csv", "a") as f:
-                    for contract_address, has_tl in tlsc.items():
-                        f.write(f"{contract_address},{has_tl}\n")
-                tlsc.clear()
+            with profile_batch():
+                with span("time_lock_analysis"):
+                    tlsc[address] = bytecode_has_time_lock(bytecode)
+                if batch_cnt % BATCH_SIZE == 0:
+                    with span("write_results"), open(f"tlsc_{analyzer_idx}.csv", "a") as f:
+                        for contract_address, has_tl in tlsc.items():
+                            f.write(f"{contract_address},{has_tl}\n")
+                    tlsc.clear()
     except:
         logger.error(f"Error in analyzer {analyzer_idx}:\n{traceback.format_exc()}")
     finally:
         with open(f"tlsc_{analyzer_idx}.csv", "a") as f:
             for address, has_tl in tlsc.items():
                 f.write(f"{address},{has_tl}\n")
+        if profiler.enabled:
+            profiler.write()
 
 
 def parallel_analysis(contracts: List[Tuple[str, str]], analyzer_cnt: int = 8):
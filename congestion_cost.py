@@ -0,0 +1,187 @@
+"""
+Cost of congesting a range of blocks to delay the transactions of a time-locked contract, evaluated in closed form
+over grids of scenarios or over fee paths sampled from the stored blocks.
+
+Fees are in ETH per gas unit, converted from the wei stored in the blocks table.
+The base fee follows the EIP-1559 update rule without its integer rounding, so the cost of a range of N blocks is a geometric series:
+    gas_per_block * (base_fee * (1 + priority_fee_ratio) * (r^N - 1) / (r - 1) + sum of the gas prices of the N blocks)
+where r is the base fee ratio between two blocks of the strategy.
+"""
+import argparse
+from typing import NamedTuple, Sequence
+
+import numpy as np
+from sqlalchemy import select
+
+from inspector.models.block.model import Block
+from utils.db import get_inspect_session
+
+GAS_LIMIT = 30_000_000
+TARGET_GAS_USAGE = GAS_LIMIT // 2
+# largest change of the base fee between two blocks (EIP-1559)
+PHI = 1 / 8
+# gas of the transaction that keeps a block non-empty in the escrow strategy
+CONGEST_TX_GAS_USAGE = 60_000
+WEI_PER_ETH = 10 ** 18
+
+# strategy -> gas used by the blocks of the congested range
+# naive: the attacker fills every block, escrow: the miners are paid to leave the blocks nearly empty
+STRATEGY_GAS_USED = {
+    "naive": GAS_LIMIT,
+    "escrow": CONGEST_TX_GAS_USAGE,
+}
+
+
+class FeeHistory(NamedTuple):
+    """
+    Fees of consecutive stored blocks, aligned arrays.
+    """
+    block_numbers: np.ndarray
+    base_fees: np.ndarray  # ETH per gas
+    gas_prices: np.ndarray  # miner fee per gas used (ETH), 0 for empty blocks
+
+
+def base_fee_ratio(gas_used: float | np.ndarray) -> float | np.ndarray:
+    """
+    Ratio between the base fees of a block and of its parent, given the gas used by the parent.
+    """
+    return 1 + PHI * (np.asarray(gas_used, dtype=np.float64) - TARGET_GAS_USAGE) / TARGET_GAS_USAGE
+
+
+def geometric_sum(ratios: np.ndarray, block_ranges: np.ndarray) -> np.ndarray:
+    """
+    1 + r + ... + r^(N-1), elementwise over broadcast ratios and block ranges.
+    """
+    ratios = np.asarray(ratios, dtype=np.float64)
+    block_ranges = np.asarray(block_ranges, dtype=np.float64)
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        log_ratios = np.log(ratios)
+        # expm1 keeps the precision of the ratios close to 1
+        sums = np.expm1(block_ranges * log_ratios) / (ratios - 1)
+    return np.where(ratios == 1, block_ranges, sums)
+
+
+def congestion_cost(
+        block_ranges: int | np.ndarray,
+        base_fees: float | np.ndarray,
+        gas_prices: float | np.ndarray = 0.0,
+        priority_fee_ratios: float | np.ndarray = 0.0,
+        strategy: str = "naive",
+        gas_per_block: float = GAS_LIMIT,
+) -> np.ndarray:
+    """
+    Cost (ETH) of congesting block ranges, elementwise over the broadcast arguments.
+    :param block_ranges: Number of congested blocks
+    :param base_fees: Base fee of the first congested block
+    :param gas_prices: Fee per gas paid to the miner of each block on top of the base fee
+    :param priority_fee_ratios: Fee paid to the miner as a fraction of the base fee
+    :param strategy: One of STRATEGY_GAS_USED
+    :param gas_per_block: Gas paid for in each block
+    """
+    ratio = base_fee_ratio(STRATEGY_GAS_USED[strategy])
+    base_fees = np.asarray(base_fees, dtype=np.float64) * (1 + np.asarray(priority_fee_ratios, dtype=np.float64))
+    block_ranges = np.asarray(block_ranges)
+    with np.errstate(over="ignore", invalid="ignore"):
+        return gas_per_block * (base_fees * geometric_sum(ratio, block_ranges) + np.asarray(gas_prices) * block_ranges)
+
+
+def sweep(
+        block_ranges: Sequence[int],
+        base_fees: Sequence[float],
+        gas_prices: Sequence[float] = (0.0,),
+        priority_fee_ratios: Sequence[float] = (0.0,),
+        strategies: Sequence[str] = tuple(STRATEGY_GAS_USED),
+        gas_per_block: float = GAS_LIMIT,
+) -> np.ndarray:
+    """
+    Evaluates the cost of every combination of the scenario parameters.
+    :return: Costs (ETH) of shape (strategies, block ranges, base fees, gas prices, priority fee ratios)
+    """
+    block_ranges, base_fees, gas_prices, priority_fee_ratios = np.ix_(
+        np.asarray(block_ranges), np.asarray(base_fees, dtype=np.float64),
+        np.asarray(gas_prices, dtype=np.float64), np.asarray(priority_fee_ratios, dtype=np.float64))
+    return np.stack([
+        congestion_cost(block_ranges, base_fees, gas_prices, priority_fee_ratios, strategy, gas_per_block)
+        for strategy in strategies
+    ])
+
+
+def sample_costs(
+        history: FeeHistory,
+        block_ranges: Sequence[int],
+        samples: int,
+        priority_fee_ratios: Sequence[float] = (0.0,),
+        strategies: Sequence[str] = tuple(STRATEGY_GAS_USED),
+        gas_per_block: float = GAS_LIMIT,
+        seed: int = None,
+) -> np.ndarray:
+    """
+    Monte-Carlo costs over historical fee paths: each sample starts at a random stored block, from its base fee,
+    and outbids the gas prices of the blocks that followed it.
+    :return: Costs (ETH) of shape (strategies, samples, block ranges, priority fee ratios)
+    """
+    block_ranges = np.asarray(block_ranges)
+    max_range = int(block_ranges.max())
+    if len(history.base_fees) < max_range:
+        raise ValueError(f"The history has {len(history.base_fees)} blocks, fewer than the longest range {max_range}")
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, len(history.base_fees) - max_range + 1, size=samples)
+    # the gas prices of any range of blocks are a difference of prefix sums
+    prefix_sums = np.concatenate(([0.0], np.cumsum(history.gas_prices, dtype=np.float64)))
+    path_gas_prices = prefix_sums[starts[:, None] + block_ranges[None, :]] - prefix_sums[starts[:, None]]
+
+    base_fees = history.base_fees[starts][:, None, None]
+    ranges = block_ranges[None, :, None]
+    ratios = np.asarray(priority_fee_ratios, dtype=np.float64)[None, None, :]
+    return np.stack([
+        congestion_cost(ranges, base_fees, 0.0, ratios, strategy, gas_per_block)
+        + gas_per_block * path_gas_prices[:, :, None]
+        for strategy in strategies
+    ])
+
+
+def load_fee_history(after_block: int = None, before_block: int = None) -> FeeHistory:
+    """
+    Loads the fees of the stored blocks of a range, in block order, converted to ETH.
+    """
+    query = select(Block.block_number, Block.base_fee_per_gas, Block.gas_fee, Block.gas_used) \
+        .order_by(Block.block_number)
+    if after_block is not None:
+        query = query.where(Block.block_number >= after_block)
+    if before_block is not None:
+        query = query.where(Block.block_number < before_block)
+    inspect_db_session = get_inspect_session()
+    rows = inspect_db_session.execute(query).all()
+    inspect_db_session.close()
+
+    columns = list(zip(*rows)) if rows else [[], [], [], []]
+    block_numbers = np.array(columns[0], dtype=np.int64)
+    base_fees, gas_fees, gas_used = (np.array(column, dtype=np.float64) for column in columns[1:])
+    base_fees /= WEI_PER_ETH
+    gas_fees /= WEI_PER_ETH
+    gas_prices = np.divide(gas_fees, gas_used, out=np.zeros_like(gas_fees), where=gas_used > 0)
+    return FeeHistory(block_numbers, base_fees, gas_prices)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimates the congestion cost over sampled historical fee paths")
+    parser.add_argument('-a', '--after', type=int, help='First block of the history', default=None)
+    parser.add_argument('-b', '--before', type=int, help='Last block of the history, excluded', default=None)
+    parser.add_argument('-r', '--ranges', type=int, nargs='+', help='Congested block ranges',
+                        default=[1, 10, 50, 100, 1000, 7200])
+    parser.add_argument('-pr', '--priority-ratios', type=float, nargs='+',
+                        help='Priority fees as a fraction of the base fee', default=[0.0])
+    parser.add_argument('-s', '--samples', type=int, help='Sampled fee paths', default=10_000)
+    parser.add_argument('--seed', type=int, help='Seed of the sampling', default=None)
+    args = parser.parse_args()
+
+    fee_history = load_fee_history(args.after, args.before)
+    costs = sample_costs(fee_history, args.ranges, args.samples, args.priority_ratios, seed=args.seed)
+    percentiles = [5, 50, 95]
+    print(f"{'strategy':<10}{'blocks':>8}{'priority':>10}" + "".join(f"{f'p{p} (ETH)':>16}" for p in percentiles))
+    for strategy, strategy_costs in zip(STRATEGY_GAS_USED, costs):
+        for i, block_range in enumerate(args.ranges):
+            for j, priority_fee_ratio in enumerate(args.priority_ratios):
+                values = np.percentile(strategy_costs[:, i, j], percentiles)
+                print(f"{strategy:<10}{block_range:>8}{priority_fee_ratio:>10.2f}"
+                      + "".join(f"{value:>16.6g}" for value in values))
@@ -1,6 +1,7 @@
 """
 This file contains code used for calculating the base gas fee for a range of blocks.
 """
+from congestion_cost import congestion_cost
 
 MAX_INCREASE_RATE = 12.5
 BLOCK_SIZE_LIMIT = 30_000_000
@@ -8,25 +9,28 @@ ETH_TO_GWEI = 1e9
 
 
 def calculate_fee(curr_base_fee: float, _block_range: int, max_priority_fee_ratio: float = 0) -> float:
-    _total_fee = 0
-    for i in range(_block_range):
-        curr_base_fee *= (1 + MAX_INCREASE_RATE / 100)
-        _total_fee += curr_base_fee * (1 + max_priority_fee_ratio)
-        if i in [1, 10, 50]:
-            print(f"{i} blocks: {_total_fee}")
-            print(f"cost for full block utilization: {_total_fee * BLOCK_SIZE_LIMIT / ETH_TO_GWEI} ETH")
-    return _total_fee
+    """
+    Total fee per gas of a range of full blocks, each one raising the base fee by MAX_INCREASE_RATE percent.
+    See congestion_cost for whole grids of scenarios.
+    """
+    # the first block of the range already pays the raised base fee
+    first_base_fee = curr_base_fee * (1 + MAX_INCREASE_RATE / 100)
+    return float(congestion_cost(_block_range, first_base_fee, priority_fee_ratios=max_priority_fee_ratio,
+                                 strategy="naive", gas_per_block=1))
+
+
+def print_fees(curr_base_fee: float, _block_range: int, max_priority_fee_ratio: float = 0) -> None:
+    for block_count in [2, 11, 51, _block_range]:
+        _total_fee = calculate_fee(curr_base_fee, block_count, max_priority_fee_ratio)
+        print(f"{block_count} blocks: {_total_fee}")
+        print(f"cost for full block utilization: {_total_fee * BLOCK_SIZE_LIMIT / ETH_TO_GWEI} ETH")
 
 
 if __name__ == "__main__":
     initial_base_fee = 20
     block_range = 100
-    total_fee = calculate_fee(20, 100)
     print("Base fees for different block ranges:")
-    print(f"{block_range} blocks: {total_fee}")
-    print(f"cost for full block utilization: {total_fee * BLOCK_SIZE_LIMIT / ETH_TO_GWEI} ETH")
+    print_fees(initial_base_fee, block_range)
 
-    total_fee = calculate_fee(20, 100, 0.05)  # 5% max fee
     print("Total fees for different block ranges:")
-    print(f"{block_range} blocks: {total_fee}")
-    print(f"cost for full block utilization: {total_fee * BLOCK_SIZE_LIMIT / ETH_TO_GWEI} ETH")
+    print_fees(initial_base_fee, block_range, 0.05)  # 5% max fee
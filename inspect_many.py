@@ -14,6 +14,7 @@ config.read('config.ini')
 
 # rpc ips file path
 rpc_hosts_ip_path = config['paths']["rpc_hosts_ip_path"]
+rpc_capabilities_path = Path(config['paths']["rpc_capabilities_path"])
 
 # load log paths
 logs_path = Path(config["logs"]["logs_path"])
@@ -25,8 +26,18 @@ def create_dirs(*dirs):
         directory.mkdir(parents=True, exist_ok=True)
 
 
-def get_rpc_endpoints(endpoint_ip_file_path):
-    return pd.read_csv(endpoint_ip_file_path, names=["ip"])
+def get_rpc_endpoints(endpoint_ip_file_path, capabilities_file_path: Path, required_capabilities=()):
+    """
+    Gets the ranked RPC endpoints. If the vitals check wrote a capabilities file,
+    only the synced endpoints that have all the required capabilities are kept.
+    """
+    if not capabilities_file_path.exists():
+        return pd.read_csv(endpoint_ip_file_path, names=["ip"])
+    endpoints = pd.read_csv(capabilities_file_path)
+    endpoints = endpoints[endpoints["synced"]]
+    for capability in required_capabilities:
+        endpoints = endpoints[endpoints[capability]]
+    return endpoints[["ip_address"]].rename(columns={"ip_address": "ip"}).reset_index(drop=True)
 
 
 if __name__ == "__main__":
@@ -41,25 +52,83 @@ if __name__ == "__main__":
     parser.add_argument('-mc', '--many-contracts', action='store_true',
                         help='Inspect collected contracts in given range', default=None)
 
+    parser.add_argument('-bb', '--balance-block', type=int,
+                        help='Block at which contract balances are taken (default: latest)', default=None)
+
     parser.add_argument('-mb', '--many-blocks', action='store_true', help='Inspect many blocks in given range',
                         default=None)
     parser.add_argument('-vc', '--verified-contracts', action='store_true',
                         help='Fetch verified contracts created in given block range from Etherscan', default=None)
 
+    parser.add_argument('-mt', '--many-tokens', action='store_true',
+                        help='Index ERC-20 balances of the collected contracts from Transfer logs in given range',
+                        default=None)
+    parser.add_argument('-ta', '--token-addresses', nargs='+',
+                        help='Tokens to index (default: all tokens)', default=None)
+
+    parser.add_argument('-it', '--internal-transfers', action='store_true',
+                        help='Track internal value transfers of the collected contracts with trace_filter',
+                        default=None)
+
+    parser.add_argument('-ca', '--cache', action='store_true',
+                        help='Read blocks, receipts and code through the local on-disk cache', default=False)
+    parser.add_argument('-sc', '--scan', action='store_true',
+                        help='Fetch each block in given range once and feed it to all consumers', default=None)
+    parser.add_argument('-fo', '--follow', action='store_true',
+                        help='Follow the chain head with the tlsc and blocks consumers, from -a if given',
+                        default=None)
+    parser.add_argument('-cs', '--consumers', nargs='+',
+                        choices=['tlsc', 'blocks', 'largest_tx', 'attributes', 'balances'],
+                        help='Consumers of the scan mode (default: tlsc blocks largest_tx) '
+                             'or of the follow mode (default: tlsc blocks)', default=None)
+
     parser.add_argument('-at', '--attrs', nargs='+', help='Attributes to inspect', default=None)
+    parser.add_argument('-r', '--raw', action='store_true',
+                        help='Fetch blocks with raw JSON-RPC requests instead of web3 formatters', default=False)
+    parser.add_argument('-hr', '--hot-reload', action='store_true',
+                        help='Switch to the live endpoints published by the RPC registry during the run', default=False)
+    parser.add_argument('-sp', '--single-process', action='store_true',
+                        help='Run all inspectors in one event loop and offload the CPU-bound steps to a process pool',
+                        default=False)
+    parser.add_argument('-cc', '--concurrency', type=int,
+                        help='Batches in flight per inspector', default=1)
+    parser.add_argument('-ow', '--offload-workers', type=int,
+                        help='Processes of the offload pool in single process mode (default: cpu count)', default=None)
+    parser.add_argument('-me', '--metrics-port', type=int,
+                        help='Serve the metrics of all inspectors in Prometheus format on this local port',
+                        default=None)
+    parser.add_argument('-pf', '--profile', type=float, nargs='?', const=1.0,
+                        help='Profile the pipeline stages of this fraction of the batches (default: all)',
+                        default=None)
     args = parser.parse_args()
 
-    if args.after >= args.before:
+    if args.follow and args.cache:
+        raise ValueError("The cache cannot be used in follow mode, its blocks would outlive the reorgs")
+    elif not args.follow and args.after >= args.before:
         raise ValueError("After block number must be smaller than before block number")
     elif args.after < 0 or args.before < 0:
         raise ValueError("Block number must be positive")
     elif args.para <= 0:
         raise ValueError("Number of parallel processes must be positive")
+    elif args.concurrency <= 0:
+        raise ValueError("Concurrency must be positive")
+    elif args.profile is not None and not 0 < args.profile <= 1:
+        raise ValueError("Profiled fraction must be in (0, 1]")
 
     inspector_cnt = args.para
-    rpc_urls = get_rpc_endpoints(rpc_hosts_ip_path)
-
-    if args.after != 0:
+    required_capabilities = []
+    if args.raw:
+        required_capabilities.append("batch")
+    if args.internal_transfers:
+        required_capabilities.append("trace_block")
+    if args.attrs is not None and "gas_fee" in args.attrs:
+        required_capabilities.append("block_receipts")
+    rpc_urls = get_rpc_endpoints(rpc_hosts_ip_path, rpc_capabilities_path, required_capabilities)
+
+    if args.follow is True:
+        task_batches = [args.after if args.after != 0 else None]
+        inspector_type = InspectorType.FOLLOW
+    elif args.after != 0:
         task_batches = np.linspace(start=args.after, stop=args.before, num=inspector_cnt + 1)
         inspector_type = InspectorType.TLSC
         if args.many_contracts is True:
@@ -68,7 +137,21 @@ if __name__ == "__main__":
             inspector_type = InspectorType.BLOCK
         elif args.verified_contracts is True:
             inspector_type = InspectorType.VERICON
+        elif args.scan is True:
+            inspector_type = InspectorType.SCAN
+        elif args.many_tokens is True:
+            inspector_type = InspectorType.TOKEN
+        elif args.internal_transfers is True:
+            inspector_type = InspectorType.TRACE
     else:
         raise ValueError("Invalid arguments")
 
-    run_inspectors(task_batches, rpc_urls, inspector_cnt, inspector_type=inspector_type, attributes=args.attrs)
+    run_inspectors(task_batches, rpc_urls, inspector_cnt, inspector_type=inspector_type, attributes=args.attrs,
+                   raw=args.raw, consumers=args.consumers,
+                   cache=args.cache,
+                   balance_block=args.balance_block if args.balance_block is not None else "latest",
+                   token_addresses=args.token_addresses,
+                   hot_reload=args.hot_reload, required_capabilities=required_capabilities,
+                   single_process=args.single_process, max_concurrency=args.concurrency,
+                   offload_workers=args.offload_workers, metrics_port=args.metrics_port,
+                   profile=args.profile)
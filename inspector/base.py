@@ -1,14 +1,38 @@
 import asyncio
 from abc import abstractmethod, ABC
 from asyncio import Queue
-from typing import Tuple, List
+from typing import Tuple, List, Iterable, Iterator
 
 from sqlalchemy import orm
 
 from web3 import Web3
 from web3.eth import AsyncEth
 
+from inspector.cache import BlockCache
+from inspector.endpoints import EndpointRegistry
+from inspector.metrics import metrics, flush_metrics
 from inspector.provider import get_base_provider
+from inspector.raw_rpc import RawRPCClient
+from utils.profiling import profile_batch
+
+# number of in-flight batches kept per unit of concurrency
+WINDOW_FACTOR = 2
+
+
+def iter_block_ranges(after_block: int, before_block: int, batch_size: int) -> Iterator[Tuple[int, int]]:
+    """
+    Lazily splits [after_block, before_block) into consecutive ranges of at most batch_size blocks.
+    """
+    for block_number in range(after_block, before_block, batch_size):
+        yield block_number, min(block_number + batch_size, before_block)
+
+
+def iter_slices(items: List, batch_size: int) -> Iterator[List]:
+    """
+    Lazily splits a list into consecutive slices of at most batch_size items.
+    """
+    for i in range(0, len(items), batch_size):
+        yield items[i:i + batch_size]
 
 
 class Inspector(ABC):
@@ -17,13 +41,114 @@ class Inspector(ABC):
             rpc_endpoint: str,
             max_concurrency: int = 1,
             request_timeout: int = 300,
+            raw: bool = False,
+            cache: BlockCache = None,
     ):
-        base_provider = get_base_provider(rpc_endpoint, request_timeout=request_timeout)
+        base_provider = get_base_provider(rpc_endpoint, request_timeout=request_timeout, cache=cache)
         self.w3 = Web3(base_provider, modules={"eth": (AsyncEth,)}, middlewares=[])
         self.host = rpc_endpoint.split(":")[1].strip("/")
         self.max_concurrency = max_concurrency
         self.batch_queue = Queue()
         self.logger = None
+        # raw mode fetches blocks without going through web3's formatters
+        self.raw_client = RawRPCClient(rpc_endpoint, request_timeout=request_timeout, cache=cache) if raw else None
+        self.cache = cache
+        self.rpc_endpoint = rpc_endpoint
+        self.request_timeout = request_timeout
+        self.endpoint_registry: EndpointRegistry | None = None
+
+    def switch_endpoint(self, rpc_endpoint: str) -> None:
+        """
+        Sends the next requests to another endpoint. The provider and the raw client are shared by all batches,
+        so the batches in flight also send their remaining requests to the new endpoint, only the requests already
+        sent finish on the old one. The metrics are labelled with the new host, the logger is kept so the log of
+        the inspector stays in one file.
+        """
+        self.logger.info(f"{self.host}: Switching to {rpc_endpoint}")
+        self.w3.provider = get_base_provider(rpc_endpoint, request_timeout=self.request_timeout, cache=self.cache)
+        if self.raw_client is not None:
+            self.raw_client.rpc_endpoint = rpc_endpoint
+        self.rpc_endpoint = rpc_endpoint
+        self.host = rpc_endpoint.split(":")[1].strip("/")
+
+    def refresh_endpoint(self) -> None:
+        """
+        Switches to another endpoint if the registry no longer lists the current one as live.
+        """
+        if self.endpoint_registry is None:
+            return
+        rpc_endpoint = self.endpoint_registry.replacement(self.rpc_endpoint)
+        if rpc_endpoint is not None:
+            self.switch_endpoint(rpc_endpoint)
+
+    def record_batch(self, task_batch: Tuple[int, int] | List[str]) -> None:
+        # block batches are (after_block, before_block) ranges, contract batches are lists of addresses
+        if isinstance(task_batch, tuple):
+            metrics.inc("tlsc_inspector_blocks_total", task_batch[1] - task_batch[0], inspector=self.host)
+        else:
+            metrics.inc("tlsc_inspector_contracts_total", len(task_batch), inspector=self.host)
+        metrics.inc("tlsc_inspector_batches_total", inspector=self.host)
+
+    async def close(self) -> None:
+        flush_metrics()
+        if self.raw_client is not None:
+            await self.raw_client.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    async def run_batches(
+            self,
+            inspect_db_session: orm.Session,
+            task_batches: Iterable[Tuple[int, int] | List[str]],
+    ) -> None:
+        """
+        Runs safe_inspect_many over the task batches keeping at most
+        max_concurrency * WINDOW_FACTOR of them in flight.
+        New batches are only pulled from the iterable as earlier ones finish,
+        and the endpoint is refreshed from the registry before each of them starts.
+        :param inspect_db_session: DB session
+        :param task_batches: Iterable of task batches, consumed lazily
+        :return: None
+        """
+        sem = asyncio.Semaphore(self.max_concurrency)
+        window_size = max(1, self.max_concurrency * WINDOW_FACTOR)
+        pending = set()
+
+        async def run_batch(task_batch):
+            with profile_batch():
+                await self.safe_inspect_many(
+                    inspect_db_session=inspect_db_session,
+                    task_batch=task_batch,
+                    semaphore=sem,
+                )
+            self.record_batch(task_batch)
+
+        def record_depths():
+            metrics.set("tlsc_inspector_batches_in_flight", len(pending), inspector=self.host)
+            # each batch of the window holds the semaphore for its whole run, the others wait for it
+            metrics.set("tlsc_inspector_queue_depth", max(0, len(pending) - self.max_concurrency),
+                        inspector=self.host)
+
+        try:
+            for task_batch in task_batches:
+                if len(pending) >= window_size:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()  # propagate the first failure
+                self.refresh_endpoint()
+                pending.add(asyncio.ensure_future(run_batch(task_batch)))
+                record_depths()
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+                record_depths()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
 
     @abstractmethod
     async def inspect_many(
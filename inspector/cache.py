@@ -0,0 +1,193 @@
+import logging
+import mmap
+import os
+import sqlite3
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+
+from web3 import Web3
+from web3.types import RPCEndpoint, RPCResponse
+
+from inspector.utils import json_loads, json_dumps
+
+SEGMENT_SIZE = 64 * 1024 * 1024
+COMPRESSION_LEVEL = 6
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(method: str, params: List) -> Optional[str]:
+    """
+    Returns the cache key of a JSON-RPC call, or None if its result is not immutable.
+    Only calls pinned to an explicit block number or a transaction hash are cached.
+    """
+    if method == "eth_getBlockByNumber":
+        block_identifier, full_transactions = params
+        if isinstance(block_identifier, str) and block_identifier.startswith("0x"):
+            return f"block:{int(block_identifier, 16)}:{int(bool(full_transactions))}"
+    elif method == "eth_getBlockReceipts":
+        block_identifier = params[0]
+        if isinstance(block_identifier, str) and block_identifier.startswith("0x"):
+            return f"receipts:{int(block_identifier, 16)}"
+    elif method == "eth_getTransactionReceipt":
+        return f"receipt:{params[0].lower()}"
+    elif method == "eth_getCode":
+        address, block_identifier = params
+        if isinstance(block_identifier, str) and block_identifier.startswith("0x"):
+            return f"code:{address.lower()}:{int(block_identifier, 16)}"
+    return None
+
+
+class BlockCache:
+    """
+    Local cache of raw JSON-RPC results (blocks, receipts and code) shared across runs and processes.
+    Results are zlib-compressed and appended to segment files, each process writing to its own segment.
+    A small SQLite index maps keys to (segment, offset, length) and segments are memory-mapped for reads.
+    Once the total size exceeds max_size_bytes the oldest full segments are evicted.
+    """
+
+    def __init__(self, cache_path: Path, max_size_bytes: int, segment_size: int = SEGMENT_SIZE):
+        self.cache_path = Path(cache_path)
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self.segment_size = segment_size
+
+        self.index = sqlite3.connect(self.cache_path / "index.sqlite", timeout=60, isolation_level=None)
+        self.index.execute("PRAGMA journal_mode=WAL")
+        self.index.execute("PRAGMA synchronous=NORMAL")
+        self.index.execute("CREATE TABLE IF NOT EXISTS segments "
+                           "(segment INTEGER PRIMARY KEY AUTOINCREMENT, size INTEGER NOT NULL, "
+                           "sealed INTEGER NOT NULL DEFAULT 0)")
+        self.index.execute("CREATE TABLE IF NOT EXISTS entries "
+                           "(key TEXT PRIMARY KEY, segment INTEGER NOT NULL, "
+                           "offset INTEGER NOT NULL, length INTEGER NOT NULL)")
+        self.index.execute("CREATE INDEX IF NOT EXISTS entries_segment ON entries (segment)")
+
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._segment: Optional[int] = None
+        self._segment_file = None
+        self.hits = 0
+        self.misses = 0
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.cache_path / f"segment_{segment:08d}.bin"
+
+    def _map(self, segment: int, end: int) -> Optional[mmap.mmap]:
+        mapped = self._maps.get(segment)
+        if mapped is not None and len(mapped) >= end:
+            return mapped
+        if mapped is not None:  # the segment grew since it was mapped
+            mapped.close()
+            del self._maps[segment]
+        try:
+            with open(self._segment_path(segment), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        self._maps[segment] = mapped
+        return mapped if len(mapped) >= end else None
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self.index.execute("SELECT segment, offset, length FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        segment, offset, length = row
+        mapped = self._map(segment, offset + length)
+        if mapped is None:  # evicted by another process
+            self.index.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+        self.hits += 1
+        return zlib.decompress(mapped[offset:offset + length])
+
+    def _writer(self):
+        if self._segment_file is not None and self._segment_file.tell() >= self.segment_size:
+            self._segment_file.close()
+            self.index.execute("UPDATE segments SET sealed = 1 WHERE segment = ?", (self._segment,))
+            self._segment_file = None
+        if self._segment_file is None:
+            self._segment = self.index.execute("INSERT INTO segments (size) VALUES (0)").lastrowid
+            self._segment_file = open(self._segment_path(self._segment), "ab")
+            self._evict()
+        return self._segment_file
+
+    def put(self, key: str, value: bytes) -> None:
+        data = zlib.compress(value, COMPRESSION_LEVEL)
+        f = self._writer()
+        offset = f.tell()
+        f.write(data)
+        f.flush()
+        self.index.execute("INSERT OR REPLACE INTO entries (key, segment, offset, length) VALUES (?, ?, ?, ?)",
+                           (key, self._segment, offset, len(data)))
+        self.index.execute("UPDATE segments SET size = ? WHERE segment = ?", (offset + len(data), self._segment))
+
+    def _evict(self) -> None:
+        total_size, = self.index.execute("SELECT COALESCE(SUM(size), 0) FROM segments").fetchone()
+        while total_size > self.max_size_bytes:
+            row = self.index.execute("SELECT segment, size FROM segments WHERE sealed = 1 "
+                                     "ORDER BY segment LIMIT 1").fetchone()
+            if row is None:
+                return
+            segment, size = row
+            self.index.execute("DELETE FROM entries WHERE segment = ?", (segment,))
+            self.index.execute("DELETE FROM segments WHERE segment = ?", (segment,))
+            mapped = self._maps.pop(segment, None)
+            if mapped is not None:
+                mapped.close()
+            try:
+                os.remove(self._segment_path(segment))
+            except FileNotFoundError:
+                pass
+            logger.info(f"Evicted cache segment {segment} ({size} bytes)")
+            total_size -= size
+
+    def get_result(self, method: str, params: List) -> Any:
+        """
+        Returns the cached result of a JSON-RPC call, or None if it is not cached.
+        """
+        key = cache_key(method, params)
+        if key is None:
+            return None
+        value = self.get(key)
+        return json_loads(value) if value is not None else None
+
+    def put_result(self, method: str, params: List, result: Any) -> None:
+        key = cache_key(method, params)
+        if key is not None and result is not None:
+            self.put(key, json_dumps(result))
+
+    def close(self) -> None:
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment_file = None
+            # no process appends to the segment anymore, so it can be evicted
+            self.index.execute("UPDATE segments SET sealed = 1 WHERE segment = ?", (self._segment,))
+        for mapped in self._maps.values():
+            mapped.close()
+        self._maps.clear()
+        self.index.close()
+
+
+def construct_cache_middleware(cache: BlockCache):
+    """
+    Creates a provider middleware that serves immutable calls from the local cache.
+    """
+
+    async def cache_middleware(
+            make_request: Callable[[RPCEndpoint, Any], Any], web3: Web3  # pylint: disable=unused-argument
+    ) -> Callable[[RPCEndpoint, Any], Coroutine[Any, Any, RPCResponse]]:
+
+        async def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            result = cache.get_result(method, params)
+            if result is not None:
+                return {"jsonrpc": "2.0", "id": 0, "result": result}
+            response = await make_request(method, params)
+            if "error" not in response:
+                cache.put_result(method, params, response.get("result"))
+            return response
+
+        return middleware
+
+    return cache_middleware
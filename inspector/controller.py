@@ -1,6 +1,7 @@
 import configparser
 from enum import Enum
-from multiprocessing import Pool
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Pool, cpu_count
 import traceback
 import asyncio
 import logging
@@ -10,29 +11,31 @@ from typing import Tuple, List
 import numpy as np
 import pandas as pd
 
+from inspector.base import Inspector
+from inspector.cache import BlockCache
+from inspector.endpoints import EndpointRegistry
+from inspector.etherscan import EtherscanCache
 from inspector.inspectors.block.block import BlockInspector
 from inspector.inspectors.tlsc.tlsc import TLSCInspector
 from inspector.inspectors.contract.contract import ContractInspector
-from inspector.utils import get_log_handler, clean_up_log_handlers
+from inspector.inspectors.follow.follow import FollowInspector
+from inspector.inspectors.scan.scan import ScanInspector
+from inspector.inspectors.token.token import TokenInspector
+from inspector.inspectors.trace.trace import TraceInspector
+from inspector.metrics import configure_metrics, clear_metrics, start_metrics_server
+from inspector.offload import set_offload_pool, shutdown_offload_pool
+from inspector.utils import start_log_listener, stop_log_listener
 from inspector.verified_contracts import inspect_verified_contracts
 from utils.db import get_inspect_session, create_tables
+from utils.profiling import clear_profiles, configure_profiler, run_profiled, write_report
 
 config = configparser.ConfigParser()
 config.read('config.ini')
 
+# written to the console and inspectors.log by the log listener
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-
-logs_path = Path(config['logs']['logs_path']) / "inspectors.log"
-
-formatter = logging.Formatter('%(asctime)s %(levelname)s:%(message)s')
-console_handler.setFormatter(formatter)
-
-logger.addHandler(console_handler)
-
 ETHERSCAN_API_KEYS = [
     "W371NBK6V9SAB8ETM3VFEIM93AJUQDZJGI",
     "I3T9RMRZVVQQ3U93VWKD46Q6IJ6YMYC8KY",
@@ -46,14 +49,29 @@ ETHERSCAN_API_KEYS = [
 ]
 
 
+def get_block_cache() -> BlockCache:
+    return BlockCache(
+        Path(config['cache']['cache_path']),
+        max_size_bytes=int(float(config['cache']['max_size_gb']) * 1024 ** 3),
+    )
+
+
+def get_etherscan_cache() -> EtherscanCache:
+    return EtherscanCache(Path(config['cache']['cache_path']) / "etherscan.sqlite")
+
+
 class InspectorType(Enum):
     BLOCK = "block"
     CONTRACT = "contract"
     TLSC = "tlsc"
     VERICON = "verified"
+    SCAN = "scan"
+    TOKEN = "token"
+    TRACE = "trace"
+    FOLLOW = "follow"
 
 
-def inspect_many(
+def create_inspector(
         index: int,
         task_batch,
         inspector_type: InspectorType,
@@ -61,9 +79,16 @@ def inspect_many(
         attributes: List[str] = None,
         max_concurrency: int = 1,
         request_timeout: int = 500,
-):
-    inspect_db_session = get_inspect_session()
-    tasks = (task_batch[0], task_batch[1])
+        raw: bool = False,
+        consumers: List[str] = None,
+        cache: bool = False,
+        balance_block: int | str = "latest",
+        token_addresses: List[str] = None,
+        hot_reload: bool = False,
+        required_capabilities: List[str] = (),
+        pool_endpoints: List[str] = None,
+) -> Inspector:
+    block_cache = get_block_cache() if cache else None
 
     if inspector_type == InspectorType.BLOCK:
         inspector = BlockInspector(
@@ -72,6 +97,9 @@ def inspect_many(
             request_timeout=request_timeout,
             etherscan_api_key=ETHERSCAN_API_KEYS[index % len(ETHERSCAN_API_KEYS)],
             attributes=attributes,
+            raw=raw,
+            cache=block_cache,
+            etherscan_cache=get_etherscan_cache(),
         )
         logger.info(f"Starting up block inspector {rpc} for blocks {task_batch[0]} to {task_batch[1]}")
     elif inspector_type == InspectorType.CONTRACT:
@@ -79,6 +107,9 @@ def inspect_many(
             rpc,
             max_concurrency=max_concurrency,
             request_timeout=request_timeout,
+            block_identifier=balance_block,
+            raw=raw,
+            cache=block_cache,
         )
         logger.info(f"Starting up contracts inspector {rpc} created in blocks {task_batch[0]} to {task_batch[1]}")
     elif inspector_type == InspectorType.TLSC:
@@ -86,61 +117,217 @@ def inspect_many(
             rpc,
             max_concurrency=max_concurrency,
             request_timeout=request_timeout,
+            raw=raw,
+            cache=block_cache,
         )
         logger.info(f"Starting up tlsc inspector {rpc} for blocks {task_batch[0]} to {task_batch[1]}")
-    elif inspector_type == InspectorType.VERICON:
+    elif inspector_type == InspectorType.SCAN:
+        inspector = ScanInspector(
+            rpc,
+            max_concurrency=max_concurrency,
+            request_timeout=request_timeout,
+            etherscan_api_key=ETHERSCAN_API_KEYS[index % len(ETHERSCAN_API_KEYS)],
+            consumers=consumers,
+            attributes=attributes,
+            raw=raw,
+            cache=block_cache,
+            etherscan_cache=get_etherscan_cache(),
+        )
+        logger.info(f"Starting up scan inspector {rpc} for blocks {task_batch[0]} to {task_batch[1]}")
+    elif inspector_type == InspectorType.TOKEN:
+        inspector = TokenInspector(
+            rpc,
+            max_concurrency=max_concurrency,
+            request_timeout=request_timeout,
+            token_addresses=token_addresses,
+            raw=raw,
+            cache=block_cache,
+        )
+        logger.info(f"Starting up token inspector {rpc} for blocks {task_batch[0]} to {task_batch[1]}")
+    elif inspector_type == InspectorType.TRACE:
+        inspector = TraceInspector(
+            rpc,
+            max_concurrency=max_concurrency,
+            request_timeout=request_timeout,
+            raw=raw,
+            cache=block_cache,
+        )
+        logger.info(f"Starting up trace inspector {rpc} for blocks {task_batch[0]} to {task_batch[1]}")
+    elif inspector_type == InspectorType.FOLLOW:
+        # without the caches, a block or a block reward cached by number would outlive a reorg
+        inspector = FollowInspector(
+            rpc,
+            pool_endpoints=pool_endpoints,
+            max_concurrency=max_concurrency,
+            request_timeout=request_timeout,
+            etherscan_api_key=ETHERSCAN_API_KEYS[index % len(ETHERSCAN_API_KEYS)],
+            consumers=consumers,
+            raw=raw,
+        )
+        logger.info(f"Starting up follower {rpc} from block {task_batch[0] or 'head'}")
+    else:
+        raise ValueError(f"Invalid inspector type {inspector_type}")
+
+    if hot_reload:
+        inspector.endpoint_registry = EndpointRegistry(Path(config['paths']['rpc_capabilities_path']), index,
+                                                       required_capabilities)
+    return inspector
+
+
+def inspect_many(
+        index: int,
+        task_batch,
+        inspector_type: InspectorType,
+        rpc: str,
+        attributes: List[str] = None,
+        **inspector_kwargs,
+):
+    inspect_db_session = get_inspect_session()
+    tasks = (task_batch[0], task_batch[1])
+
+    if inspector_type == InspectorType.VERICON:
         inspect_verified_contracts(inspect_db_session,
                                    tasks,
-                                   ETHERSCAN_API_KEYS[index % len(ETHERSCAN_API_KEYS)]
+                                   ETHERSCAN_API_KEYS,
+                                   get_etherscan_cache()
                                    )
         return
-    else:
-        raise ValueError(f"Invalid inspector type {inspector_type}")
 
+    inspector = create_inspector(index, task_batch, inspector_type, rpc, attributes, **inspector_kwargs)
     try:
-        asyncio.run(inspector.inspect_many(
+        asyncio.run(run_profiled(inspector.inspect_many(
             task_batch=tasks,
             inspect_db_session=inspect_db_session,
-        ), debug=False)
+        )), debug=False)
     except Exception as e:
         logger.error(f"Process {index} exited due to {type(e)}:\n{traceback.format_exc()}")
 
 
+async def inspect_many_endpoints(
+        rpc_inputs: List[Tuple],
+        inspector_type: InspectorType,
+        offload_workers: int,
+        **inspector_kwargs,
+) -> None:
+    """
+    Runs all the inspectors in one event loop, sharing a single DB session.
+    Every write commits before the next await, so the inspectors never interleave inside a transaction,
+    and a failed write is rolled back by the crud helpers before the next await too.
+    The CPU-bound steps are offloaded to a process pool to keep the loop responsive.
+    """
+    inspect_db_session = get_inspect_session()
+    set_offload_pool(ProcessPoolExecutor(max_workers=offload_workers))
+
+    async def run_inspector(index: int, task_batch, rpc: str, attributes: List[str]):
+        inspector = create_inspector(index, task_batch, inspector_type, rpc, attributes, **inspector_kwargs)
+        try:
+            await inspector.inspect_many(task_batch=task_batch, inspect_db_session=inspect_db_session)
+        except Exception as e:
+            # e.g. a failed read, the writes are already rolled back
+            inspect_db_session.rollback()
+            logger.error(f"Inspector {index} exited due to {type(e)}:\n{traceback.format_exc()}")
+
+    try:
+        await run_profiled(asyncio.gather(*[run_inspector(*_input) for _input in rpc_inputs]))
+    finally:
+        shutdown_offload_pool()
+        inspect_db_session.close()
+
+
 def run_inspectors(
         task_batches: np.ndarray[Tuple[int, int]],
         rpc_urls: pd.DataFrame,
         inspector_cnt: int,
         inspector_type: InspectorType = InspectorType.TLSC,
         attributes: List[str] = None,
+        raw: bool = False,
+        consumers: List[str] = None,
+        cache: bool = False,
+        balance_block: int | str = "latest",
+        token_addresses: List[str] = None,
+        hot_reload: bool = False,
+        required_capabilities: List[str] = (),
+        single_process: bool = False,
+        max_concurrency: int = 1,
+        offload_workers: int = None,
+        metrics_port: int = None,
+        profile: float = None,
 ) -> None:
-    log_file_handler = get_log_handler(logs_path, formatter, rotate=False)
-    logger.addHandler(log_file_handler)
+    # started before the workers are forked, so they all enqueue their records to it
+    start_log_listener()
+    try:
+        if metrics_port is not None:
+            # configured before the workers are forked, so they all snapshot to the same directory
+            metrics_path = Path(config['metrics']['metrics_path'])
+            configure_metrics(metrics_path)
+            clear_metrics(metrics_path)
+            start_metrics_server(metrics_port, metrics_path)
+            logger.info(f"Serving metrics on http://127.0.0.1:{metrics_port}/metrics")
 
-    if inspector_cnt > len(rpc_urls):
-        logger.warning(f"Number of inspectors ({inspector_cnt}) exceeds number of RPC URLs ({len(rpc_urls)}).")
+        profile_path = Path(config['profiling']['profile_path'])
+        if profile is not None:
+            clear_profiles(profile_path)
+            configure_profiler(profile, profile_path, "inspector")
 
-    create_tables()
+        if len(rpc_urls) == 0 and inspector_type != InspectorType.VERICON:
+            # e.g. no synced endpoint of the capabilities file has the capabilities required by the options
+            raise ValueError(f"No RPC endpoint left (required capabilities: {list(required_capabilities)}), "
+                             f"run the vitals check again or drop the options that require them")
+        if inspector_cnt > len(rpc_urls):
+            logger.warning(f"Number of inspectors ({inspector_cnt}) exceeds number of RPC URLs ({len(rpc_urls)}).")
 
-    rpc_inputs = [
-        (
-            i,  # inspectors index
-            (int(task_batches[i]), int(task_batches[i + 1])),  # (after_block, before_block)
-            f"http://{rpc_urls.ip[i % len(rpc_urls)]}:8545/",  # rpc
-            attributes,  # attributes
-            # 4,                                               # max_concurrency
-        )
-        for i in range(inspector_cnt)
-    ]
+        create_tables()
+
+        if inspector_type == InspectorType.VERICON:
+            # bound by the Etherscan rate limits, a single client uses the whole key pool for the whole range
+            inspect_many(0, (int(task_batches[0]), int(task_batches[-1])), inspector_type, "")
+            logger.info("All inspectors finished")
+            return
+
+        if inspector_type == InspectorType.FOLLOW:
+            # a single follower, the other endpoints of the pool are only polled for their head
+            pool_endpoints = [f"http://{ip}:8545/" for ip in rpc_urls.ip]
+            inspect_many(0, (task_batches[0], None), inspector_type, pool_endpoints[0], attributes, raw=raw,
+                         consumers=consumers, max_concurrency=max_concurrency, pool_endpoints=pool_endpoints)
+            logger.info("Follower stopped")
+            return
+
+        rpc_inputs = [
+            (
+                i,  # inspectors index
+                (int(task_batches[i]), int(task_batches[i + 1])),  # (after_block, before_block)
+                f"http://{rpc_urls.ip[i % len(rpc_urls)]}:8545/",  # rpc
+                attributes,  # attributes
+                # 4,                                               # max_concurrency
+            )
+            for i in range(inspector_cnt)
+        ]
+
+        inspector_kwargs = {"raw": raw, "consumers": consumers, "cache": cache, "balance_block": balance_block,
+                            "token_addresses": token_addresses, "hot_reload": hot_reload,
+                            "required_capabilities": required_capabilities, "max_concurrency": max_concurrency}
 
-    with Pool(processes=inspector_cnt) as pool:
-        processes = [pool.apply_async(inspect_many, args=(_input[0], _input[1], inspector_type, _input[2], _input[3]))
-                     for _input in rpc_inputs]
+        if single_process:
+            asyncio.run(inspect_many_endpoints(rpc_inputs, inspector_type, offload_workers or cpu_count(),
+                                               **inspector_kwargs), debug=False)
+        else:
+            with Pool(processes=inspector_cnt) as pool:
+                processes = [pool.apply_async(inspect_many,
+                                              args=(_input[0], _input[1], inspector_type, _input[2], _input[3]),
+                                              kwds=inspector_kwargs)
+                             for _input in rpc_inputs]
 
-        for process in processes:
-            try:
-                process.get()
-            except Exception as e:
-                logger.error(f"Process exited due to {type(e)}:\n{traceback.format_exc()}")
+                for process in processes:
+                    try:
+                        process.get()
+                    except Exception as e:
+                        logger.error(f"Process exited due to {type(e)}:\n{traceback.format_exc()}")
+                # let the workers exit on their own, so they flush their queued log records
+                pool.close()
+                pool.join()
 
-    logger.info("All inspectors finished")
-    clean_up_log_handlers(logger)
+        if profile is not None:
+            logger.info(f"Stage breakdown written to {write_report(profile_path)}")
+        logger.info("All inspectors finished")
+    finally:
+        stop_log_listener()
@@ -0,0 +1,46 @@
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class EndpointRegistry:
+    """
+    Hot-reloaded view of the ranked endpoints published by the registry daemon (rpc_finder/rpc_registry.py).
+    The file is only read again when its modification time changes, so checking it before every batch is cheap.
+    """
+
+    def __init__(self, capabilities_path: Path, index: int, required_capabilities=(), port: int = 8545):
+        self.capabilities_path = capabilities_path
+        self.index = index
+        self.required_capabilities = list(required_capabilities)
+        self.port = port
+        self.endpoints: List[str] = []
+        self.mtime = None
+
+    def reload(self) -> bool:
+        try:
+            mtime = self.capabilities_path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self.mtime:
+            return False
+        hosts = pd.read_csv(self.capabilities_path)
+        hosts = hosts[hosts["synced"]]
+        for capability in self.required_capabilities:
+            hosts = hosts[hosts[capability]]
+        self.endpoints = [f"http://{ip_address}:{self.port}/" for ip_address in hosts["ip_address"]]
+        self.mtime = mtime
+        return True
+
+    def replacement(self, rpc_endpoint: str) -> Optional[str]:
+        """
+        Gets the endpoint to switch to, None if the current one is still live.
+        Each inspector keeps its own slot of the ranking, so the load stays spread over the endpoints.
+        """
+        if not self.reload() or not self.endpoints or rpc_endpoint in self.endpoints:
+            return None
+        return self.endpoints[self.index % len(self.endpoints)]
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import aiohttp
+
+from inspector.retry import aiohttp_exceptions
+from inspector.utils import json_loads, json_dumps
+
+ETHERSCAN_API_URL = "https://api.etherscan.io/api"
+# free plan limit, https://docs.etherscan.io/support/rate-limits
+ETHERSCAN_CALLS_PER_SECOND = 5
+# contracts can get verified later, so "not verified" answers are only kept for a while
+NOT_VERIFIED_TTL_SECONDS = 7 * 24 * 3600
+
+logger = logging.getLogger(__name__)
+
+
+class EtherscanError(RuntimeError):
+    pass
+
+
+class EtherscanCache:
+    """
+    Persistent cache of Etherscan results keyed by the request parameters (API key excluded).
+    Immutable results are kept forever, others expire after their TTL.
+    """
+
+    def __init__(self, cache_path: Path):
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        self.index = sqlite3.connect(cache_path, timeout=60, isolation_level=None)
+        self.index.execute("PRAGMA journal_mode=WAL")
+        self.index.execute("PRAGMA synchronous=NORMAL")
+        self.index.execute("CREATE TABLE IF NOT EXISTS responses "
+                           "(key TEXT PRIMARY KEY, result BLOB NOT NULL, expires_at REAL)")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def request_key(params: Dict) -> str:
+        return "&".join(f"{name}={params[name]}" for name in sorted(params) if name != "apikey")
+
+    def get(self, key: str) -> Any:
+        row = self.index.execute("SELECT result, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json_loads(row[0])
+
+    def put(self, key: str, result: Any, ttl_seconds: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl_seconds if ttl_seconds is not None else None
+        self.index.execute("INSERT OR REPLACE INTO responses (key, result, expires_at) VALUES (?, ?, ?)",
+                           (key, json_dumps(result), expires_at))
+
+    def close(self) -> None:
+        self.index.close()
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter, refilled continuously at rate tokens per second up to capacity.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def wait_time(self) -> float:
+        return max(0.0, (1 - self.refill()) / self.rate)
+
+
+class EtherscanClient:
+    """
+    Async Etherscan client that owns a pool of API keys.
+    Each key has its own token bucket, calls take the key with the most tokens left,
+    so the pool is saturated without exceeding the limit of any key.
+    Rate-limited and failed calls are retried with exponential backoff.
+    Cacheable calls are answered from the cache first and never reach the API.
+    """
+
+    def __init__(
+            self,
+            api_keys: List[str],
+            calls_per_second: float = ETHERSCAN_CALLS_PER_SECOND,
+            retries: int = 5,
+            backoff_time_seconds: float = 1,
+            request_timeout: int = 60,
+            cache: EtherscanCache = None,
+            api_url: str = ETHERSCAN_API_URL,
+    ):
+        if not api_keys:
+            raise ValueError("At least one Etherscan API key is required")
+        self.api_keys = api_keys
+        self.api_url = api_url
+        self.cache = cache
+        self.buckets = [TokenBucket(calls_per_second) for _ in api_keys]
+        self.retries = retries
+        self.backoff_time_seconds = backoff_time_seconds
+        self.timeout = aiohttp.ClientTimeout(total=request_timeout)
+        # enough pooled connections for every call that the buckets allow in flight
+        self.connection_limit = max(1, int(len(api_keys) * calls_per_second * 2))
+        self._session: aiohttp.ClientSession | None = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # the session must be created inside the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=self.connection_limit),
+            )
+        return self._session
+
+    async def _acquire_key(self) -> str:
+        while True:
+            key_index = max(range(len(self.buckets)), key=lambda i: self.buckets[i].refill())
+            bucket = self.buckets[key_index]
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return self.api_keys[key_index]
+            await asyncio.sleep(bucket.wait_time())
+
+    async def get(self, params: Dict, ttl_seconds: Callable[[Any], Optional[float]] = None) -> Any:
+        """
+        Calls the Etherscan API with the given query parameters.
+        :param params: Query parameters, without the API key
+        :param ttl_seconds: Makes the call cacheable, gives the TTL of a result (None to keep it forever)
+        :return: The result field of the response
+        """
+        key = EtherscanCache.request_key(params) if self.cache is not None and ttl_seconds is not None else None
+        if key is not None:
+            result = self.cache.get(key)
+            if result is not None:
+                return result
+
+        result = await self._request(params)
+        if key is not None:
+            self.cache.put(key, result, ttl_seconds(result))
+        return result
+
+    async def _request(self, params: Dict) -> Any:
+        session = await self._get_session()
+        for i in range(self.retries):
+            api_key = await self._acquire_key()
+            try:
+                async with session.get(self.api_url, params={**params, "apikey": api_key}) as response:
+                    response.raise_for_status()
+                    data = await response.json(content_type=None)
+            except aiohttp_exceptions + (asyncio.TimeoutError,):
+                logger.error(f"Etherscan request failed, retrying: {i}/{self.retries}")
+            else:
+                if data.get("status") == "1" or not isinstance(data.get("result"), str):
+                    return data["result"]
+                if "rate limit" not in data["result"].lower():
+                    raise EtherscanError(f"Etherscan {params.get('action')} failed: {data['result']}")
+                logger.warning(f"Etherscan rate limit reached, retrying: {i}/{self.retries}")
+            if i < (self.retries - 1):
+                await asyncio.sleep(self.backoff_time_seconds * (2 ** i))
+        raise EtherscanError(f"Etherscan {params.get('action')} failed after {self.retries} retries")
+
+    async def get_source_code(self, contract_address: str) -> Dict:
+        # https://docs.etherscan.io/api-endpoints/contracts#get-contract-source-code-for-verified-contract-source-codes
+        result = await self.get(
+            {"module": "contract", "action": "getsourcecode", "address": contract_address.lower()},
+            ttl_seconds=lambda result: NOT_VERIFIED_TTL_SECONDS if result[0]["SourceCode"] == "" else None,
+        )
+        return result[0]
+
+    async def get_block_reward(self, block_number: int) -> Dict:
+        # https://docs.etherscan.io/api-endpoints/blocks#get-block-and-uncle-rewards-by-blockno
+        return await self.get({"module": "block", "action": "getblockreward", "blockno": block_number},
+                              ttl_seconds=lambda result: None)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,117 @@
+from typing import Callable, Dict, List, Tuple
+
+from web3 import Web3
+
+from inspector.raw_rpc import RawRPCClient, request_many
+
+# sources of block attributes, from the cheapest to the most expensive
+TX_COUNT_SOURCE = "tx_count"  # eth_getBlockTransactionCountByNumber
+HEADER_SOURCE = "header"  # eth_getBlockByNumber without transactions
+FEE_HISTORY_SOURCE = "fee_history"  # one eth_feeHistory call for the whole range
+RECEIPTS_SOURCE = "receipts"  # eth_getBlockReceipts
+
+# eth_feeHistory returns at most 1024 blocks per call
+MAX_FEE_HISTORY_BLOCKS = 1024
+# blocks per flush, attribute calls are small so batches can be much larger than for full blocks
+ATTRIBUTE_BATCH_SIZE = 1000
+
+
+def _gas_fee(sources: Dict[str, List], i: int) -> int:
+    # miner fee = sum of priority fees, i.e., transactions fee - burnt fee (EIP-1559). Post-merge only
+    base_fee_per_gas = int(sources[HEADER_SOURCE][i].get("baseFeePerGas") or "0x0", 16)
+    return sum(
+        (int(receipt["effectiveGasPrice"], 16) - base_fee_per_gas) * int(receipt["gasUsed"], 16)
+        for receipt in sources[RECEIPTS_SOURCE][i]
+    )
+
+
+# attribute -> (sources it needs, extractor of the attribute value of the i-th block)
+BLOCK_ATTRIBUTES: Dict[str, Tuple[Tuple[str, ...], Callable[[Dict[str, List], int], object]]] = {
+    "tx_count": ((TX_COUNT_SOURCE,), lambda sources, i: int(sources[TX_COUNT_SOURCE][i], 16)),
+    "miner_address": ((HEADER_SOURCE,),
+                      lambda sources, i: Web3.to_checksum_address(sources[HEADER_SOURCE][i]["miner"])),
+    "gas_used": ((HEADER_SOURCE,), lambda sources, i: int(sources[HEADER_SOURCE][i]["gasUsed"], 16)),
+    "gas_limit": ((HEADER_SOURCE,), lambda sources, i: int(sources[HEADER_SOURCE][i]["gasLimit"], 16)),
+    "base_fee_per_gas": ((FEE_HISTORY_SOURCE,), lambda sources, i: sources[FEE_HISTORY_SOURCE][i]),
+    "gas_fee": ((HEADER_SOURCE, RECEIPTS_SOURCE), _gas_fee),
+}
+
+
+def validate_attributes(attributes: List[str]) -> None:
+    for attribute in attributes:
+        if attribute not in BLOCK_ATTRIBUTES:
+            raise ValueError(f"Invalid attribute {attribute}, must be one of {list(BLOCK_ATTRIBUTES)}")
+
+
+def get_sources(attributes: List[str]) -> List[str]:
+    """
+    Groups the requested attributes by the RPC calls they need.
+    """
+    sources = []
+    for attribute in attributes:
+        for source in BLOCK_ATTRIBUTES[attribute][0]:
+            if source not in sources:
+                sources.append(source)
+    return sources
+
+
+async def _fetch_fee_history(web3: Web3, block_numbers: List[int], raw_client: RawRPCClient = None) -> List[int]:
+    base_fees_per_gas: List[int] = []
+    for i in range(0, len(block_numbers), MAX_FEE_HISTORY_BLOCKS):
+        chunk = block_numbers[i:i + MAX_FEE_HISTORY_BLOCKS]
+        fee_history, = await request_many(
+            web3, [("eth_feeHistory", [hex(len(chunk)), hex(chunk[-1]), []])], raw_client)
+        # the last entry is the base fee of the block after the newest one
+        base_fees_per_gas.extend(int(base_fee, 16) for base_fee in fee_history["baseFeePerGas"][:len(chunk)])
+    return base_fees_per_gas
+
+
+async def fetch_sources(
+        web3: Web3,
+        sources: List[str],
+        block_numbers: List[int],
+        raw_client: RawRPCClient = None,
+) -> Dict[str, List]:
+    """
+    Fetches the given sources for consecutive blocks, batching the calls of each source.
+    :return: Map of source to its unformatted JSON results, aligned with block_numbers
+    """
+    fetched: Dict[str, List] = {}
+    for source in sources:
+        if source == TX_COUNT_SOURCE:
+            calls = [("eth_getBlockTransactionCountByNumber", [hex(block_number)]) for block_number in block_numbers]
+        elif source == HEADER_SOURCE:
+            calls = [("eth_getBlockByNumber", [hex(block_number), False]) for block_number in block_numbers]
+        elif source == RECEIPTS_SOURCE:
+            calls = [("eth_getBlockReceipts", [hex(block_number)]) for block_number in block_numbers]
+        elif source == FEE_HISTORY_SOURCE:
+            fetched[source] = await _fetch_fee_history(web3, block_numbers, raw_client)
+            continue
+        else:
+            raise ValueError(f"Invalid attribute source {source}")
+        fetched[source] = await request_many(web3, calls, raw_client)
+    return fetched
+
+
+async def fetch_block_attributes(
+        web3: Web3,
+        attributes: List[str],
+        block_numbers: List[int],
+        raw_client: RawRPCClient = None,
+) -> List[Dict]:
+    """
+    Fetches the attributes of consecutive blocks with the cheapest calls that provide them.
+    :param web3: Web3 provider
+    :param attributes: Attributes to fetch, keys of BLOCK_ATTRIBUTES
+    :param block_numbers: Consecutive block numbers
+    :param raw_client: Raw JSON-RPC client, if given the calls are sent as JSON-RPC batches
+    :return: Rows of the blocks table with block_number and the attributes
+    """
+    sources = await fetch_sources(web3, get_sources(attributes), block_numbers, raw_client)
+    return [
+        {
+            "block_number": block_number,
+            **{attribute: BLOCK_ATTRIBUTES[attribute][1](sources, i) for attribute in attributes},
+        }
+        for i, block_number in enumerate(block_numbers)
+    ]
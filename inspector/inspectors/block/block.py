@@ -6,13 +6,16 @@ from typing import Tuple, List
 from sqlalchemy import orm, desc
 from sqlalchemy.orm import Session
 
-from inspector.base import Inspector
+from inspector.base import Inspector, iter_block_ranges
+from inspector.cache import BlockCache
+from inspector.etherscan import ETHERSCAN_API_URL, EtherscanCache, EtherscanClient
+from inspector.inspectors.block.attributes import ATTRIBUTE_BATCH_SIZE, validate_attributes
 from inspector.inspectors.block.inspect_batch import inspect_many_blocks, inspect_many_attributes
 from inspector.models.block.model import Block
 from inspector.utils import configure_logger, clean_up_log_handlers
 
 
-def _get_last_inspected_block(session: Session, after_block: int, before_block: int, attributes: List[str]) -> int:
+def get_last_inspected_block(session: Session, after_block: int, before_block: int, attributes: List[str]) -> int:
     """
     Gets the last block that was inspected and stored on DB.
     Might be better to modify it and move it to pre-exec stages.
@@ -31,10 +34,9 @@ def _get_last_inspected_block(session: Session, after_block: int, before_block:
         if latest_block is not None and latest_block[0] > after_block:
             after_block = latest_block[0] + 1
     else:
-        # todo: For now it's just tx_count, need to update for other attributes
         latest_block = session.query(Block.block_number) \
             .filter(Block.block_number < before_block) \
-            .filter(Block.tx_count.isnot(None)) \
+            .filter(*[getattr(Block, attribute).isnot(None) for attribute in attributes]) \
             .order_by(desc(Block.block_number)) \
             .first()
         if latest_block is not None and latest_block[0] > after_block:
@@ -51,11 +53,21 @@ class BlockInspector(Inspector):
             request_timeout: int = 300,
             etherscan_api_key: str = "",
             attributes: list = None,
+            raw: bool = False,
+            cache: BlockCache = None,
+            etherscan_cache: EtherscanCache = None,
+            etherscan_api_url: str = ETHERSCAN_API_URL,
     ):
-        super().__init__(rpc_endpoint, max_concurrency, request_timeout)
-        self.etherscan_api_key = etherscan_api_key
+        super().__init__(rpc_endpoint, max_concurrency, request_timeout, raw=raw, cache=cache)
+        self.etherscan_client = EtherscanClient([etherscan_api_key], cache=etherscan_cache, api_url=etherscan_api_url)
+        if attributes is not None:
+            validate_attributes(attributes)
         self.attributes = attributes
 
+    async def close(self) -> None:
+        await self.etherscan_client.close()
+        await super().close()
+
     async def inspect_many(
             self,
             inspect_db_session: orm.Session,
@@ -65,32 +77,21 @@ class BlockInspector(Inspector):
         self.logger = configure_logger(self.host)
         after_block, before_block = task_batch
 
-        after_block = _get_last_inspected_block(inspect_db_session, after_block, before_block, self.attributes)
-
-        tasks = []
-        sem = asyncio.Semaphore(self.max_concurrency)
-        for block_number in range(after_block, before_block, batch_size):
-            batch_after_block = block_number
-            batch_before_block = min(block_number + batch_size, before_block)
-            tasks.append(
-                asyncio.ensure_future(
-                    self.safe_inspect_many(
-                        inspect_db_session=inspect_db_session,
-                        task_batch=(batch_after_block, batch_before_block),
-                        semaphore=sem
-                    )
-                )
-            )
+        after_block = get_last_inspected_block(inspect_db_session, after_block, before_block, self.attributes)
+        if self.attributes is not None:
+            batch_size = max(batch_size, ATTRIBUTE_BATCH_SIZE)
 
         self.logger.info(f"{self.host}: Gathered {before_block - after_block} blocks to inspect")
         try:
-            await asyncio.gather(*tasks)
+            await self.run_batches(inspect_db_session,
+                                   iter_block_ranges(after_block, before_block, batch_size))
         except CancelledError:
             self.logger.info(f"{self.host}: Requested to exit, cleaning up...")
         except Exception:
             self.logger.error(f"{self.host}: Exited due to {traceback.print_exc()}")
             raise
         finally:
+            await self.close()
             clean_up_log_handlers(self.logger)
 
     async def safe_inspect_many(
@@ -102,17 +103,14 @@ class BlockInspector(Inspector):
         after_block_number, before_block_number = task_batch
         async with semaphore:
             if self.attributes is None:
-                # https://docs.etherscan.io/api-endpoints/blocks#get-block-and-uncle-rewards-by-blockno
-                etherscan_block_reward_url = (
-                    f"https://api.etherscan.io/api?module=block&action=getblockreward&blockno={{"
-                    f"}}&apikey={self.etherscan_api_key}")
                 await self.batch_queue.put(await inspect_many_blocks(
                     self.w3,
                     after_block_number,
                     before_block_number,
                     logger=self.logger,
                     inspect_db_session=inspect_db_session,
-                    etherscan_block_reward_url=etherscan_block_reward_url,
+                    etherscan_client=self.etherscan_client,
+                    raw_client=self.raw_client,
                 ))
             else:
                 await self.batch_queue.put(await inspect_many_attributes(
@@ -122,4 +120,5 @@ class BlockInspector(Inspector):
                     logger=self.logger,
                     inspect_db_session=inspect_db_session,
                     attributes=self.attributes,
+                    raw_client=self.raw_client,
                 ))
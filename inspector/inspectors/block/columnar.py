@@ -0,0 +1,184 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from inspector.raw_rpc import RawBlock, RawTransaction
+
+UINT64_MASK = (1 << 64) - 1
+
+
+class AddressIndex:
+    """
+    Maps lowercase addresses to dense integer ids.
+    Tracked contracts get the ids 0..contract_count-1, so matching a transaction against
+    the contract set is a single comparison on the id arrays.
+    Addresses that are not in the index map to -1.
+    """
+
+    def __init__(self, contract_addresses: Iterable[str]):
+        # keep the addresses as stored in DB, they are the keys for the updates
+        self.contract_addresses: List[str] = list(contract_addresses)
+        self.ids: Dict[str, int] = {}
+        for contract_id, contract_address in enumerate(self.contract_addresses):
+            self.ids.setdefault(contract_address.lower(), contract_id)
+        self.contract_count = len(self.contract_addresses)
+        self._next_id = self.contract_count
+
+    def add(self, address: str) -> int:
+        """
+        Adds a non-contract address (e.g. a miner) to the index and returns its id.
+        """
+        address_id = self.ids.get(address)
+        if address_id is None:
+            address_id = self._next_id
+            self.ids[address] = address_id
+            self._next_id += 1
+        return address_id
+
+    def lookup(self, addresses: List[Optional[str]]) -> np.ndarray:
+        get = self.ids.get
+        return np.fromiter((get(address, -1) for address in addresses), dtype=np.int64, count=len(addresses))
+
+    def is_contract(self, address_ids: np.ndarray) -> np.ndarray:
+        return (address_ids >= 0) & (address_ids < self.contract_count)
+
+
+class BlockBatch(NamedTuple):
+    """
+    Transactions of several blocks in columnar form. Per-transaction arrays are aligned,
+    tx_block holds the index of the transaction's block in the per-block arrays.
+    """
+    block_numbers: np.ndarray  # (blocks,)
+    miner_ids: np.ndarray  # (blocks,)
+    tx_block: np.ndarray  # (txs,)
+    to_ids: np.ndarray  # (txs,) -1 for unknown addresses and contract creations
+    from_ids: np.ndarray  # (txs,)
+    value_hi: np.ndarray  # (txs,) upper 64 bits of the wei value
+    value_lo: np.ndarray  # (txs,) lower 64 bits of the wei value
+    values: List[int]  # exact wei values
+    tx_hashes: List[str]
+
+
+def split_wei(values: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Splits exact wei values into (hi, lo) uint64 arrays, which compare like the original values
+    when ordered lexicographically.
+    """
+    value_hi = np.fromiter((value >> 64 for value in values), dtype=np.uint64, count=len(values))
+    value_lo = np.fromiter((value & UINT64_MASK for value in values), dtype=np.uint64, count=len(values))
+    return value_hi, value_lo
+
+
+def build_block_batch(blocks: List[RawBlock], address_index: AddressIndex) -> BlockBatch:
+    """
+    Decodes the transactions of the given blocks into a columnar batch.
+    :param blocks: Compact block records
+    :param address_index: Index of the tracked contracts, miners are added to it
+    :return: The columnar batch
+    """
+    miner_ids = np.array([address_index.add(block.miner) for block in blocks], dtype=np.int64)
+    tx_block = np.repeat(np.arange(len(blocks), dtype=np.int64), [len(block.transactions) for block in blocks])
+
+    transactions = [tx for block in blocks for tx in block.transactions]
+    if transactions:
+        tx_hashes, from_addresses, to_addresses, values = (list(column) for column in zip(*transactions))
+    else:
+        tx_hashes, from_addresses, to_addresses, values = [], [], [], []
+    value_hi, value_lo = split_wei(values)
+
+    return BlockBatch(
+        block_numbers=np.array([block.number for block in blocks], dtype=np.int64),
+        miner_ids=miner_ids,
+        tx_block=tx_block,
+        to_ids=address_index.lookup(to_addresses),
+        from_ids=address_index.lookup(from_addresses),
+        value_hi=value_hi,
+        value_lo=value_lo,
+        values=values,
+        tx_hashes=tx_hashes,
+    )
+
+
+def build_transfer_batch(transfers: List[Tuple[int, RawTransaction]], address_index: AddressIndex) -> BlockBatch:
+    """
+    Decodes value transfers that are not top-level transactions (e.g. internal calls) into a columnar batch.
+    Each transfer gets its own entry in the per-block arrays and there are no miners.
+    :param transfers: (block number, transfer) pairs, the transfer hash being its transaction's hash
+    :param address_index: Index of the tracked contracts
+    :return: The columnar batch
+    """
+    if transfers:
+        block_numbers, transactions = (list(column) for column in zip(*transfers))
+        tx_hashes, from_addresses, to_addresses, values = (list(column) for column in zip(*transactions))
+    else:
+        block_numbers, tx_hashes, from_addresses, to_addresses, values = [], [], [], [], []
+    value_hi, value_lo = split_wei(values)
+
+    return BlockBatch(
+        block_numbers=np.array(block_numbers, dtype=np.int64),
+        miner_ids=np.full(len(transfers), -1, dtype=np.int64),
+        tx_block=np.arange(len(transfers), dtype=np.int64),
+        to_ids=address_index.lookup(to_addresses),
+        from_ids=address_index.lookup(from_addresses),
+        value_hi=value_hi,
+        value_lo=value_lo,
+        values=values,
+        tx_hashes=tx_hashes,
+    )
+
+
+def coinbase_transfers_wei(batch: BlockBatch) -> List[int]:
+    """
+    Sums the value sent to the miner of each block, in wei.
+    """
+    transfers = [0] * len(batch.block_numbers)
+    is_coinbase = batch.to_ids == batch.miner_ids[batch.tx_block]
+    for tx_index in np.flatnonzero(is_coinbase):
+        transfers[batch.tx_block[tx_index]] += batch.values[tx_index]
+    return transfers
+
+
+def largest_value_indices(group_ids: np.ndarray, value_hi: np.ndarray, value_lo: np.ndarray) -> Dict[int, int]:
+    """
+    Finds the position of the largest value per group. Ties go to the earliest position.
+    :param group_ids: Group (e.g. contract id) of each value
+    :param value_hi: Upper 64 bits of each value
+    :param value_lo: Lower 64 bits of each value
+    :return: Map of group id to the position of its largest value
+    """
+    if group_ids.size == 0:
+        return {}
+    positions = np.arange(group_ids.size, dtype=np.int64)
+    # lexsort sorts by the last key first, i.e. by group, then value, then reversed position
+    order = np.lexsort((-positions, value_lo, value_hi, group_ids))
+    sorted_groups = group_ids[order]
+    last_of_group = np.flatnonzero(np.r_[sorted_groups[1:] != sorted_groups[:-1], True])
+    return dict(zip(sorted_groups[last_of_group].tolist(), order[last_of_group].tolist()))
+
+
+def largest_contract_transactions(batch: BlockBatch, address_index: AddressIndex) -> Dict[int, int]:
+    """
+    Finds the largest transaction of each tracked contract in the batch.
+    A transaction counts for its recipient if it is a tracked contract, otherwise for its sender.
+    :return: Map of contract id to the index of its largest transaction
+    """
+    to_contract = address_index.is_contract(batch.to_ids)
+    from_contract = ~to_contract & address_index.is_contract(batch.from_ids)
+    matched = np.flatnonzero(to_contract | from_contract)
+    contract_ids = np.where(to_contract, batch.to_ids, batch.from_ids)[matched]
+
+    largest = largest_value_indices(contract_ids, batch.value_hi[matched], batch.value_lo[matched])
+    return {contract_id: int(matched[position]) for contract_id, position in largest.items()}
+
+
+def touched_contracts(batch: BlockBatch, address_index: AddressIndex) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the tracked contracts whose balance may have changed in each block,
+    i.e. the senders and recipients of its transactions and its miner.
+    :return: Block positions and contract ids of the unique (block, contract) pairs, ordered by block
+    """
+    block_positions = np.concatenate((batch.tx_block, batch.tx_block, np.arange(len(batch.block_numbers))))
+    address_ids = np.concatenate((batch.to_ids, batch.from_ids, batch.miner_ids))
+    is_contract = address_index.is_contract(address_ids)
+    pairs = np.unique(np.stack((block_positions[is_contract], address_ids[is_contract]), axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
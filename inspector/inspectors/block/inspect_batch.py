@@ -2,29 +2,33 @@ import asyncio
 from logging import Logger
 from typing import List, Tuple, Dict
 
-import aiohttp
-from aiohttp import ClientSession
 from sqlalchemy import orm, select
 from web3 import Web3
 
+from inspector.etherscan import EtherscanClient
 from inspector.models.block.model import Block
 from inspector.models.contract_info.model import ContractInfo
-from inspector.models.crud import insert_data, update_data
-
-ETH_TO_WEI = 1e18
-
-
-async def _fetch_block_info(w3: Web3, block_number: int) -> Tuple[str, int, int, List]:
-    """
-    Fetches block info from web3.
-
-    :param w3: Web3 provider
-    :param block_number: Block number to fetch
-    :return: Tuple of miner address, gas used, gas limit, transactions
-    """
-    # need to fetch gasUsed for each transaction, which is not in this response
-    block_info = await w3.eth.get_block(block_number, full_transactions=True)
-    return block_info['miner'], block_info['gasUsed'], block_info['gasLimit'], block_info['transactions']
+from inspector.models.crud import update_data, bulk_update_data
+from inspector.inspectors.block.attributes import fetch_block_attributes
+from inspector.inspectors.block.rollups import write_blocks
+from inspector.inspectors.block.columnar import (
+    AddressIndex,
+    BlockBatch,
+    build_block_batch,
+    coinbase_transfers_wei,
+    largest_contract_transactions,
+)
+from inspector.raw_rpc import RawBlock, RawRPCClient, fetch_block
+from utils.profiling import span
+
+# attributes that can be read from a block fetched with all its transactions
+FULL_BLOCK_ATTRIBUTES = {
+    "tx_count": lambda block: len(block.transactions),
+    "miner_address": lambda block: Web3.to_checksum_address(block.miner),
+    "gas_used": lambda block: block.gas_used,
+    "gas_limit": lambda block: block.gas_limit,
+    "base_fee_per_gas": lambda block: block.base_fee_per_gas or 0,
+}
 
 
 # https://web3py.readthedocs.io/en/stable/web3.eth.html#web3.eth.Eth.fee_history
@@ -40,14 +44,51 @@ async def _fetch_base_fees_per_gas(
     return base_fees_per_gas
 
 
-async def _fetch_etherscan_data(
-        session: ClientSession,
-        url: str
-) -> Dict:
-    # Fetch etherscan data asynchronously
-    async with session.get(url) as response:
-        data = await response.json()
-        return data
+def load_contract_index(inspect_db_session: orm.Session) -> Tuple[AddressIndex, List[int | None]]:
+    """
+    Loads the known contracts and their largest transaction value.
+    :param inspect_db_session: DB session
+    :return: Tuple of the contract index and the largest transaction values (wei) aligned with its ids
+    """
+    sc_query_response = inspect_db_session.execute(
+        select(ContractInfo.contract_address, ContractInfo.largest_tx_value)).all()
+    address_index = AddressIndex(contract_address for contract_address, _ in sc_query_response)
+    largest_tx_values = [largest_tx_value for _, largest_tx_value in sc_query_response]
+    return address_index, largest_tx_values
+
+
+async def fetch_block_rewards(block_numbers: List[int], etherscan_client: EtherscanClient) -> List[int]:
+    """
+    Fetches the block rewards (wei) of the given blocks from Etherscan, concurrently within the client's rate limit.
+    """
+    block_rewards = await asyncio.gather(*[
+        etherscan_client.get_block_reward(block_number) for block_number in block_numbers
+    ])
+    return [int(block_reward['blockReward']) for block_reward in block_rewards]
+
+
+def get_block_rows(
+        blocks: List[RawBlock],
+        block_rewards: List[int],
+        base_fees_per_gas: List[int],
+        coinbase_transfers: List[int],
+) -> List[Dict]:
+    """
+    Builds the rows of the blocks table. All lists are aligned with blocks and hold wei amounts.
+    """
+    return [
+        {
+            "block_number": block.number,
+            "miner_address": Web3.to_checksum_address(block.miner),
+            "coinbase_transfer": coinbase_transfers[i],
+            "base_fee_per_gas": base_fees_per_gas[i],
+            "gas_fee": block_rewards[i],  # miner_fee = transactions_fee - burnt_fee (EIP-1559)
+            "gas_used": block.gas_used,
+            "gas_limit": block.gas_limit,
+            "tx_count": len(block.transactions)
+        }
+        for i, block in enumerate(blocks)
+    ]
 
 
 async def inspect_many_blocks(
@@ -56,66 +97,52 @@ async def inspect_many_blocks(
         before_block_number: int,
         logger: Logger,
         inspect_db_session: orm.Session,
-        etherscan_block_reward_url: str = None,
+        etherscan_client: EtherscanClient = None,
+        raw_client: RawRPCClient = None,
 ) -> None:
     """
     Inspects many blocks and writes them to DB.
     Fetches the miner revenue from block rewards and fees. (todo: MEV)
     Fetches the transactions that are from/to time-locked contracts. (todo: ERC20 tokens)
-    :param etherscan_block_reward_url: Etherscan API url for getting the block rewards
+    :param etherscan_client: Etherscan client for getting the block rewards
     :param web3: Web3 provider
     :param after_block_number: Block number to start from
     :param before_block_number: Block number to end with
     :param logger: Logger
     :param inspect_db_session: DB session
+    :param raw_client: Raw JSON-RPC client, if given blocks are fetched without web3 formatting
     :return: None
     """
-    all_blocks: List[Dict] = []
-    all_updated_info: List[Dict] = []
+    # get the addresses of all contracts and their largest transaction value
+    address_index, largest_tx_values = load_contract_index(inspect_db_session)
 
-    # get the addresses of all contracts and convert them to map of address to value
-    sc_query_response = inspect_db_session.execute(
-        select(ContractInfo.contract_address, ContractInfo.largest_tx_value)).all()
-    smart_contracts = {contract_address: largest_tx_value for contract_address, largest_tx_value in sc_query_response}
-
-    logger.info(f"Inspecting blocks {after_block_number} to {before_block_number}")
+    logger.info("Inspecting blocks %s to %s", after_block_number, before_block_number)
 
     base_fees_per_gas = await _fetch_base_fees_per_gas(web3,
                                                        before_block_number - after_block_number,
                                                        before_block_number - 1)
 
-    i = 0
-    for block_number in range(after_block_number, before_block_number):
-        logger.debug(f"Block: {block_number} -- Getting block data")
-        async with aiohttp.ClientSession() as session:
-            tasks = [
-                _fetch_block_info(web3, block_number),
-                _fetch_etherscan_data(session, etherscan_block_reward_url.format(block_number))
-            ]
-            block_info, etherscan_response = await asyncio.gather(*tasks)
-        miner_address, total_gas_used, block_gas_limit, block_transactions = block_info
-        block_reward = float(etherscan_response['result']['blockReward']) / ETH_TO_WEI
-
-        # check if it's from or to an already known contract
-        batch_updated_info, coinbase_transfer = check_block_transactions(block_transactions, smart_contracts,
-                                                                         miner_address, block_number)
-        all_updated_info.extend(batch_updated_info)
-        all_blocks.append({
-            "block_number": block_number,
-            "miner_address": miner_address,
-            "coinbase_transfer": coinbase_transfer,
-            "base_fee_per_gas": base_fees_per_gas[i] / ETH_TO_WEI,
-            "gas_fee": block_reward,  # miner_fee = transactions_fee - burnt_fee (EIP-1559)
-            "gas_used": total_gas_used,
-            "gas_limit": block_gas_limit,
-            "tx_count": len(block_transactions)
-        })
+    async def fetch_blocks() -> List[RawBlock]:
+        blocks: List[RawBlock] = []
+        for block_number in range(after_block_number, before_block_number):
+            logger.debug("Block: %s -- Getting block data", block_number)
+            blocks.append(await fetch_block(web3, block_number, raw_client))
+        return blocks
+
+    blocks, block_rewards = await asyncio.gather(
+        fetch_blocks(),
+        fetch_block_rewards(list(range(after_block_number, before_block_number)), etherscan_client),
+    )
 
-        i += 1
+    # check the whole batch for transactions from or to already known contracts
+    with span("check_block_transactions"):
+        batch = build_block_batch(blocks, address_index)
+        all_updated_info, coinbase_transfers = check_block_transactions(batch, address_index, largest_tx_values)
+        all_blocks = get_block_rows(blocks, block_rewards, base_fees_per_gas, coinbase_transfers)
 
     if all_blocks:
         logger.debug("Writing to DB")
-        insert_data(Block, all_blocks, inspect_db_session)
+        write_blocks(all_blocks, inspect_db_session)
         logger.debug("Writing done")
 
     if all_updated_info:
@@ -125,44 +152,66 @@ async def inspect_many_blocks(
 
 
 def check_block_transactions(
-        block_transactions: List,
-        smart_contracts: Dict,
-        miner_address: str,
-        block_number: int
-) -> Tuple[List, float]:
-    """
-    Checks the transactions of a block for time-locked contracts transactions and coinbase transfers.
-    :param block_transactions: List of transactions in the block
-    :param smart_contracts: Map of time-locked contracts addresses to their largest transaction value
-    :param miner_address: The address of the miner of the block
-    :param block_number: The block number
-    :return: Tuple of list of time-locked contracts transactions and coinbase transfer
-    """
-    coinbase_transfer = 0
+        batch: BlockBatch,
+        address_index: AddressIndex,
+        largest_tx_values: List[int | None],
+) -> Tuple[List, List[int]]:
+    """
+    Checks the transactions of a batch of blocks for time-locked contracts transactions and coinbase transfers.
+    :param batch: Columnar transactions of the blocks
+    :param address_index: Index of the time-locked contracts
+    :param largest_tx_values: Largest transaction value (wei) of each contract, aligned with the index ids
+    :return: Tuple of list of time-locked contracts transactions and coinbase transfer of each block (wei)
+    """
+    larger_contracts_transactions = check_largest_transactions(batch, address_index, largest_tx_values)
+    coinbase_transfers = coinbase_transfers_wei(batch)
+
+    return larger_contracts_transactions, coinbase_transfers
+
+
+def check_largest_transactions(
+        batch: BlockBatch,
+        address_index: AddressIndex,
+        largest_tx_values: List[int | None],
+) -> List[Dict]:
+    """
+    Finds the transactions of a batch that are larger than the recorded largest transaction of their contract.
+    Contracts without a recorded largest transaction take any transaction from or to them.
+    The largest values are updated in place.
+    :param batch: Columnar transactions or transfers
+    :param address_index: Index of the time-locked contracts
+    :param largest_tx_values: Largest transaction value (wei) of each contract, aligned with the index ids
+    :return: List of contracts_info updates
+    """
     larger_contracts_transactions = []
-    for tx in block_transactions:
-        to_address = tx['to']
-        from_address = tx['from']
-        transaction_value = float(tx['value']) / ETH_TO_WEI
-        contract_address = None
-        if smart_contracts.get(to_address) is not None:
-            contract_address = to_address
-        elif smart_contracts.get(from_address) is not None:
-            contract_address = from_address
-        # TODO: must update DB with new largest tx values. This is a shared resource and must be locked.
-        if contract_address is not None and smart_contracts[contract_address] < transaction_value:
-            larger_contracts_transactions.append({
-                "contract_address": contract_address,
-                "largest_tx_hash": tx['hash'].hex(),
-                "largest_tx_block_number": block_number,
-                "largest_tx_value": transaction_value,
-            })
-            smart_contracts[contract_address] = transaction_value
-
-        if to_address == miner_address:
-            coinbase_transfer += transaction_value
-
-    return larger_contracts_transactions, coinbase_transfer
+    # TODO: must update DB with new largest tx values. This is a shared resource and must be locked.
+    for contract_id, tx_index in largest_contract_transactions(batch, address_index).items():
+        transaction_value = batch.values[tx_index]
+        largest_tx_value = largest_tx_values[contract_id]
+        if largest_tx_value is not None and largest_tx_value >= transaction_value:
+            continue
+        larger_contracts_transactions.append({
+            "contract_address": address_index.contract_addresses[contract_id],
+            "largest_tx_hash": batch.tx_hashes[tx_index],
+            "largest_tx_block_number": int(batch.block_numbers[batch.tx_block[tx_index]]),
+            "largest_tx_value": transaction_value,
+        })
+        largest_tx_values[contract_id] = transaction_value
+
+    return larger_contracts_transactions
+
+
+def get_block_attributes(blocks: List[RawBlock], attributes: List[str]) -> List[Dict]:
+    """
+    Builds the attribute updates of the blocks table from already fetched full blocks.
+    """
+    return [
+        {
+            "block_number": block.number,
+            **{attribute: FULL_BLOCK_ATTRIBUTES[attribute](block) for attribute in attributes},
+        }
+        for block in blocks
+    ]
 
 
 async def inspect_many_attributes(
@@ -172,26 +221,21 @@ async def inspect_many_attributes(
         logger: Logger,
         inspect_db_session: orm.Session,
         attributes: List[str],
+        raw_client: RawRPCClient = None,
 ) -> None:
     """
     Inspects many blocks and updates them with the new attributes in DB.
-    todo: make this more generic
+    Each attribute is fetched with the cheapest call that provides it, see BLOCK_ATTRIBUTES.
     """
-    all_attributes: List[Dict] = []
+    logger.info("Inspecting blocks %s to %s", after_block_number, before_block_number)
+    logger.debug("Blocks: %s to %s -- Getting block attributes: %s", after_block_number, before_block_number,
+                 attributes)
 
-    logger.info(f"Inspecting blocks {after_block_number} to {before_block_number}")
-
-    for block_number in range(after_block_number, before_block_number):
-        logger.debug(f"Block: {block_number} -- Getting block attributes: {attributes}")
-        block_info = await _fetch_block_info(web3, block_number)
-        miner_address, total_gas_used, block_gas_limit, block_transactions = block_info
-        # for now, just get the number of transactions
-        all_attributes.append({
-            "block_number": block_number,
-            "tx_count": len(block_transactions)
-        })
+    all_attributes = await fetch_block_attributes(web3, attributes,
+                                                  list(range(after_block_number, before_block_number)),
+                                                  raw_client)
 
     if all_attributes:
         logger.debug("Writing to DB")
-        update_data(Block, all_attributes, inspect_db_session)
+        bulk_update_data(Block, all_attributes, inspect_db_session)
         logger.debug("Writing done")
@@ -0,0 +1,411 @@
+import math
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from sqlalchemy import and_, delete, func, or_, orm, select, update
+
+from inspector.models.block.model import Block
+from inspector.models.block_rollup.model import BlockRollup, BlockSketch, MinerRollup
+from inspector.models.crud import accumulate_data, insert_data, subtract_data
+
+# sizes of the rollup buckets in blocks, each block is folded into one bucket of every size
+BUCKET_SIZES = (1_000, 100_000)
+# relative error of the quantiles read from the sketches
+SKETCH_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+# bin of the zero values, which have no logarithm
+ZERO_BIN = -2 ** 31
+# block ranges without an end run up to the largest block number the tables can hold
+LAST_BLOCK = 2 ** 31 - 1
+
+# metric -> value of a block row, blocks whose value is None are left out of the sketch
+SKETCH_METRICS: Dict[str, Callable[[Dict], float | None]] = {
+    "base_fee_per_gas": lambda block: block["base_fee_per_gas"],
+    "gas_used": lambda block: block["gas_used"],
+    "gas_fee": lambda block: block["gas_fee"],
+    # miner fee per gas unit, i.e. the average priority fee of the block
+    "gas_price": lambda block: block["gas_fee"] / block["gas_used"] if block["gas_used"] else None,
+}
+
+ROLLUP_KEYS = ["bucket_size", "bucket_start"]
+SKETCH_KEYS = ROLLUP_KEYS + ["metric", "bin"]
+MINER_KEYS = ROLLUP_KEYS + ["miner_address"]
+# columns of the rollups that are merged with min and max instead of a sum
+ROLLUP_GREATEST = ["last_block", "gas_used_max", "base_fee_per_gas_max", "gas_fee_max"]
+ROLLUP_LEAST = ["first_block", "gas_used_min", "base_fee_per_gas_min", "gas_fee_min"]
+# minimum and maximum columns -> block column they are taken from
+ROLLUP_BOUNDS = {
+    "first_block": "block_number",
+    "last_block": "block_number",
+    **{f"{attribute}_{bound}": attribute
+       for attribute in ("gas_used", "base_fee_per_gas", "gas_fee") for bound in ("min", "max")},
+}
+
+
+def sketch_bin(value: float) -> int:
+    return ZERO_BIN if value <= 0 else math.ceil(math.log(value, SKETCH_GAMMA))
+
+
+def bin_bounds(sketch_bin_index: int) -> Tuple[float, float]:
+    if sketch_bin_index == ZERO_BIN:
+        return 0.0, 0.0
+    return SKETCH_GAMMA ** (sketch_bin_index - 1), SKETCH_GAMMA ** sketch_bin_index
+
+
+def bin_value(sketch_bin_index: int) -> float:
+    """
+    Value within SKETCH_ACCURACY of all the values of the bin.
+    """
+    if sketch_bin_index == ZERO_BIN:
+        return 0.0
+    return 2 * SKETCH_GAMMA ** sketch_bin_index / (SKETCH_GAMMA + 1)
+
+
+def fold_blocks(blocks: List[Dict]) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """
+    Folds rows of the blocks table into the changes of their buckets.
+    :param blocks: Rows of the blocks table
+    :return: Tuple of the rows of block_rollups, block_sketches and miner_rollups holding the changes,
+    to be merged with the stored rows. Each list is sorted by key.
+    """
+    rollups: Dict[Tuple, Dict] = {}
+    sketches: Dict[Tuple, Dict] = {}
+    miners: Dict[Tuple, Dict] = {}
+
+    for block in blocks:
+        block_number = block["block_number"]
+        gas_used = block["gas_used"]
+        empty = int(gas_used == 0)
+        metric_bins = [
+            (metric, sketch_bin(value))
+            for metric, metric_value in SKETCH_METRICS.items()
+            if (value := metric_value(block)) is not None
+        ]
+        for bucket_size in BUCKET_SIZES:
+            bucket_start = block_number // bucket_size * bucket_size
+            rollup = rollups.get((bucket_size, bucket_start))
+            if rollup is None:
+                rollup = rollups[(bucket_size, bucket_start)] = {
+                    "bucket_size": bucket_size,
+                    "bucket_start": bucket_start,
+                    "first_block": block_number,
+                    "last_block": block_number,
+                    "block_count": 0,
+                    "empty_block_count": 0,
+                    "tx_count": 0,
+                    "gas_used_sum": 0,
+                    "gas_used_min": gas_used,
+                    "gas_used_max": gas_used,
+                    "gas_limit_sum": 0,
+                    "base_fee_per_gas_sum": 0,
+                    "base_fee_per_gas_min": block["base_fee_per_gas"],
+                    "base_fee_per_gas_max": block["base_fee_per_gas"],
+                    "gas_fee_sum": 0,
+                    "gas_fee_min": block["gas_fee"],
+                    "gas_fee_max": block["gas_fee"],
+                    "coinbase_transfer_sum": 0,
+                }
+            rollup["first_block"] = min(rollup["first_block"], block_number)
+            rollup["last_block"] = max(rollup["last_block"], block_number)
+            rollup["block_count"] += 1
+            rollup["empty_block_count"] += empty
+            rollup["tx_count"] += block["tx_count"] or 0
+            rollup["gas_limit_sum"] += block["gas_limit"]
+            rollup["coinbase_transfer_sum"] += block["coinbase_transfer"]
+            for attribute in ("gas_used", "base_fee_per_gas", "gas_fee"):
+                rollup[f"{attribute}_sum"] += block[attribute]
+                rollup[f"{attribute}_min"] = min(rollup[f"{attribute}_min"], block[attribute])
+                rollup[f"{attribute}_max"] = max(rollup[f"{attribute}_max"], block[attribute])
+
+            for metric, metric_bin in metric_bins:
+                sketch = sketches.get((bucket_size, bucket_start, metric, metric_bin))
+                if sketch is None:
+                    sketch = sketches[(bucket_size, bucket_start, metric, metric_bin)] = {
+                        "bucket_size": bucket_size,
+                        "bucket_start": bucket_start,
+                        "metric": metric,
+                        "bin": metric_bin,
+                        "count": 0,
+                    }
+                sketch["count"] += 1
+
+            miner_address = block["miner_address"].lower()
+            miner = miners.get((bucket_size, bucket_start, miner_address))
+            if miner is None:
+                miner = miners[(bucket_size, bucket_start, miner_address)] = {
+                    "bucket_size": bucket_size,
+                    "bucket_start": bucket_start,
+                    "miner_address": miner_address,
+                    "block_count": 0,
+                    "empty_block_count": 0,
+                    "gas_fee_sum": 0,
+                }
+            miner["block_count"] += 1
+            miner["empty_block_count"] += empty
+            miner["gas_fee_sum"] += block["gas_fee"]
+
+    # the rows are locked in key order, so concurrent writers of the same buckets cannot deadlock
+    return [rollups[key] for key in sorted(rollups)], \
+        [sketches[key] for key in sorted(sketches)], \
+        [miners[key] for key in sorted(miners)]
+
+
+def accumulate_rollups(blocks: List[Dict], inspect_db_session: orm.Session) -> None:
+    """
+    Merges the blocks into the stored rollups, without committing.
+    """
+    rollups, sketches, miners = fold_blocks(blocks)
+    accumulate_data(BlockRollup, rollups, inspect_db_session, keys=ROLLUP_KEYS,
+                    greatest=ROLLUP_GREATEST, least=ROLLUP_LEAST, commit=False)
+    accumulate_data(BlockSketch, sketches, inspect_db_session, keys=SKETCH_KEYS, greatest=(), commit=False)
+    accumulate_data(MinerRollup, miners, inspect_db_session, keys=MINER_KEYS, greatest=(), commit=False)
+
+
+def write_blocks(blocks: List[Dict], inspect_db_session: orm.Session) -> None:
+    """
+    Inserts the blocks and merges them into the rollups in one transaction,
+    so the rollups always match the stored blocks.
+    """
+    insert_data(Block, blocks, inspect_db_session, commit=False)
+    accumulate_rollups(blocks, inspect_db_session)
+    inspect_db_session.commit()
+
+
+def _delete_empty(inspect_db_session: orm.Session, model, count_column, buckets: List[Tuple[int, int]]) -> None:
+    inspect_db_session.execute(delete(model).where(
+        count_column <= 0,
+        or_(*[and_(model.bucket_size == bucket_size, model.bucket_start == bucket_start)
+              for bucket_size, bucket_start in buckets]),
+    ))
+
+
+def _refresh_bounds(inspect_db_session: orm.Session, bucket_size: int, bucket_start: int,
+                    smaller_size: int | None) -> None:
+    """
+    Recomputes the minimums and maximums of a bucket from its blocks, or from its buckets of smaller_size.
+    """
+    if smaller_size is None:
+        position = Block.block_number
+        columns = {name: Block.__table__.c[attribute] for name, attribute in ROLLUP_BOUNDS.items()}
+    else:
+        position = BlockRollup.bucket_start
+        columns = {name: BlockRollup.__table__.c[name] for name in ROLLUP_BOUNDS}
+    query = select(*[(func.min if name in ROLLUP_LEAST else func.max)(column) for name, column in columns.items()]) \
+        .where(position >= bucket_start, position < bucket_start + bucket_size)
+    if smaller_size is not None:
+        query = query.where(BlockRollup.bucket_size == smaller_size)
+    bounds = inspect_db_session.execute(query).one()
+    if bounds[0] is None:
+        # the bucket was left empty and deleted
+        return
+    inspect_db_session.execute(
+        update(BlockRollup)
+        .where(BlockRollup.bucket_size == bucket_size, BlockRollup.bucket_start == bucket_start)
+        .values(dict(zip(columns, bounds)))
+    )
+
+
+def subtract_rollups(blocks: List[Dict], inspect_db_session: orm.Session) -> None:
+    """
+    Takes blocks deleted from the blocks table out of their rollups, without committing, e.g. after a reorg.
+    Their counts and sums are subtracted and the buckets they leave empty are deleted. The minimums and maximums
+    of the other buckets are recomputed, from their remaining blocks for the smallest buckets,
+    and from the smaller buckets they are made of for the others.
+    :param blocks: Rows of the blocks table, already deleted from it
+    """
+    if not blocks:
+        return
+    rollups, sketches, miners = fold_blocks(blocks)
+    # the counts and sums
+    subtract_data(BlockRollup, [{name: value for name, value in rollup.items() if name not in ROLLUP_BOUNDS}
+                                for rollup in rollups], inspect_db_session, keys=ROLLUP_KEYS, commit=False)
+    subtract_data(BlockSketch, sketches, inspect_db_session, keys=SKETCH_KEYS, commit=False)
+    subtract_data(MinerRollup, miners, inspect_db_session, keys=MINER_KEYS, commit=False)
+
+    buckets = [(rollup["bucket_size"], rollup["bucket_start"]) for rollup in rollups]
+    _delete_empty(inspect_db_session, BlockRollup, BlockRollup.block_count, buckets)
+    _delete_empty(inspect_db_session, BlockSketch, BlockSketch.count, buckets)
+    _delete_empty(inspect_db_session, MinerRollup, MinerRollup.block_count, buckets)
+
+    smaller_size = None
+    for bucket_size in sorted(BUCKET_SIZES):
+        for bucket_start in sorted({start for size, start in buckets if size == bucket_size}):
+            _refresh_bounds(inspect_db_session, bucket_size, bucket_start, smaller_size)
+        smaller_size = bucket_size
+
+
+def rebuild_rollups(inspect_db_session: orm.Session, after_block: int, before_block: int = None) -> int:
+    """
+    Replaces the rollups of the buckets of a block range with the rollups of the stored blocks, without committing,
+    e.g. after blocks were deleted or their attributes backfilled.
+    The range is rounded outwards to the largest bucket size, which the other sizes divide.
+    :return: The number of folded blocks
+    """
+    bucket_size = max(BUCKET_SIZES)
+    after_block = after_block // bucket_size * bucket_size
+    before_block = LAST_BLOCK if before_block is None else -(-before_block // bucket_size) * bucket_size
+    for model in (BlockRollup, BlockSketch, MinerRollup):
+        inspect_db_session.execute(
+            delete(model).where(model.bucket_start >= after_block, model.bucket_start < before_block))
+    blocks = [
+        dict(row._mapping) for row in inspect_db_session.execute(
+            select(*Block.__table__.columns)
+            .where(Block.block_number >= after_block, Block.block_number < before_block))
+    ]
+    if blocks:
+        accumulate_rollups(blocks, inspect_db_session)
+    return len(blocks)
+
+
+def cover(after_block: int = None, before_block: int = None) -> List[Tuple[int, int, int]]:
+    """
+    Covers a block range with the fewest buckets: the largest buckets within the range,
+    then smaller ones for its ends. The ends are rounded outwards to the smallest bucket size.
+    :return: List of (bucket size, first bucket start, end of the last bucket)
+    """
+    def cover_sizes(start: int, end: int, sizes: Sequence[int]) -> List[Tuple[int, int, int]]:
+        bucket_size, smaller_sizes = sizes[0], sizes[1:]
+        if not smaller_sizes:
+            return [(bucket_size, start // bucket_size * bucket_size, -(-end // bucket_size) * bucket_size)]
+        low, high = -(-start // bucket_size) * bucket_size, end // bucket_size * bucket_size
+        if low >= high:
+            return cover_sizes(start, end, smaller_sizes)
+        return [(bucket_size, low, high)] + \
+            (cover_sizes(start, low, smaller_sizes) if start < low else []) + \
+            (cover_sizes(high, end, smaller_sizes) if high < end else [])
+
+    after_block = 0 if after_block is None else after_block
+    before_block = LAST_BLOCK if before_block is None else before_block
+    if after_block >= before_block:
+        return []
+    return cover_sizes(after_block, before_block, sorted(BUCKET_SIZES, reverse=True))
+
+
+def _cover_filter(model, after_block: int, before_block: int):
+    ranges = cover(after_block, before_block)
+    if not ranges:
+        return False
+    return or_(*[
+        and_(model.bucket_size == bucket_size, model.bucket_start >= start, model.bucket_start < end)
+        for bucket_size, start, end in ranges
+    ])
+
+
+def load_rollups(
+        inspect_db_session: orm.Session,
+        bucket_size: int,
+        after_block: int = None,
+        before_block: int = None,
+) -> List[BlockRollup]:
+    """
+    Loads the series of the rollups of one bucket size, e.g. to plot the base fee over time.
+    :param after_block: First block, included. The range is rounded outwards to the bucket size
+    :param before_block: Last block, excluded
+    """
+    after_block = 0 if after_block is None else after_block // bucket_size * bucket_size
+    before_block = LAST_BLOCK if before_block is None else before_block
+    return list(inspect_db_session.scalars(
+        select(BlockRollup)
+        .where(BlockRollup.bucket_size == bucket_size,
+               BlockRollup.bucket_start >= after_block,
+               BlockRollup.bucket_start < before_block)
+        .order_by(BlockRollup.bucket_start)
+    ))
+
+
+def summarize(inspect_db_session: orm.Session, after_block: int = None, before_block: int = None) -> Dict:
+    """
+    Merges the rollups of a block range into its totals, minimums, maximums and means.
+    """
+    columns = [column for column in BlockRollup.__table__.columns if column.name not in ROLLUP_KEYS]
+    aggregates = [
+        (func.max if column.name in ROLLUP_GREATEST else func.min if column.name in ROLLUP_LEAST else func.sum)(column)
+        for column in columns
+    ]
+    row = inspect_db_session.execute(
+        select(*aggregates).where(_cover_filter(BlockRollup, after_block, before_block))
+    ).one()
+    summary = {column.name: value for column, value in zip(columns, row)}
+    block_count = summary["block_count"] or 0
+    for attribute in ("gas_used", "base_fee_per_gas", "gas_fee", "coinbase_transfer"):
+        summary[f"{attribute}_mean"] = summary[f"{attribute}_sum"] / block_count if block_count else None
+    return summary
+
+
+def _merged_sketch(inspect_db_session: orm.Session, metric: str, after_block: int,
+                   before_block: int) -> List[Tuple[int, int]]:
+    """
+    :return: The (bin, count) pairs of the metric over the block range, in bin order
+    """
+    if metric not in SKETCH_METRICS:
+        raise ValueError(f"Unknown metric {metric}, expected one of {list(SKETCH_METRICS)}")
+    return [tuple(row) for row in inspect_db_session.execute(
+        select(BlockSketch.bin, func.sum(BlockSketch.count))
+        .where(BlockSketch.metric == metric, _cover_filter(BlockSketch, after_block, before_block))
+        .group_by(BlockSketch.bin)
+        .order_by(BlockSketch.bin)
+    )]
+
+
+def quantiles(
+        inspect_db_session: orm.Session,
+        metric: str,
+        qs: Sequence[float],
+        after_block: int = None,
+        before_block: int = None,
+) -> List[float | None]:
+    """
+    Estimates quantiles of a block metric over a block range, within SKETCH_ACCURACY relative error.
+    :param metric: One of SKETCH_METRICS
+    :param qs: Quantiles between 0 and 1
+    :return: The quantiles aligned with qs, None when the range has no blocks
+    """
+    bins = _merged_sketch(inspect_db_session, metric, after_block, before_block)
+    total = sum(count for _, count in bins)
+    results = []
+    for q in qs:
+        if total == 0:
+            results.append(None)
+            continue
+        rank, seen = q * (total - 1), 0
+        for sketch_bin_index, count in bins:
+            seen += count
+            if seen > rank:
+                results.append(bin_value(sketch_bin_index))
+                break
+    return results
+
+
+def histogram(
+        inspect_db_session: orm.Session,
+        metric: str,
+        after_block: int = None,
+        before_block: int = None,
+) -> List[Tuple[float, float, int]]:
+    """
+    Histogram of a block metric over a block range, on the logarithmic bins of the sketches.
+    :return: List of (lower bound, upper bound, count) in increasing order
+    """
+    return [(*bin_bounds(sketch_bin_index), count)
+            for sketch_bin_index, count in _merged_sketch(inspect_db_session, metric, after_block, before_block)]
+
+
+def top_miners(
+        inspect_db_session: orm.Session,
+        after_block: int = None,
+        before_block: int = None,
+        by: str = "empty_block_count",
+        limit: int = 10,
+) -> List[Tuple[str, int | float]]:
+    """
+    Ranks the miners of a block range, e.g. by their empty blocks.
+    :param by: block_count, empty_block_count or gas_fee_sum
+    :return: List of (miner address, total)
+    """
+    total = func.sum(MinerRollup.__table__.c[by]).label("total")
+    return [tuple(row) for row in inspect_db_session.execute(
+        select(MinerRollup.miner_address, total)
+        .where(_cover_filter(MinerRollup, after_block, before_block))
+        .group_by(MinerRollup.miner_address)
+        .order_by(total.desc())
+        .limit(limit)
+    )]
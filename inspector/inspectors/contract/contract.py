@@ -5,15 +5,32 @@ from typing import List, Tuple
 
 from sqlalchemy import orm, select, and_
 
-from inspector.base import Inspector
+from inspector.base import Inspector, iter_slices
+from inspector.cache import BlockCache
 from inspector.inspectors.contract.inspect_batch import inspect_many_contracts
 from inspector.models.contract.model import Contract
 from inspector.utils import configure_logger, clean_up_log_handlers
 
+# contracts per balance sweep, balance lookups are tiny so a batch is sent as a few JSON-RPC batches
+BALANCE_BATCH_SIZE = 500
+
 
 class ContractInspector(Inspector):
+    def __init__(
+            self,
+            rpc_endpoint: str,
+            max_concurrency: int = 1,
+            request_timeout: int = 300,
+            block_identifier: int | str = "latest",
+            raw: bool = False,
+            cache: BlockCache = None,
+    ):
+        super().__init__(rpc_endpoint, max_concurrency, request_timeout, raw=raw, cache=cache)
+        # block at which the balances are taken
+        self.block_identifier = block_identifier
+
     async def inspect_many(self, inspect_db_session: orm.Session, task_batch: Tuple[int, int] | List[Tuple[int, str]],
-                           batch_size: int = 50):
+                           batch_size: int = BALANCE_BATCH_SIZE):
         self.logger = configure_logger(self.host)
 
         contract_addresses = inspect_db_session.execute(
@@ -21,29 +38,16 @@ class ContractInspector(Inspector):
             where(and_(task_batch[0] <= Contract.block_number, Contract.block_number <= task_batch[1]))
         ).all()
 
-        tasks = []
-        sem = asyncio.Semaphore(self.max_concurrency)
-
-        for i in range(0, len(contract_addresses), batch_size):
-            tasks.append(
-                asyncio.ensure_future(
-                    self.safe_inspect_many(
-                        inspect_db_session=inspect_db_session,
-                        task_batch=contract_addresses[i:min(i + batch_size, len(contract_addresses))],
-                        semaphore=sem
-                    )
-                )
-            )
-
         self.logger.info(f"{self.host}: Gathered {len(contract_addresses)} contracts to inspect")
         try:
-            await asyncio.gather(*tasks)
+            await self.run_batches(inspect_db_session, iter_slices(contract_addresses, batch_size))
         except CancelledError:
             self.logger.info(f"{self.host}: Requested to exit, cleaning up...")
         except Exception:
             self.logger.error(f"{self.host}: Exited due to {traceback.print_exc()}")
             raise
         finally:
+            await self.close()
             clean_up_log_handlers(self.logger)
 
     async def safe_inspect_many(self, inspect_db_session: orm.Session, semaphore: asyncio.Semaphore,
@@ -54,4 +58,6 @@ class ContractInspector(Inspector):
                 contracts=task_batch,
                 logger=self.logger,
                 inspect_db_session=inspect_db_session,
+                block_identifier=self.block_identifier,
+                raw_client=self.raw_client,
             ))
@@ -1,14 +1,14 @@
 from logging import Logger
-from typing import List, Dict
+from typing import List, Dict, Sequence, Tuple
 
 from sqlalchemy import orm
 from web3 import Web3
 
 from inspector.models.contract_info.model import ContractInfo
 from inspector.models.crud import insert_data
+from inspector.raw_rpc import RawRPCClient, request_many
 
 OLDEST_BLOCK = 15649595  # first block on October 2022
-ETH_TO_WEI = 1e18
 
 
 async def _fetch_contract_tx_count(w3, contract_address: str) -> int:
@@ -16,10 +16,46 @@ async def _fetch_contract_tx_count(w3, contract_address: str) -> int:
     return await w3.eth.get_transaction_count(checksum_contract_address, block_identifier=OLDEST_BLOCK)
 
 
-async def _fetch_contract_eth_balance(w3, contract_address: str) -> float:
-    checksum_contract_address = Web3.to_checksum_address(contract_address)
+def _block_param(block_identifier: int | str) -> str:
+    return hex(block_identifier) if isinstance(block_identifier, int) else block_identifier
+
 
-    return await w3.eth.get_balance(checksum_contract_address) / ETH_TO_WEI
+async def fetch_balances_at(
+        web3: Web3,
+        lookups: List[Tuple[str, int | str]],
+        raw_client: RawRPCClient = None,
+) -> List[int]:
+    """
+    Fetches the ETH balances of (address, block identifier) pairs, in wei.
+    The eth_getBalance calls are sent as JSON-RPC batches with the raw client, otherwise concurrently.
+    """
+    calls = [("eth_getBalance", [address, _block_param(block_identifier)]) for address, block_identifier in lookups]
+    return [int(balance, 16) for balance in await request_many(web3, calls, raw_client)]
+
+
+async def fetch_balances(
+        web3: Web3,
+        addresses: List[str],
+        block_identifiers: Sequence[int | str] = ("latest",),
+        raw_client: RawRPCClient = None,
+) -> Dict[int | str, List[int]]:
+    """
+    Fetches the ETH balances of many addresses at one or more blocks in a single sweep.
+    :param web3: Web3 provider
+    :param addresses: Addresses to look up, checksum or lowercase
+    :param block_identifiers: Block numbers or tags, one balance snapshot is taken per identifier
+    :param raw_client: Raw JSON-RPC client
+    :return: Map of block identifier to the balances in wei, aligned with addresses
+    """
+    results = await fetch_balances_at(
+        web3,
+        [(address, block_identifier) for block_identifier in block_identifiers for address in addresses],
+        raw_client,
+    )
+    return {
+        block_identifier: results[i * len(addresses):(i + 1) * len(addresses)]
+        for i, block_identifier in enumerate(block_identifiers)
+    }
 
 
 async def inspect_many_contracts(
@@ -27,23 +63,24 @@ async def inspect_many_contracts(
         contracts: List[str],
         logger: Logger,
         inspect_db_session: orm.Session,
+        block_identifier: int | str = "latest",
+        raw_client: RawRPCClient = None,
 ):
     # largest tx hash, largest tx value, largest tx block number, contract ETH balance
     all_info: List[Dict] = []
 
-    logger.info(f"Inspecting contracts {contracts[0][0]} to {contracts[-1][0]}")
-    for index, contract_address in contracts:
-        logger.debug(f"Contract: {contract_address} -- Getting contract data")
-
-        contract_balance = await _fetch_contract_eth_balance(web3, contract_address)
+    logger.info("Inspecting contracts %s to %s", contracts[0][0], contracts[-1][0])
+    contract_addresses = [contract_address for _, contract_address in contracts]
+    balances, = (await fetch_balances(web3, contract_addresses, (block_identifier,), raw_client)).values()
 
-        if contract_balance == 0:
+    for contract_address, balance in zip(contract_addresses, balances):
+        if balance == 0:
             continue
 
         # the block inspector will fetch the info related to the transactions
         all_info.append({
             "contract_address": contract_address,
-            "eth_balance": contract_balance,
+            "eth_balance": balance,
             "largest_tx_hash": None,
             "largest_tx_block_number": None,
             "largest_tx_value": None,
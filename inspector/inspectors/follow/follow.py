@@ -0,0 +1,225 @@
+import asyncio
+import time
+import traceback
+from asyncio import CancelledError
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from sqlalchemy import delete, orm, select
+
+from inspector.etherscan import EtherscanCache
+from inspector.inspectors.block.rollups import LAST_BLOCK, subtract_rollups
+from inspector.inspectors.scan.consumers import BlockEconomicsConsumer, TimeLockConsumer
+from inspector.inspectors.scan.scan import ScanInspector
+from inspector.metrics import metrics
+from inspector.models.block.model import Block
+from inspector.models.contract.model import Contract
+from inspector.raw_rpc import RawBlock, RawRPCClient, fetch_block, request_many
+from inspector.utils import configure_logger, clean_up_log_handlers
+from utils.profiling import span
+
+# consumers whose rows are keyed by their block, so the rows of the blocks dropped by a reorg can be deleted
+FOLLOW_CONSUMERS = [TimeLockConsumer.name, BlockEconomicsConsumer.name]
+# seconds between two polls of the chain head
+POLL_INTERVAL = 1.0
+# latest followed blocks whose hashes are kept to find where a reorg forked
+REORG_WINDOW = 64
+# endpoints of the pool whose heads are polled, from the best ranked
+HEAD_POOL_SIZE = 8
+HEAD_REQUEST_TIMEOUT = 2
+# seconds during which an endpoint that failed to return its head is not polled again
+HEAD_RETRY_SECONDS = 60
+
+
+class FollowInspector(ScanInspector):
+    """
+    Follows the chain head: each new block is fetched as soon as an endpoint of the pool has it, and fed to the
+    time lock and block consumers. The hashes of the latest blocks are kept to detect the reorgs,
+    whose dropped blocks are deleted from DB and followed again on the new chain.
+    The hashes are only kept in memory: a reorg of the stored blocks that happens while the follower is stopped
+    is not detected when it restarts.
+    """
+
+    def __init__(
+            self,
+            rpc_endpoint: str,
+            pool_endpoints: List[str] = None,
+            max_concurrency: int = 1,
+            request_timeout: int = 300,
+            etherscan_api_key: str = "",
+            consumers: List[str] = None,
+            raw: bool = False,
+            etherscan_cache: EtherscanCache = None,
+            poll_interval: float = POLL_INTERVAL,
+    ):
+        for consumer in consumers or []:
+            if consumer not in FOLLOW_CONSUMERS:
+                raise ValueError(f"Consumer {consumer} is not available in follow mode, "
+                                 f"must be one of {FOLLOW_CONSUMERS}")
+        super().__init__(rpc_endpoint, max_concurrency, request_timeout, etherscan_api_key,
+                         consumers=consumers or FOLLOW_CONSUMERS, raw=raw, etherscan_cache=etherscan_cache)
+        self.head_clients = [
+            RawRPCClient(endpoint, request_timeout=HEAD_REQUEST_TIMEOUT, retries=1)
+            for endpoint in (pool_endpoints or [rpc_endpoint])[:HEAD_POOL_SIZE]
+        ]
+        # endpoint -> time until which it is not polled
+        self.head_failures: Dict[str, float] = {}
+        self.recent_hashes: Deque[Tuple[int, str]] = deque(maxlen=REORG_WINDOW)
+        self.poll_interval = poll_interval
+
+    async def close(self) -> None:
+        for client in self.head_clients:
+            await client.close()
+        await super().close()
+
+    async def poll_head(self) -> Tuple[int, str] | None:
+        """
+        Polls the head of the endpoints of the pool concurrently.
+        :return: Tuple of the highest head and the endpoint that has it, None if no endpoint answered
+        """
+        now = time.monotonic()
+        clients = [client for client in self.head_clients if self.head_failures.get(client.rpc_endpoint, 0) <= now]
+        results = await asyncio.gather(*[client.request("eth_blockNumber", []) for client in clients],
+                                       return_exceptions=True)
+        heads = []
+        for client, result in zip(clients, results):
+            if isinstance(result, Exception):
+                self.head_failures[client.rpc_endpoint] = now + HEAD_RETRY_SECONDS
+                continue
+            heads.append((int(result, 16), client.rpc_endpoint))
+        if not heads:
+            return None
+        # the current endpoint wins the ties, so it is only left for an endpoint that is ahead
+        return max(heads, key=lambda head: (head[0], head[1] == self.rpc_endpoint))
+
+    async def find_fork_block(self) -> int:
+        """
+        Finds the latest followed block that is still on the chain of the endpoint.
+        """
+        recent_hashes = list(self.recent_hashes)
+        headers = await request_many(self.w3, [("eth_getBlockByNumber", [hex(block_number), False])
+                                               for block_number, _ in recent_hashes], self.raw_client)
+        for (block_number, block_hash), header in zip(reversed(recent_hashes), reversed(headers)):
+            if header is not None and header["hash"].lower() == block_hash.lower():
+                return block_number
+        self.logger.warning("Reorg deeper than the %s followed blocks", len(recent_hashes))
+        return recent_hashes[0][0] - 1
+
+    def delete_blocks(self, inspect_db_session: orm.Session, fork_block: int) -> Tuple[int, int]:
+        """
+        Deletes the rows of the blocks after the fork block and takes the blocks out of their rollups,
+        in one transaction. The consumers consume these blocks again.
+        :return: Tuple of the numbers of deleted contracts and blocks
+        """
+        with span("delete_blocks"):
+            dropped_blocks = [dict(row._mapping) for row in inspect_db_session.execute(
+                select(*Block.__table__.columns).where(Block.block_number > fork_block))]
+            contracts = inspect_db_session.execute(delete(Contract).where(Contract.block_number > fork_block)).rowcount
+            inspect_db_session.execute(delete(Block).where(Block.block_number > fork_block))
+            subtract_rollups(dropped_blocks, inspect_db_session)
+            inspect_db_session.commit()
+
+        for consumer in self.consumers:
+            consumer.start_block = min(consumer.start_block, fork_block + 1)
+        return contracts, len(dropped_blocks)
+
+    def roll_back(self, inspect_db_session: orm.Session, fork_block: int) -> None:
+        """
+        Deletes the rows of the blocks after the fork block, and forgets their hashes.
+        """
+        contracts, blocks = self.delete_blocks(inspect_db_session, fork_block)
+        while self.recent_hashes and self.recent_hashes[-1][0] > fork_block:
+            self.recent_hashes.pop()
+        metrics.inc("tlsc_follow_reorgs_total", inspector=self.host)
+        self.logger.warning("Reorg after block %s: deleted %s contracts and %s blocks", fork_block, contracts, blocks)
+
+    async def follow_blocks(self, inspect_db_session: orm.Session, after_block: int, before_block: int) -> int:
+        """
+        Fetches and consumes [after_block, before_block), unless it does not extend the followed chain.
+        :return: The next block to follow
+        """
+        blocks: List[RawBlock] = []
+        for block_number in range(after_block, before_block):
+            self.logger.debug("Block: %s -- Getting block data", block_number)
+            blocks.append(await fetch_block(self.w3, block_number, self.raw_client))
+
+        parent_hash = self.recent_hashes[-1][1] if self.recent_hashes else None
+        for i, block in enumerate(blocks):
+            if parent_hash is not None and block.parent_hash.lower() != parent_hash.lower():
+                if i == 0:
+                    fork_block = await self.find_fork_block()
+                    self.roll_back(inspect_db_session, fork_block)
+                    return fork_block + 1
+                # the chain changed while the batch was fetched, the rest is fetched again on the next poll
+                blocks = blocks[:i]
+                break
+            parent_hash = block.hash
+
+        try:
+            for consumer in self.consumers:
+                with span(f"consume_{consumer.name}"):
+                    await consumer.consume(self.w3, blocks, self.logger, inspect_db_session)
+        except Exception:
+            # the rows stored by the consumers that succeeded are deleted, so that all the consumers consume the blocks
+            # of the chain the endpoint has when they are retried, which may have reorged in between
+            inspect_db_session.rollback()
+            self.delete_blocks(inspect_db_session, blocks[0].number - 1)
+            raise
+
+        self.recent_hashes.extend((block.number, block.hash) for block in blocks)
+        self.record_batch((blocks[0].number, blocks[-1].number + 1))
+        return blocks[-1].number + 1
+
+    async def inspect_many(
+            self,
+            inspect_db_session: orm.Session,
+            task_batch: Tuple[int | None, int],
+            batch_size: int = 20,
+    ):
+        """
+        Follows the chain until cancelled, from the first block of task_batch, or from the head if it is None.
+        The blocks already stored by a consumer are skipped, so a restarted follower catches up where it stopped.
+        """
+        self.logger = configure_logger(self.host)
+        after_block, _ = task_batch
+        next_block = None
+        if after_block is not None:
+            next_block = min(consumer.resume(inspect_db_session, after_block, LAST_BLOCK)
+                             for consumer in self.consumers)
+
+        self.logger.info(f"{self.host}: Following the chain from block {next_block or 'head'} for "
+                         f"{[consumer.name for consumer in self.consumers]}")
+        try:
+            while True:
+                head = await self.poll_head()
+                if head is None:
+                    self.logger.warning(f"{self.host}: No endpoint of the pool returned its head")
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                head_block, rpc_endpoint = head
+                if rpc_endpoint != self.rpc_endpoint:
+                    self.switch_endpoint(rpc_endpoint)
+                if next_block is None:
+                    next_block = min(consumer.resume(inspect_db_session, head_block, LAST_BLOCK)
+                                     for consumer in self.consumers)
+                metrics.set("tlsc_follow_lag_blocks", head_block + 1 - next_block, inspector=self.host)
+
+                if next_block <= head_block:
+                    try:
+                        next_block = await self.follow_blocks(inspect_db_session, next_block,
+                                                              min(next_block + batch_size, head_block + 1))
+                    except CancelledError:
+                        raise
+                    except Exception:
+                        # e.g. a block reward that Etherscan does not have yet, the blocks are retried
+                        inspect_db_session.rollback()
+                        self.logger.error(f"{self.host}: Failed to follow block {next_block}, retrying:\n"
+                                          f"{traceback.format_exc()}")
+                        await asyncio.sleep(self.poll_interval)
+                if next_block > head_block:
+                    await asyncio.sleep(self.poll_interval)
+        except CancelledError:
+            self.logger.info(f"{self.host}: Requested to exit, cleaning up...")
+        finally:
+            await self.close()
+            clean_up_log_handlers(self.logger)
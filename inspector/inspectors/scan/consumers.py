@@ -0,0 +1,208 @@
+from abc import ABC, abstractmethod
+from logging import Logger
+from typing import List, Dict
+
+from sqlalchemy import orm, select, func
+from web3 import Web3
+
+from inspector.etherscan import EtherscanClient
+from inspector.inspectors.block.block import get_last_inspected_block as get_last_block_row
+from inspector.inspectors.block.columnar import (
+    AddressIndex,
+    build_block_batch,
+    coinbase_transfers_wei,
+    touched_contracts,
+)
+from inspector.inspectors.block.inspect_batch import (
+    FULL_BLOCK_ATTRIBUTES,
+    check_block_transactions,
+    fetch_block_rewards,
+    get_block_attributes,
+    get_block_rows,
+    load_contract_index,
+)
+from inspector.inspectors.block.rollups import write_blocks
+from inspector.inspectors.contract.inspect_batch import fetch_balances_at
+from inspector.inspectors.tlsc.inspect_batch import find_time_locked_contracts
+from inspector.inspectors.tlsc.tlsc import get_last_inspected_block as get_last_contract_row
+from inspector.models.balance_history.model import BalanceHistory
+from inspector.models.block.model import Block
+from inspector.models.contract.model import Contract
+from inspector.models.contract_info.model import ContractInfo
+from inspector.models.crud import insert_data, update_data, bulk_update_data, insert_new_data
+from inspector.raw_rpc import RawBlock, RawRPCClient
+
+
+class BlockConsumer(ABC):
+    """
+    Consumer of the blocks fetched by the scan inspector.
+    Each consumer tracks its own progress and writes its own output.
+    """
+    name: str = ""
+
+    def __init__(self):
+        self.start_block = 0
+
+    def resume(self, inspect_db_session: orm.Session, after_block: int, before_block: int) -> int:
+        """
+        Sets and returns the first block this consumer still has to process in [after_block, before_block).
+        """
+        self.start_block = after_block
+        return self.start_block
+
+    async def consume(
+            self,
+            web3: Web3,
+            blocks: List[RawBlock],
+            logger: Logger,
+            inspect_db_session: orm.Session,
+    ) -> None:
+        blocks = [block for block in blocks if block.number >= self.start_block]
+        if blocks:
+            await self.consume_blocks(web3, blocks, logger, inspect_db_session)
+
+    @abstractmethod
+    async def consume_blocks(
+            self,
+            web3: Web3,
+            blocks: List[RawBlock],
+            logger: Logger,
+            inspect_db_session: orm.Session,
+    ) -> None:
+        pass
+
+
+class TimeLockConsumer(BlockConsumer):
+    """Discovers contracts with potential time locks, same output as the TLSC inspector."""
+    name = "tlsc"
+
+    def resume(self, inspect_db_session: orm.Session, after_block: int, before_block: int) -> int:
+        self.start_block = get_last_contract_row(inspect_db_session, after_block, before_block)
+        return self.start_block
+
+    async def consume_blocks(self, web3, blocks, logger, inspect_db_session):
+        all_tlscs: List[Dict] = []
+        for block in blocks:
+            all_tlscs.extend(await find_time_locked_contracts(web3, block, logger))
+
+        if all_tlscs:
+            logger.debug("Writing contracts to DB")
+            insert_data(Contract, all_tlscs, inspect_db_session)
+            logger.debug("Writing done")
+
+
+class BlockEconomicsConsumer(BlockConsumer):
+    """Stores miner, rewards, fees and gas of each block, same output as the block inspector."""
+    name = "blocks"
+
+    def __init__(self, etherscan_client: EtherscanClient):
+        super().__init__()
+        self.etherscan_client = etherscan_client
+
+    def resume(self, inspect_db_session: orm.Session, after_block: int, before_block: int) -> int:
+        self.start_block = get_last_block_row(inspect_db_session, after_block, before_block, None)
+        return self.start_block
+
+    async def consume_blocks(self, web3, blocks, logger, inspect_db_session):
+        block_rewards = await fetch_block_rewards([block.number for block in blocks], self.etherscan_client)
+        # the miner is the only address the coinbase transfers need
+        batch = build_block_batch(blocks, AddressIndex([]))
+        coinbase_transfers = coinbase_transfers_wei(batch)
+        # base fees come with the block, no need for fee_history
+        base_fees_per_gas = [block.base_fee_per_gas or 0 for block in blocks]
+        all_blocks = get_block_rows(blocks, block_rewards, base_fees_per_gas, coinbase_transfers)
+
+        logger.debug("Writing blocks to DB")
+        write_blocks(all_blocks, inspect_db_session)
+        logger.debug("Writing done")
+
+
+class LargestTransactionConsumer(BlockConsumer):
+    """
+    Tracks the largest transaction from/to the known contracts.
+    Updates only ever raise the stored value, so re-processing blocks is harmless and no progress is stored.
+    """
+    name = "largest_tx"
+
+    async def consume_blocks(self, web3, blocks, logger, inspect_db_session):
+        address_index, largest_tx_values = load_contract_index(inspect_db_session)
+        batch = build_block_batch(blocks, address_index)
+        all_updated_info, _ = check_block_transactions(batch, address_index, largest_tx_values)
+
+        if all_updated_info:
+            logger.debug("Updating contracts info in DB")
+            update_data(ContractInfo, all_updated_info, inspect_db_session)
+            logger.debug("Updating done")
+
+
+class AttributeConsumer(BlockConsumer):
+    """Backfills attributes of already stored blocks, same output as the block inspector with attributes."""
+    name = "attributes"
+
+    def __init__(self, attributes: List[str] = None):
+        super().__init__()
+        self.attributes = attributes or ["tx_count"]
+        for attribute in self.attributes:
+            if attribute not in FULL_BLOCK_ATTRIBUTES:
+                raise ValueError(f"Attribute {attribute} is not available in scan mode, "
+                                 f"must be one of {list(FULL_BLOCK_ATTRIBUTES)}")
+
+    def resume(self, inspect_db_session: orm.Session, after_block: int, before_block: int) -> int:
+        self.start_block = get_last_block_row(inspect_db_session, after_block, before_block, self.attributes)
+        return self.start_block
+
+    async def consume_blocks(self, web3, blocks, logger, inspect_db_session):
+        logger.debug("Writing attributes to DB")
+        bulk_update_data(Block, get_block_attributes(blocks, self.attributes), inspect_db_session)
+        logger.debug("Writing done")
+
+
+class BalanceConsumer(BlockConsumer):
+    """
+    Keeps a balance history of the known contracts. Only the contracts touched by a block's
+    transactions (as sender, recipient or miner) are re-queried, at that block.
+    A row is only stored when the balance differs from the previous lookup of the same batch.
+    The known contracts are reloaded for each batch, so the contracts found meanwhile (e.g. by the tlsc consumer)
+    get a history from their next batch on.
+    """
+    name = "balances"
+
+    def __init__(self, raw_client: RawRPCClient = None):
+        super().__init__()
+        self.raw_client = raw_client
+
+    def resume(self, inspect_db_session: orm.Session, after_block: int, before_block: int) -> int:
+        latest_block = inspect_db_session.execute(
+            select(func.max(BalanceHistory.block_number)).
+            where(BalanceHistory.block_number >= after_block, BalanceHistory.block_number < before_block)
+        ).scalar()
+        self.start_block = latest_block + 1 if latest_block is not None else after_block
+        return self.start_block
+
+    async def consume_blocks(self, web3, blocks, logger, inspect_db_session):
+        address_index = AddressIndex(inspect_db_session.execute(select(Contract.contract_address)).scalars())
+        batch = build_block_batch(blocks, address_index)
+        block_positions, contract_ids = touched_contracts(batch, address_index)
+        lookups = [
+            (address_index.contract_addresses[contract_id], int(batch.block_numbers[block_position]))
+            for block_position, contract_id in zip(block_positions.tolist(), contract_ids.tolist())
+        ]
+        if not lookups:
+            return
+        balances = await fetch_balances_at(web3, lookups, self.raw_client)
+
+        last_balances: Dict[str, int] = {}
+        all_balances: List[Dict] = []
+        for (contract_address, block_number), balance in zip(lookups, balances):
+            if last_balances.get(contract_address) == balance:
+                continue
+            last_balances[contract_address] = balance
+            all_balances.append({
+                "contract_address": contract_address,
+                "block_number": block_number,
+                "balance_wei": balance,
+            })
+
+        logger.debug("Writing balances to DB")
+        insert_new_data(BalanceHistory, all_balances, inspect_db_session)
+        logger.debug("Writing done")
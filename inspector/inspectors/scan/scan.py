@@ -0,0 +1,118 @@
+import asyncio
+import traceback
+from asyncio import CancelledError
+from typing import Tuple, List
+
+from sqlalchemy import orm
+
+from inspector.base import Inspector, iter_block_ranges
+from inspector.cache import BlockCache
+from inspector.etherscan import EtherscanCache, EtherscanClient
+from inspector.inspectors.scan.consumers import (
+    AttributeConsumer,
+    BalanceConsumer,
+    BlockConsumer,
+    BlockEconomicsConsumer,
+    LargestTransactionConsumer,
+    TimeLockConsumer,
+)
+from inspector.raw_rpc import RawBlock, RawRPCClient, fetch_block
+from inspector.utils import configure_logger, clean_up_log_handlers
+from utils.profiling import span
+
+DEFAULT_CONSUMERS = [TimeLockConsumer.name, BlockEconomicsConsumer.name, LargestTransactionConsumer.name]
+
+
+def get_consumers(
+        names: List[str],
+        etherscan_client: EtherscanClient = None,
+        attributes: List[str] = None,
+        raw_client: RawRPCClient = None,
+) -> List[BlockConsumer]:
+    consumers = []
+    for name in names:
+        if name == TimeLockConsumer.name:
+            consumers.append(TimeLockConsumer())
+        elif name == BlockEconomicsConsumer.name:
+            consumers.append(BlockEconomicsConsumer(etherscan_client))
+        elif name == LargestTransactionConsumer.name:
+            consumers.append(LargestTransactionConsumer())
+        elif name == AttributeConsumer.name:
+            consumers.append(AttributeConsumer(attributes))
+        elif name == BalanceConsumer.name:
+            consumers.append(BalanceConsumer(raw_client))
+        else:
+            raise ValueError(f"Invalid consumer {name}")
+    return consumers
+
+
+class ScanInspector(Inspector):
+    """
+    Fetches each block of a range once and fans it out to several consumers.
+    """
+
+    def __init__(
+            self,
+            rpc_endpoint: str,
+            max_concurrency: int = 1,
+            request_timeout: int = 300,
+            etherscan_api_key: str = "",
+            consumers: List[str] = None,
+            attributes: List[str] = None,
+            raw: bool = False,
+            cache: BlockCache = None,
+            etherscan_cache: EtherscanCache = None,
+    ):
+        super().__init__(rpc_endpoint, max_concurrency, request_timeout, raw=raw, cache=cache)
+        self.etherscan_client = EtherscanClient([etherscan_api_key], cache=etherscan_cache)
+        self.consumers = get_consumers(consumers or DEFAULT_CONSUMERS, self.etherscan_client, attributes,
+                                       self.raw_client)
+
+    async def close(self) -> None:
+        await self.etherscan_client.close()
+        await super().close()
+
+    async def inspect_many(
+            self,
+            inspect_db_session: orm.Session,
+            task_batch: Tuple[int, int],
+            batch_size: int = 20,
+    ):
+        self.logger = configure_logger(self.host)
+        after_block, before_block = task_batch
+
+        # start from the consumer that is furthest behind, the others skip what they already have
+        after_block = min(consumer.resume(inspect_db_session, after_block, before_block)
+                          for consumer in self.consumers)
+
+        self.logger.info(f"{self.host}: Gathered {before_block - after_block} blocks to scan for "
+                         f"{[consumer.name for consumer in self.consumers]}")
+        try:
+            await self.run_batches(inspect_db_session,
+                                   iter_block_ranges(after_block, before_block, batch_size))
+        except CancelledError:
+            self.logger.info(f"{self.host}: Requested to exit, cleaning up...")
+        except Exception as e:
+            self.logger.error(f"{self.host}: Exited due to {type(e)}:\n{traceback.format_exc()}")
+            raise
+        finally:
+            await self.close()
+            clean_up_log_handlers(self.logger)
+
+    async def safe_inspect_many(
+            self,
+            inspect_db_session: orm.Session,
+            semaphore: asyncio.Semaphore,
+            task_batch: Tuple[int, int],
+    ):
+        after_block_number, before_block_number = task_batch
+        async with semaphore:
+            self.logger.info("Scanning blocks %s to %s", after_block_number, before_block_number)
+            blocks: List[RawBlock] = []
+            for block_number in range(after_block_number, before_block_number):
+                self.logger.debug("Block: %s -- Getting block data", block_number)
+                blocks.append(await fetch_block(self.w3, block_number, self.raw_client))
+
+            for consumer in self.consumers:
+                with span(f"consume_{consumer.name}"):
+                    await consumer.consume(self.w3, blocks, self.logger, inspect_db_session)
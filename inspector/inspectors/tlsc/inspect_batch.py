@@ -7,11 +7,9 @@ from web3 import Web3
 from code_analyzer.time_lock.time_lock_detector import bytecode_has_potential_time_lock
 from inspector.models.contract.model import Contract
 from inspector.models.crud import insert_data
-
-
-async def _fetch_block_transactions(w3, block_number: int) -> List:
-    block_json = await w3.eth.get_block(block_identifier=block_number, full_transactions=True)
-    return block_json["transactions"]
+from inspector.offload import offload
+from inspector.raw_rpc import RawBlock, RawRPCClient, fetch_block
+from utils.profiling import span
 
 
 async def _fetch_contract(w3, tx_hash: str, block_number: int) -> Tuple[str, str]:
@@ -21,12 +19,51 @@ async def _fetch_contract(w3, tx_hash: str, block_number: int) -> Tuple[str, str
     return contract_address, bytecode.hex()
 
 
+async def find_time_locked_contracts(web3: Web3, block: RawBlock, logger: Logger) -> List[Dict]:
+    """
+    Finds the contracts created in a block whose bytecode has a potential time lock.
+
+    :param web3: Web3 provider
+    :param block: The block to check
+    :param logger: Logger
+    :return: Rows of the contracts table
+    """
+    tlscs: List[Dict] = []
+    for tx in block.transactions:
+        # else, check if it's from an already known contract
+        if tx.to_address is None:  # todo: check for duplicate address in the db (Made a mistake and removed duplicates)
+            with span("fetch_contract"):
+                contract_address, bytecode = await _fetch_contract(web3, tx.hash, block.number)
+            # Ignore empty bytecodes
+            if bytecode == "0x":
+                continue
+
+            logger.debug("Block: %s -- Contract: %s -- Check TL", block.number, contract_address)
+
+            with span("time_lock_check"):
+                has_potential_time_lock = await offload(bytecode_has_potential_time_lock, bytecode)
+            if not has_potential_time_lock:
+                continue
+
+            logger.debug("Block: %s -- Contract: %s -- Append tlscs", block.number, contract_address)
+
+            tlscs.append({
+                "contract_address": contract_address,
+                "bytecode": bytecode,
+                "from_address": Web3.to_checksum_address(tx.from_address),
+                "tx_hash": tx.hash,
+                "block_number": block.number,
+            })
+    return tlscs
+
+
 async def inspect_many_blocks(
         web3: Web3,
         after_block_number: int,
         before_block_number: int,
         logger: Logger,
         inspect_db_session: orm.Session,
+        raw_client: RawRPCClient = None,
 ) -> None:
     """
     Inspects blocks for time lock smart contracts.
@@ -37,38 +74,17 @@ async def inspect_many_blocks(
     :param before_block_number: Block number to end with
     :param logger: Logger
     :param inspect_db_session: DB session
+    :param raw_client: Raw JSON-RPC client, if given blocks are fetched without web3 formatting
     :return: None
     """
     all_tlscs: List[Dict] = []
 
-    logger.info(f"Inspecting blocks {after_block_number} to {before_block_number}")
+    logger.info("Inspecting blocks %s to %s", after_block_number, before_block_number)
     for block_number in range(after_block_number, before_block_number):
-        logger.debug(f"Block: {block_number} -- Getting block data")
-
-        block_transactions = await _fetch_block_transactions(web3, block_number)
-
-        for tx in block_transactions:
-            # else, check if it's from an already known contract
-            if tx['to'] is None:  # todo: check for duplicate address in the db (Made a mistake and removed duplicates)
-                contract_address, bytecode = await _fetch_contract(web3, tx['hash'], block_number)
-                # Ignore empty bytecodes
-                if bytecode == "0x":
-                    continue
-
-                logger.debug(f"Block: {block_number} -- Contract: {contract_address} -- Check TL")
-
-                if not bytecode_has_potential_time_lock(bytecode):
-                    continue
-
-                logger.debug(f"Block: {block_number} -- Contract: {contract_address} -- Append tlscs")
+        logger.debug("Block: %s -- Getting block data", block_number)
 
-                all_tlscs.append({
-                    "contract_address": contract_address,
-                    "bytecode": bytecode,
-                    "from_address": tx['from'],
-                    "tx_hash": tx['hash'].hex(),
-                    "block_number": block_number,
-                })
+        block = await fetch_block(web3, block_number, raw_client)
+        all_tlscs.extend(await find_time_locked_contracts(web3, block, logger))
 
     if all_tlscs:
         logger.debug("Writing to DB")
@@ -6,13 +6,13 @@ from typing import Tuple
 from sqlalchemy import orm, desc
 from sqlalchemy.orm import Session
 
-from inspector.base import Inspector
+from inspector.base import Inspector, iter_block_ranges
 from inspector.models.contract.model import Contract
 from inspector.inspectors.tlsc.inspect_batch import inspect_many_blocks
 from inspector.utils import configure_logger, clean_up_log_handlers
 
 
-def _get_last_inspected_block(session: Session, after_block: int, before_block: int) -> int:
+def get_last_inspected_block(session: Session, after_block: int, before_block: int) -> int:
     """
     Gets the last block that was inspected and stored on DB.
     Might be better to modify it and move it to pre-exec stages.
@@ -43,32 +43,19 @@ class TLSCInspector(Inspector):
         self.logger = configure_logger(self.host)
 
         after_block, before_block = task_batch
-        after_block = _get_last_inspected_block(inspect_db_session, after_block, before_block)
-
-        tasks = []
-        sem = asyncio.Semaphore(self.max_concurrency)
-        for block_number in range(after_block, before_block, batch_size):
-            batch_after_block = block_number
-            batch_before_block = min(block_number + batch_size, before_block)
-            tasks.append(
-                asyncio.ensure_future(
-                    self.safe_inspect_many(
-                        inspect_db_session=inspect_db_session,
-                        task_batch=(batch_after_block, batch_before_block),
-                        semaphore=sem
-                    )
-                )
-            )
+        after_block = get_last_inspected_block(inspect_db_session, after_block, before_block)
 
         self.logger.info(f"{self.host}: Gathered {before_block - after_block} blocks to inspect")
         try:
-            await asyncio.gather(*tasks)
+            await self.run_batches(inspect_db_session,
+                                   iter_block_ranges(after_block, before_block, batch_size))
         except CancelledError:
             self.logger.info(f"{self.host}: Requested to exit, cleaning up...")
         except Exception:
             self.logger.error(f"{self.host}: Exited due to {traceback.print_exc()}")
             raise
         finally:
+            await self.close()
             clean_up_log_handlers(self.logger)
 
     async def safe_inspect_many(
@@ -85,4 +72,5 @@ class TLSCInspector(Inspector):
                 before_block_number,
                 logger=self.logger,
                 inspect_db_session=inspect_db_session,
+                raw_client=self.raw_client,
             ))
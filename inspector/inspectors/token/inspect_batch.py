@@ -0,0 +1,146 @@
+import asyncio
+from logging import Logger
+from typing import Dict, List, Tuple
+
+from sqlalchemy import orm
+from web3 import Web3
+
+from inspector.inspectors.block.columnar import AddressIndex
+from inspector.models.crud import accumulate_data, insert_data
+from inspector.models.token_balance.model import TokenBalance
+from inspector.models.token_progress.model import TokenProgress
+from inspector.raw_rpc import RawRPCClient, request_block_range
+
+# keccak256("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+# blocks per eth_getLogs call before any split
+LOGS_BLOCK_RANGE = 100
+# above this many tracked contracts, all transfers are fetched and matched locally instead of filtering by topic
+MAX_TOPIC_HOLDERS = 1000
+
+
+async def fetch_logs(
+        web3: Web3,
+        from_block: int,
+        to_block: int,
+        topics: List,
+        token_addresses: List[str] = None,
+        raw_client: RawRPCClient = None,
+) -> List[Dict]:
+    """
+    Fetches the logs of [from_block, to_block] with eth_getLogs, halving the range
+    whenever the node refuses it for returning too many results.
+    :param web3: Web3 provider
+    :param from_block: First block, inclusive
+    :param to_block: Last block, inclusive
+    :param topics: Topic filter
+    :param token_addresses: Emitting contracts to keep, all contracts if None
+    :param raw_client: Raw JSON-RPC client
+    :return: The unformatted logs in block order
+    """
+    def build_filter(range_from_block: int, range_to_block: int) -> Dict:
+        log_filter = {"fromBlock": hex(range_from_block), "toBlock": hex(range_to_block), "topics": topics}
+        if token_addresses:
+            log_filter["address"] = token_addresses
+        return log_filter
+
+    return await request_block_range(web3, "eth_getLogs", build_filter, from_block, to_block, raw_client)
+
+
+def holder_topic_filters(address_index: AddressIndex) -> List[List]:
+    """
+    Builds the topic filters of the Transfer logs. Small sets of tracked contracts are matched by
+    the node, as sender (topic 1) or recipient (topic 2), larger ones are matched locally.
+    """
+    if address_index.contract_count > MAX_TOPIC_HOLDERS:
+        return [[TRANSFER_TOPIC]]
+    holder_topics = ["0x" + "0" * 24 + address[2:].lower() for address in address_index.contract_addresses]
+    return [[TRANSFER_TOPIC, holder_topics], [TRANSFER_TOPIC, None, holder_topics]]
+
+
+def fold_transfers(logs: List[Dict], address_index: AddressIndex) -> List[Dict]:
+    """
+    Folds ERC-20 Transfer logs into per-(token, holder) balance changes of the tracked contracts.
+    ERC-721 transfers (tokenId as a fourth topic) are skipped.
+    :param logs: Unformatted Transfer logs
+    :param address_index: Index of the tracked contracts
+    :return: Rows of token_balances holding the changes, to be added to the stored rows
+    """
+    changes: Dict[Tuple[str, str], Dict] = {}
+
+    def change(token_address: str, holder_id: int, block_number: int) -> Dict:
+        holder_address = address_index.contract_addresses[holder_id]
+        row = changes.get((token_address, holder_address))
+        if row is None:
+            row = changes[(token_address, holder_address)] = {
+                "token_address": token_address,
+                "holder_address": holder_address,
+                "balance": 0,
+                "inflow": 0,
+                "outflow": 0,
+                "transfer_count": 0,
+                "block_number": block_number,
+            }
+        row["transfer_count"] += 1
+        row["block_number"] = max(row["block_number"], block_number)
+        return row
+
+    for log in logs:
+        topics = log["topics"]
+        if len(topics) != 3 or log.get("removed"):
+            continue
+        # topics hold the addresses left-padded to 32 bytes
+        from_id = address_index.ids.get("0x" + topics[1][-40:], -1)
+        to_id = address_index.ids.get("0x" + topics[2][-40:], -1)
+        from_tracked = 0 <= from_id < address_index.contract_count
+        to_tracked = 0 <= to_id < address_index.contract_count
+        if not (from_tracked or to_tracked):
+            continue
+
+        token_address = log["address"].lower()
+        block_number = int(log["blockNumber"], 16)
+        value = int(log["data"], 16) if log["data"] not in ("0x", "") else 0
+        if from_tracked:
+            row = change(token_address, from_id, block_number)
+            row["balance"] -= value
+            row["outflow"] += value
+        if to_tracked:
+            row = change(token_address, to_id, block_number)
+            row["balance"] += value
+            row["inflow"] += value
+
+    return list(changes.values())
+
+
+async def inspect_many_ranges(
+        web3: Web3,
+        after_block_number: int,
+        before_block_number: int,
+        address_index: AddressIndex,
+        logger: Logger,
+        inspect_db_session: orm.Session,
+        token_addresses: List[str] = None,
+        raw_client: RawRPCClient = None,
+):
+    logger.info("Indexing token transfers of blocks %s to %s", after_block_number, before_block_number)
+    ranges = [
+        (from_block, min(from_block + LOGS_BLOCK_RANGE, before_block_number) - 1)
+        for from_block in range(after_block_number, before_block_number, LOGS_BLOCK_RANGE)
+    ]
+    all_logs = await asyncio.gather(*[
+        fetch_logs(web3, from_block, to_block, topics, token_addresses, raw_client)
+        for from_block, to_block in ranges
+        for topics in holder_topic_filters(address_index)
+    ])
+
+    # a transfer between two tracked contracts matches both the sender and the recipient filter
+    unique_logs = {(log["transactionHash"], log["logIndex"]): log for logs in all_logs for log in logs}
+    all_changes = fold_transfers(list(unique_logs.values()), address_index)
+    logger.debug("Writing token balances to DB")
+    if all_changes:
+        accumulate_data(TokenBalance, all_changes, inspect_db_session, keys=["token_address", "holder_address"],
+                        commit=False)
+    # the range is marked as folded in the same transaction, so it is never folded twice
+    insert_data(TokenProgress, [{"after_block": after_block_number, "before_block": before_block_number}],
+                inspect_db_session)
+    logger.debug("Writing done")
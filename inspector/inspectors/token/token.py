@@ -0,0 +1,125 @@
+import asyncio
+import traceback
+from asyncio import CancelledError
+from typing import List, Tuple
+
+from sqlalchemy import orm, select, func
+
+from inspector.base import Inspector
+from inspector.cache import BlockCache
+from inspector.inspectors.block.columnar import AddressIndex
+from inspector.inspectors.token.inspect_batch import inspect_many_ranges
+from inspector.models.contract.model import Contract
+from inspector.models.token_progress.model import TokenProgress
+from inspector.utils import configure_logger, clean_up_log_handlers
+from utils.profiling import profile_batch
+
+# blocks per batch, each batch is one write and is split into concurrent eth_getLogs ranges
+TOKEN_BATCH_SIZE = 1000
+
+
+def get_last_inspected_block(session: orm.Session, after_block: int, before_block: int) -> int:
+    """
+    Gets the block to resume from: the end of the folded ranges that cover after_block without a gap.
+    Each range is stored with its fold, so the progress of other processes or of batches committed out of order
+    can not make the inspector skip blocks that were never folded.
+    """
+    next_block = after_block
+    while next_block < before_block:
+        folded_until = session.execute(
+            select(func.max(TokenProgress.before_block)).
+            where(TokenProgress.after_block <= next_block, TokenProgress.before_block > next_block)
+        ).scalar()
+        if folded_until is None:
+            break
+        next_block = folded_until
+    return min(next_block, before_block)
+
+
+def get_next_batch(session: orm.Session, after_block: int, before_block: int,
+                   batch_size: int) -> Tuple[int, int] | None:
+    """
+    Gets the next range of at most batch_size blocks that is not folded yet, None once [after_block, before_block)
+    is folded. The range stops where a range folded by another run starts.
+    """
+    after_block = get_last_inspected_block(session, after_block, before_block)
+    if after_block >= before_block:
+        return None
+    end_block = min(after_block + batch_size, before_block)
+    next_folded = session.execute(
+        select(func.min(TokenProgress.after_block)).
+        where(TokenProgress.after_block > after_block, TokenProgress.after_block < end_block)
+    ).scalar()
+    return after_block, next_folded if next_folded is not None else end_block
+
+
+class TokenInspector(Inspector):
+    """
+    Indexes the ERC-20 balances and flows of the known contracts from Transfer logs.
+    The balances are exact if the range starts at or before the creation of the contracts.
+    """
+
+    def __init__(
+            self,
+            rpc_endpoint: str,
+            max_concurrency: int = 1,
+            request_timeout: int = 300,
+            token_addresses: List[str] = None,
+            raw: bool = False,
+            cache: BlockCache = None,
+    ):
+        super().__init__(rpc_endpoint, max_concurrency, request_timeout, raw=raw, cache=cache)
+        self.token_addresses = token_addresses
+        self.address_index = AddressIndex([])
+
+    async def inspect_many(
+            self,
+            inspect_db_session: orm.Session,
+            task_batch: Tuple[int, int],
+            batch_size: int = TOKEN_BATCH_SIZE,
+    ):
+        self.logger = configure_logger(self.host)
+
+        after_block, before_block = task_batch
+        after_block = get_last_inspected_block(inspect_db_session, after_block, before_block)
+        self.address_index = AddressIndex(inspect_db_session.execute(select(Contract.contract_address)).scalars())
+
+        self.logger.info(f"{self.host}: Gathered {before_block - after_block} blocks to index for "
+                         f"{self.address_index.contract_count} contracts")
+        semaphore = asyncio.Semaphore(1)
+        try:
+            # the balances are running sums, so batches are folded one after the other
+            task_batch = get_next_batch(inspect_db_session, after_block, before_block, batch_size)
+            while task_batch is not None:
+                self.refresh_endpoint()
+                with profile_batch():
+                    await self.safe_inspect_many(inspect_db_session, semaphore, task_batch)
+                self.record_batch(task_batch)
+                task_batch = get_next_batch(inspect_db_session, task_batch[1], before_block, batch_size)
+        except CancelledError:
+            self.logger.info(f"{self.host}: Requested to exit, cleaning up...")
+        except Exception as e:
+            self.logger.error(f"{self.host}: Exited due to {type(e)}:\n{traceback.format_exc()}")
+            raise
+        finally:
+            await self.close()
+            clean_up_log_handlers(self.logger)
+
+    async def safe_inspect_many(
+            self,
+            inspect_db_session: orm.Session,
+            semaphore: asyncio.Semaphore,
+            task_batch: Tuple[int, int],
+    ):
+        after_block_number, before_block_number = task_batch
+        async with semaphore:
+            await self.batch_queue.put(await inspect_many_ranges(
+                self.w3,
+                after_block_number,
+                before_block_number,
+                address_index=self.address_index,
+                logger=self.logger,
+                inspect_db_session=inspect_db_session,
+                token_addresses=self.token_addresses,
+                raw_client=self.raw_client,
+            ))
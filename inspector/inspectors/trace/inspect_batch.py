@@ -0,0 +1,111 @@
+import asyncio
+from logging import Logger
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import orm
+from web3 import Web3
+
+from inspector.inspectors.block.columnar import AddressIndex, build_transfer_batch
+from inspector.inspectors.block.inspect_batch import check_largest_transactions
+from inspector.models.contract_info.model import ContractInfo
+from inspector.models.crud import update_data
+from inspector.raw_rpc import RawRPCClient, RawTransaction, request_block_range
+
+# tracked contracts per trace_filter call
+TRACE_ADDRESS_CHUNK_SIZE = 500
+# call types that move value to the callee, delegatecall and staticcall never do
+VALUE_CALL_TYPES = ("call", "callcode")
+
+
+def decode_transfer(trace: Dict) -> Optional[Tuple[int, RawTransaction]]:
+    """
+    Decodes the value transfer of a trace_filter result.
+    :return: (block number, transfer) or None if the trace does not move any value
+    """
+    if trace.get("error"):
+        return None
+    action = trace["action"]
+    if trace["type"] == "call" and action.get("callType") in VALUE_CALL_TYPES:
+        from_address, to_address, value = action["from"], action["to"], action["value"]
+    elif trace["type"] == "create" and trace.get("result"):
+        from_address, to_address, value = action["from"], trace["result"]["address"], action["value"]
+    elif trace["type"] == "suicide":
+        from_address, to_address, value = action["address"], action["refundAddress"], action["balance"]
+    else:
+        return None
+    value = int(value, 16)
+    if value == 0:
+        return None
+    return int(trace["blockNumber"]), RawTransaction(
+        trace["transactionHash"], from_address.lower(), to_address.lower(), value)
+
+
+async def fetch_contract_transfers(
+        web3: Web3,
+        from_block: int,
+        to_block: int,
+        contract_addresses: List[str],
+        raw_client: RawRPCClient = None,
+) -> List[Tuple[int, RawTransaction]]:
+    """
+    Fetches the value transfers, top-level or internal, from or to the given contracts with trace_filter.
+    The node only returns the matching traces. Senders and recipients are queried separately
+    since nodes differ on whether fromAddress and toAddress are combined as a union or an intersection.
+    :param web3: Web3 provider
+    :param from_block: First block, inclusive
+    :param to_block: Last block, inclusive
+    :param contract_addresses: Contracts to match
+    :param raw_client: Raw JSON-RPC client
+    :return: (block number, transfer) pairs
+    """
+    chunks = [contract_addresses[i:i + TRACE_ADDRESS_CHUNK_SIZE]
+              for i in range(0, len(contract_addresses), TRACE_ADDRESS_CHUNK_SIZE)]
+
+    def filter_builder(address_key: str, chunk: List[str]):
+        def build_filter(range_from_block: int, range_to_block: int) -> Dict:
+            return {"fromBlock": hex(range_from_block), "toBlock": hex(range_to_block), address_key: chunk}
+        return build_filter
+
+    all_traces = await asyncio.gather(*[
+        request_block_range(web3, "trace_filter", filter_builder(address_key, chunk), from_block, to_block,
+                            raw_client)
+        for chunk in chunks
+        for address_key in ("fromAddress", "toAddress")
+    ])
+
+    # a transfer between two tracked contracts is returned for both its sender and its recipient
+    unique_traces = {
+        (trace["transactionHash"], tuple(trace["traceAddress"])): trace
+        for traces in all_traces for trace in traces
+    }
+    transfers = [decode_transfer(trace) for trace in unique_traces.values()]
+    return [transfer for transfer in transfers if transfer is not None]
+
+
+async def inspect_many_transfers(
+        web3: Web3,
+        after_block_number: int,
+        before_block_number: int,
+        address_index: AddressIndex,
+        largest_tx_values: List[int | None],
+        logger: Logger,
+        inspect_db_session: orm.Session,
+        raw_client: RawRPCClient = None,
+) -> None:
+    """
+    Updates the largest transaction of the known contracts with their value transfers, internal ones included.
+    :param address_index: Index of the known contracts
+    :param largest_tx_values: Largest transaction value (wei) of each contract, updated in place
+    """
+    logger.info("Tracing transfers of blocks %s to %s", after_block_number, before_block_number)
+    transfers = await fetch_contract_transfers(web3, after_block_number, before_block_number - 1,
+                                               address_index.contract_addresses, raw_client)
+    logger.debug("Blocks: %s to %s -- Got %s transfers", after_block_number, before_block_number, len(transfers))
+
+    batch = build_transfer_batch(transfers, address_index)
+    all_updated_info = check_largest_transactions(batch, address_index, largest_tx_values)
+
+    if all_updated_info:
+        logger.debug("Updating contracts info in DB")
+        update_data(ContractInfo, all_updated_info, inspect_db_session)
+        logger.debug("Updating done")
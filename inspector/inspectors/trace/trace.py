@@ -0,0 +1,66 @@
+import asyncio
+import traceback
+from asyncio import CancelledError
+from typing import Tuple
+
+from sqlalchemy import orm
+
+from inspector.base import Inspector, iter_block_ranges
+from inspector.inspectors.block.inspect_batch import load_contract_index
+from inspector.inspectors.trace.inspect_batch import inspect_many_transfers
+from inspector.utils import configure_logger, clean_up_log_handlers
+
+# blocks per batch, trace_filter only returns the matching traces so ranges can be long
+TRACE_BATCH_SIZE = 10000
+
+
+class TraceInspector(Inspector):
+    """
+    Tracks the value transfers from/to the known contracts, internal calls included, with Erigon's trace_filter.
+    The RPC volume follows the number of matches instead of the number of blocks.
+    Updates only ever raise the stored largest transactions, so re-processing blocks is harmless.
+    """
+
+    async def inspect_many(
+            self,
+            inspect_db_session: orm.Session,
+            task_batch: Tuple[int, int],
+            batch_size: int = TRACE_BATCH_SIZE,
+    ):
+        self.logger = configure_logger(self.host)
+        after_block, before_block = task_batch
+        # loaded once, the largest values are shared and updated in place by all batches
+        self.address_index, self.largest_tx_values = load_contract_index(inspect_db_session)
+
+        self.logger.info(f"{self.host}: Gathered {before_block - after_block} blocks to trace for "
+                         f"{self.address_index.contract_count} contracts")
+        try:
+            await self.run_batches(inspect_db_session,
+                                   iter_block_ranges(after_block, before_block, batch_size))
+        except CancelledError:
+            self.logger.info(f"{self.host}: Requested to exit, cleaning up...")
+        except Exception as e:
+            self.logger.error(f"{self.host}: Exited due to {type(e)}:\n{traceback.format_exc()}")
+            raise
+        finally:
+            await self.close()
+            clean_up_log_handlers(self.logger)
+
+    async def safe_inspect_many(
+            self,
+            inspect_db_session: orm.Session,
+            semaphore: asyncio.Semaphore,
+            task_batch: Tuple[int, int],
+    ):
+        after_block_number, before_block_number = task_batch
+        async with semaphore:
+            await self.batch_queue.put(await inspect_many_transfers(
+                self.w3,
+                after_block_number,
+                before_block_number,
+                address_index=self.address_index,
+                largest_tx_values=self.largest_tx_values,
+                logger=self.logger,
+                inspect_db_session=inspect_db_session,
+                raw_client=self.raw_client,
+            ))
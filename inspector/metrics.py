@@ -0,0 +1,227 @@
+import bisect
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Coroutine, Dict, List, Tuple
+
+from web3 import Web3
+from web3.types import RPCEndpoint, RPCResponse
+
+from inspector.utils import json_dumps, json_loads
+from utils.profiling import span
+
+# upper bounds of the latency histograms, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# seconds between two snapshots of a worker process
+FLUSH_INTERVAL = 5
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Metrics:
+    """
+    In-process counters, gauges and histograms.
+    When a metrics directory is set, each process snapshots its metrics to its own file in it,
+    and the metrics server sums the snapshots of all the processes.
+    """
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        # bucket counts (the last one is +Inf), sum
+        self.histograms: Dict[Tuple[str, Labels], Tuple[List[int], float]] = {}
+        self.metrics_dir: Path | None = None
+        self.flushed_at = 0.0
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _labels(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+        self.maybe_flush()
+
+    def set(self, name: str, value: float, **labels) -> None:
+        self.gauges[(name, _labels(labels))] = value
+        self.maybe_flush()
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, _labels(labels))
+        counts, total = self.histograms.get(key) or ([0] * (len(LATENCY_BUCKETS) + 1), 0.0)
+        counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.histograms[key] = (counts, total + value)
+        self.maybe_flush()
+
+    def maybe_flush(self) -> None:
+        if self.metrics_dir is not None and time.monotonic() - self.flushed_at > FLUSH_INTERVAL:
+            self.flush()
+
+    def snapshot(self) -> Dict:
+        # list() copies the items at once, the server thread may snapshot while the event loop records
+        return {
+            "counters": [[name, labels, value] for (name, labels), value in list(self.counters.items())],
+            "gauges": [[name, labels, value] for (name, labels), value in list(self.gauges.items())],
+            "histograms": [[name, labels, list(counts), total] for (name, labels), (counts, total) in
+                           list(self.histograms.items())],
+        }
+
+    def flush(self) -> None:
+        self.flushed_at = time.monotonic()
+        path = self.metrics_dir / f"{os.getpid()}.json"
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            tmp_path.write_bytes(json_dumps(self.snapshot()))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write the metrics snapshot: {e}")
+
+
+metrics = Metrics()
+
+
+def configure_metrics(metrics_dir: Path) -> None:
+    """
+    Makes the current process (and the processes forked from it) snapshot their metrics to metrics_dir.
+    """
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+    metrics.metrics_dir = metrics_dir
+
+
+def flush_metrics() -> None:
+    if metrics.metrics_dir is not None:
+        metrics.flush()
+
+
+def clear_metrics(metrics_dir: Path) -> None:
+    for path in metrics_dir.glob("*.json"):
+        path.unlink()
+
+
+def render_metrics(metrics_dir: Path) -> str:
+    """
+    Sums the snapshots of all the processes into the Prometheus text format.
+    """
+    flush_metrics()
+    counters: Dict[Tuple[str, Labels], float] = {}
+    gauges: Dict[Tuple[str, Labels], float] = {}
+    histograms: Dict[Tuple[str, Labels], Tuple[List[int], float]] = {}
+    for path in metrics_dir.glob("*.json"):
+        try:
+            snapshot = json_loads(path.read_bytes())
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot["gauges"]:
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, counts, total in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            previous_counts, previous_total = histograms.get(key) or ([0] * len(counts), 0.0)
+            histograms[key] = ([a + b for a, b in zip(previous_counts, counts)], previous_total + total)
+
+    def format_labels(labels, **extra) -> str:
+        pairs = list(labels) + list(extra.items())
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}" if pairs else ""
+
+    lines = []
+    for metric_type, values in (("counter", counters), ("gauge", gauges)):
+        for name in sorted({name for name, _ in values}):
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(f"{name}{format_labels(labels)} {value}"
+                         for (metric_name, labels), value in values.items() if metric_name == name)
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (metric_name, labels), (counts, total) in histograms.items():
+            if metric_name != name:
+                continue
+            cumulative = 0
+            for upper_bound, count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels, le=upper_bound)} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port: int, metrics_dir: Path) -> ThreadingHTTPServer:
+    """
+    Serves the aggregated metrics on http://localhost:port/metrics from a daemon thread.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_metrics(metrics_dir).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def observe_rpc(endpoint: str, method: str, seconds: float, error: bool = False) -> None:
+    metrics.inc("tlsc_rpc_requests_total", endpoint=endpoint, method=method)
+    metrics.observe("tlsc_rpc_request_seconds", seconds, endpoint=endpoint, method=method)
+    if error:
+        metrics.inc("tlsc_rpc_errors_total", endpoint=endpoint, method=method)
+
+
+def construct_metrics_middleware(rpc_endpoint: str):
+    """
+    Creates a provider middleware that records the count, latency and errors of the requests sent to the node.
+    """
+
+    async def metrics_middleware(
+            make_request: Callable[[RPCEndpoint, Any], Any], web3: Web3  # pylint: disable=unused-argument
+    ) -> Callable[[RPCEndpoint, Any], Coroutine[Any, Any, RPCResponse]]:
+
+        async def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            start = time.perf_counter()
+            try:
+                with span("rpc_request"):
+                    response = await make_request(method, params)
+            except Exception:
+                observe_rpc(rpc_endpoint, method, time.perf_counter() - start, error=True)
+                raise
+            observe_rpc(rpc_endpoint, method, time.perf_counter() - start, error="error" in response)
+            return response
+
+        return middleware
+
+    return metrics_middleware
+
+
+def observe_db_write(operation: Callable) -> Callable:
+    """
+    Records the latency and the row count of a crud write, labelled with its table.
+    """
+
+    @functools.wraps(operation)
+    def wrapper(table, values, *args, **kwargs):
+        start = time.perf_counter()
+        with span(f"db_{operation.__name__}"):
+            result = operation(table, values, *args, **kwargs)
+        labels = {"table": table.__tablename__, "operation": operation.__name__}
+        metrics.observe("tlsc_db_write_seconds", time.perf_counter() - start, **labels)
+        metrics.inc("tlsc_db_rows_written_total", len(values), **labels)
+        return result
+
+    return wrapper
@@ -0,0 +1,17 @@
+from sqlalchemy import Integer, String, Numeric
+from sqlalchemy.orm import Mapped, mapped_column
+
+from inspector.models.base import Base
+
+
+class BalanceHistory(Base):
+    __tablename__ = 'balance_history'
+
+    contract_address: Mapped[str] = mapped_column(String(100), primary_key=True, default="0x0")
+    block_number: Mapped[int] = mapped_column(Integer, primary_key=True, default=0)
+    balance_wei: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+
+    def __repr__(self):
+        return f"<BalanceHistory(contract_address='{self.contract_address}', " \
+               f"block_number='{self.block_number}', " \
+               f"balance_wei='{self.balance_wei}')>"
@@ -1,20 +1,27 @@
-from sqlalchemy import Integer, String, Numeric
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Integer, Numeric
 from sqlalchemy.orm import Mapped, mapped_column
 
 from inspector.models.base import Base
+from inspector.models.partitions import PARTITION_BY, partition_by_block_range, updated_at_column
+from inspector.models.types import Address
 
 
 class Block(Base):
     __tablename__ = 'blocks'
+    __table_args__ = (PARTITION_BY,)
 
     block_number: Mapped[int] = mapped_column(Integer, primary_key=True, default=0)
-    miner_address: Mapped[str] = mapped_column(String(100), nullable=False)
-    coinbase_transfer: Mapped[float] = mapped_column(Numeric, nullable=False)
-    base_fee_per_gas: Mapped[float] = mapped_column(Numeric, nullable=False)
-    gas_fee: Mapped[float] = mapped_column(Numeric, nullable=False)
-    gas_used: Mapped[float] = mapped_column(Numeric, nullable=False)
-    gas_limit: Mapped[float] = mapped_column(Numeric, nullable=False)
-    tx_count: Mapped[float] = mapped_column(Numeric, nullable=True)
+    miner_address: Mapped[str] = mapped_column(Address, nullable=False)
+    # wei amounts
+    coinbase_transfer: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+    base_fee_per_gas: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+    gas_fee: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+    gas_used: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    gas_limit: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    tx_count: Mapped[int] = mapped_column(Integer, nullable=True)
+    updated_at: Mapped[datetime] = updated_at_column()
 
     def __repr__(self):
         return f"<Block(block_number='{self.block_number}', " \
@@ -25,3 +32,6 @@ class Block(Base):
                f"gas_used='{self.gas_used}', " \
                f"gas_limit='{self.gas_limit}', >" \
                f"tx_count='{self.tx_count}', >"
+
+
+partition_by_block_range(Block.__table__)
@@ -0,0 +1,84 @@
+from sqlalchemy import BigInteger, Integer, Numeric, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from inspector.models.base import Base
+from inspector.models.types import Address
+
+
+class BlockRollup(Base):
+    """
+    Aggregates of the blocks of one bucket, i.e. the bucket_size blocks from bucket_start.
+    """
+    __tablename__ = 'block_rollups'
+
+    bucket_size: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket_start: Mapped[int] = mapped_column(Integer, primary_key=True)
+    first_block: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_block: Mapped[int] = mapped_column(Integer, nullable=False)
+    block_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    empty_block_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    tx_count: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    gas_used_sum: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    gas_used_min: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    gas_used_max: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    gas_limit_sum: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # wei amounts
+    base_fee_per_gas_sum: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+    base_fee_per_gas_min: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+    base_fee_per_gas_max: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+    gas_fee_sum: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+    gas_fee_min: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+    gas_fee_max: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+    coinbase_transfer_sum: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+
+    def __repr__(self):
+        return f"<BlockRollup(bucket_size='{self.bucket_size}', " \
+               f"bucket_start='{self.bucket_start}', " \
+               f"block_count='{self.block_count}', " \
+               f"empty_block_count='{self.empty_block_count}', " \
+               f"gas_used_sum='{self.gas_used_sum}', " \
+               f"base_fee_per_gas_sum='{self.base_fee_per_gas_sum}', " \
+               f"gas_fee_sum='{self.gas_fee_sum}')>"
+
+
+class BlockSketch(Base):
+    """
+    Quantile sketch of a block metric in one bucket: the count of the values of each logarithmic bin.
+    Sketches are merged by adding the counts of their bins.
+    """
+    __tablename__ = 'block_sketches'
+
+    bucket_size: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket_start: Mapped[int] = mapped_column(Integer, primary_key=True)
+    metric: Mapped[str] = mapped_column(String(32), primary_key=True)
+    bin: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<BlockSketch(bucket_size='{self.bucket_size}', " \
+               f"bucket_start='{self.bucket_start}', " \
+               f"metric='{self.metric}', " \
+               f"bin='{self.bin}', " \
+               f"count='{self.count}')>"
+
+
+class MinerRollup(Base):
+    """
+    Blocks of each miner in one bucket.
+    """
+    __tablename__ = 'miner_rollups'
+
+    bucket_size: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket_start: Mapped[int] = mapped_column(Integer, primary_key=True)
+    miner_address: Mapped[str] = mapped_column(Address, primary_key=True)
+    block_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    empty_block_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    gas_fee_sum: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)  # wei
+
+    def __repr__(self):
+        return f"<MinerRollup(bucket_size='{self.bucket_size}', " \
+               f"bucket_start='{self.bucket_start}', " \
+               f"miner_address='{self.miner_address}', " \
+               f"block_count='{self.block_count}', " \
+               f"empty_block_count='{self.empty_block_count}', " \
+               f"gas_fee_sum='{self.gas_fee_sum}')>"
@@ -1,17 +1,28 @@
-from sqlalchemy import Integer, String, Text
+from datetime import datetime
+
+from sqlalchemy import Index, Integer, Text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from inspector.models.base import Base
+from inspector.models.partitions import PARTITION_BY, partition_by_block_range, updated_at_column
+from inspector.models.types import ZERO_ADDRESS, Address, Hash
 
 
 class Contract(Base):
     __tablename__ = 'contracts'
+    __table_args__ = (
+        # the resumes and the range queries of the inspectors filter on the creation block
+        Index("contracts_block_number_idx", "block_number"),
+        PARTITION_BY,
+    )
 
-    contract_address: Mapped[str] = mapped_column(String(100), primary_key=True, default="0x0")
+    contract_address: Mapped[str] = mapped_column(Address, primary_key=True, default=ZERO_ADDRESS)
     bytecode: Mapped[str] = mapped_column(Text, nullable=True)  # TODO: Can remove it later
-    from_address: Mapped[str] = mapped_column(String(100), nullable=False)
-    tx_hash: Mapped[str] = mapped_column(String(100), nullable=False)
-    block_number: Mapped[int] = mapped_column(Integer, nullable=False)
+    from_address: Mapped[str] = mapped_column(Address, nullable=False)
+    tx_hash: Mapped[str] = mapped_column(Hash, nullable=False)
+    # part of the primary key, as the table is partitioned by it
+    block_number: Mapped[int] = mapped_column(Integer, primary_key=True)
+    updated_at: Mapped[datetime] = updated_at_column()
 
     def __repr__(self):
         return f"<Contract(contract_address='{self.contract_address}', " \
@@ -19,3 +30,6 @@ class Contract(Base):
                f"from_address='{self.from_address}', " \
                f"tx_hash='{self.tx_hash}', " \
                f"block_number='{self.block_number}')>"
+
+
+partition_by_block_range(Contract.__table__)
@@ -1,17 +1,25 @@
-from sqlalchemy import Integer, String, Float
+from datetime import datetime
+
+from sqlalchemy import Integer, Numeric
 from sqlalchemy.orm import Mapped, mapped_column
 
 from inspector.models.base import Base
+from inspector.models.partitions import updated_at_column
+from inspector.models.types import ZERO_ADDRESS, Address, Hash
 
 
 class ContractInfo(Base):
     __tablename__ = 'contracts_info'
+    # not partitioned by block: the rows are looked up by address and updated in place, so a block key would move them
+    # between partitions whenever the largest transaction changes. No query filters on largest_tx_block_number,
+    # so it has no index either, which would only slow down these updates.
 
-    contract_address: Mapped[str] = mapped_column(String(100), primary_key=True, default="0x0")
-    eth_balance: Mapped[float] = mapped_column(Float, nullable=False)
-    largest_tx_hash: Mapped[str] = mapped_column(String(100), nullable=True)
+    contract_address: Mapped[str] = mapped_column(Address, primary_key=True, default=ZERO_ADDRESS)
+    eth_balance: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)  # wei
+    largest_tx_hash: Mapped[str] = mapped_column(Hash, nullable=True)
     largest_tx_block_number: Mapped[int] = mapped_column(Integer, nullable=True)
-    largest_tx_value: Mapped[float] = mapped_column(Float, nullable=True)
+    largest_tx_value: Mapped[int] = mapped_column(Numeric(78, 0), nullable=True)  # wei
+    updated_at: Mapped[datetime] = updated_at_column()
 
     def __repr__(self):
         return f"<ContractInfo(contract_address='{self.contract_address}', " \
@@ -1,22 +1,88 @@
-from typing import List, Dict, Type
+import functools
+from typing import Callable, List, Dict, Sequence, Type
 
-from sqlalchemy import orm, insert, update
+from sqlalchemy import orm, insert, update, values as values_clause, column, func, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
+from inspector.metrics import observe_db_write
+from inspector.models.balance_history.model import BalanceHistory
 from inspector.models.block.model import Block
+from inspector.models.block_rollup.model import BlockRollup, BlockSketch, MinerRollup
 from inspector.models.contract.model import Contract
 from inspector.models.contract_info.model import ContractInfo
+from inspector.models.token_balance.model import TokenBalance
+from inspector.models.token_progress.model import TokenProgress
 from inspector.models.verified_contract.model import VerifiedContract
 
 
+def rollback_on_error(operation: Callable) -> Callable:
+    """
+    Rolls the session back as soon as a write fails, before the error can reach an await. The inspectors of the
+    single process mode share one session, so the others never see it waiting for a rollback.
+    """
+
+    @functools.wraps(operation)
+    def wrapper(table, values, db_session: orm.Session, *args, **kwargs):
+        try:
+            return operation(table, values, db_session, *args, **kwargs)
+        except Exception:
+            db_session.rollback()
+            raise
+
+    return wrapper
+
+
+@observe_db_write
+@rollback_on_error
 def insert_data(
-        table: Type[Contract] | Type[ContractInfo] | Type[Block] | Type[VerifiedContract],
+        table: Type[Contract] | Type[ContractInfo] | Type[Block] | Type[VerifiedContract] | Type[TokenProgress],
         values: List[Dict],
         db_session: orm.Session,
+        commit: bool = True,
 ) -> None:
     db_session.execute(insert(table=table), values)
+    if commit:
+        db_session.commit()
+
+
+@observe_db_write
+@rollback_on_error
+def insert_new_data(
+        table: Type[BalanceHistory],
+        values: List[Dict],
+        db_session: orm.Session,
+) -> None:
+    """
+    Inserts the rows whose primary key is not in the table yet, so re-processed batches are harmless.
+    """
+    db_session.execute(pg_insert(table).on_conflict_do_nothing(), values)
     db_session.commit()
 
 
+@observe_db_write
+@rollback_on_error
+def upsert_data(
+        table: Type[VerifiedContract],
+        values: List[Dict],
+        db_session: orm.Session,
+        keys: List[str],
+) -> None:
+    """
+    Inserts the rows, replacing the existing rows with the same keys.
+    """
+    columns = table.__table__.c
+    statement = pg_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: statement.excluded[name] for name in values[0].keys() if name in columns and name not in keys},
+    )
+    db_session.execute(statement, values)
+    db_session.commit()
+
+
+@observe_db_write
+@rollback_on_error
 def update_data(
         table: Type[Contract] | Type[ContractInfo] | Type[Block],
         values: List[Dict],
@@ -24,3 +90,90 @@ def update_data(
 ) -> None:
     db_session.execute(update(table=table), values)
     db_session.commit()
+
+
+@observe_db_write
+@rollback_on_error
+def bulk_update_data(
+        table: Type[Contract] | Type[ContractInfo] | Type[Block],
+        values: List[Dict],
+        db_session: orm.Session,
+        key: str = "block_number",
+) -> None:
+    """
+    Updates many rows with a single set-based UPDATE ... FROM (VALUES ...) statement.
+    All rows must have the same keys, including the key column.
+    """
+    columns = table.__table__.c
+    names = list(values[0].keys())
+    new_values = values_clause(*[column(name, columns[name].type) for name in names], name="new_values") \
+        .data([tuple(row[name] for name in names) for row in values])
+    db_session.execute(
+        update(table.__table__)
+        .where(columns[key] == new_values.c[key])
+        .values({name: new_values.c[name] for name in names if name != key})
+    )
+    db_session.commit()
+
+
+@observe_db_write
+@rollback_on_error
+def accumulate_data(
+        table: Type[TokenBalance] | Type[BlockRollup] | Type[BlockSketch] | Type[MinerRollup],
+        values: List[Dict],
+        db_session: orm.Session,
+        keys: List[str],
+        greatest: Sequence[str] = ("block_number",),
+        least: Sequence[str] = (),
+        commit: bool = True,
+) -> None:
+    """
+    Inserts the rows, adding the values of the other columns to the existing row on key conflicts.
+    The greatest and least columns keep the greatest and the least value instead.
+    """
+    # SQLite (used by the benchmarks) has the same ON CONFLICT clause, but its greatest and least are max and min
+    sqlite = db_session.get_bind().dialect.name == "sqlite"
+    statement = (sqlite_insert if sqlite else pg_insert)(table)
+    columns = table.__table__.c
+
+    def accumulated(name: str):
+        if name in greatest:
+            return (func.max if sqlite else func.greatest)(columns[name], statement.excluded[name])
+        if name in least:
+            return (func.min if sqlite else func.least)(columns[name], statement.excluded[name])
+        return columns[name] + statement.excluded[name]
+
+    statement = statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: accumulated(name) for name in values[0].keys() if name not in keys},
+    )
+    db_session.execute(statement, values)
+    if commit:
+        db_session.commit()
+
+
+@observe_db_write
+@rollback_on_error
+def subtract_data(
+        table: Type[BlockRollup] | Type[BlockSketch] | Type[MinerRollup],
+        values: List[Dict],
+        db_session: orm.Session,
+        keys: List[str],
+        commit: bool = True,
+) -> None:
+    """
+    Subtracts the values of the other columns from the existing rows with the same keys, the reverse of
+    accumulate_data. All rows must have the same keys.
+    """
+    columns = table.__table__.c
+    names = [name for name in values[0].keys() if name not in keys]
+    # the parameters cannot be named after the columns of the updated table
+    statement = update(table.__table__) \
+        .where(*[columns[key] == bindparam(f"key_{key}") for key in keys]) \
+        .values({name: columns[name] - bindparam(f"value_{name}") for name in names})
+    db_session.execute(statement, [
+        {**{f"key_{key}": row[key] for key in keys}, **{f"value_{name}": row[name] for name in names}}
+        for row in values
+    ])
+    if commit:
+        db_session.commit()
@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, Table, event, text
+from sqlalchemy.orm import mapped_column
+
+# blocks per partition of the range-partitioned tables
+PARTITION_SIZE = 1_000_000
+# partitions are created up to this block, later blocks go to the default partition
+PARTITION_LIMIT = 30_000_000
+# table argument of the partitioned models
+PARTITION_BY = {"postgresql_partition_by": "RANGE (block_number)"}
+
+
+def partition_names(table_name: str):
+    for start in range(0, PARTITION_LIMIT, PARTITION_SIZE):
+        yield f"{table_name}_p{start // PARTITION_SIZE}", start, start + PARTITION_SIZE
+
+
+def create_partitions(table: Table, connection, **kw) -> None:
+    """
+    Creates the block range partitions of a table partitioned by block_number, and its default partition.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    for partition, start, end in partition_names(table.name):
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table.name} "
+                                f"FOR VALUES FROM ({start}) TO ({end})"))
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {table.name}_default PARTITION OF {table.name} DEFAULT"))
+
+
+def partition_by_block_range(table: Table) -> Table:
+    """
+    Creates the partitions of the table whenever the table is created. The table must be declared with
+    PARTITION_BY and have block_number in its primary key.
+    """
+    event.listen(table, "after_create", create_partitions)
+    return table
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def updated_at_column():
+    """
+    Time of the last insert or update of a row, from which the Parquet export finds the block ranges that changed.
+    Set on the client, so it is precise on SQLite too.
+    """
+    return mapped_column(DateTime(timezone=True), nullable=True, default=utc_now, onupdate=utc_now)
@@ -0,0 +1,25 @@
+from sqlalchemy import Integer, String, Numeric
+from sqlalchemy.orm import Mapped, mapped_column
+
+from inspector.models.base import Base
+
+
+class TokenBalance(Base):
+    __tablename__ = 'token_balances'
+
+    token_address: Mapped[str] = mapped_column(String(100), primary_key=True, default="0x0")
+    holder_address: Mapped[str] = mapped_column(String(100), primary_key=True, default="0x0")
+    balance: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)  # token base units
+    inflow: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+    outflow: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)
+    transfer_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    block_number: Mapped[int] = mapped_column(Integer, nullable=False)  # last block folded in
+
+    def __repr__(self):
+        return f"<TokenBalance(token_address='{self.token_address}', " \
+               f"holder_address='{self.holder_address}', " \
+               f"balance='{self.balance}', " \
+               f"inflow='{self.inflow}', " \
+               f"outflow='{self.outflow}', " \
+               f"transfer_count='{self.transfer_count}', " \
+               f"block_number='{self.block_number}')>"
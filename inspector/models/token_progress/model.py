@@ -0,0 +1,16 @@
+from sqlalchemy import Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from inspector.models.base import Base
+
+
+class TokenProgress(Base):
+    __tablename__ = 'token_progress'
+
+    # a block range whose transfers are folded into token_balances, committed with the fold
+    after_block: Mapped[int] = mapped_column(Integer, primary_key=True, default=0)
+    before_block: Mapped[int] = mapped_column(Integer, primary_key=True, default=0)  # excluded
+
+    def __repr__(self):
+        return f"<TokenProgress(after_block='{self.after_block}', " \
+               f"before_block='{self.before_block}')>"
@@ -0,0 +1,45 @@
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+
+ZERO_ADDRESS = "0x" + "00" * 20
+
+
+class FixedHex(TypeDecorator):
+    """
+    Stores a 0x-prefixed hex string in a fixed number of bytes (BYTEA on PostgreSQL).
+    The values are read back as lowercase 0x-prefixed hex strings, so the inspectors keep working with strings.
+    Values of another size raise a ValueError.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+    size = 0
+
+    def __init__(self):
+        super().__init__(length=self.size)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if not isinstance(value, bytes):
+            value = bytes.fromhex(value[2:] if value[:2] in ("0x", "0X") else value)
+        if len(value) != self.size:
+            # e.g. a hash bound to an address column
+            raise ValueError(f"{type(self).__name__} value must be {self.size} bytes, got {len(value)}: {value.hex()}")
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return "0x" + bytes(value).hex()
+
+
+class Address(FixedHex):
+    cache_ok = True
+    size = 20
+
+
+class Hash(FixedHex):
+    cache_ok = True
+    size = 32
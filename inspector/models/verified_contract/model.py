@@ -2,12 +2,14 @@ from sqlalchemy import String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from inspector.models.base import Base
+from inspector.models.types import ZERO_ADDRESS, Address
 
 
 class VerifiedContract(Base):
     __tablename__ = 'verified_contracts'
 
-    contract_address: Mapped[str] = mapped_column(String(100), primary_key=True, default="0x0")
+    # joined with the contracts on the address, so it has the same type
+    contract_address: Mapped[str] = mapped_column(Address, primary_key=True, default=ZERO_ADDRESS)
     verified: Mapped[bool] = mapped_column(String(100), nullable=False, default=False)
     contract_name: Mapped[str] = mapped_column(String(100), nullable=True)
     compiler_version: Mapped[str] = mapped_column(String(100), nullable=True)
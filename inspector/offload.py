@@ -0,0 +1,31 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Callable
+
+# process pool of the CPU-bound steps, only set when many inspectors share one event loop
+_offload_pool: Executor | None = None
+
+
+def set_offload_pool(executor: Executor | None) -> None:
+    global _offload_pool
+    _offload_pool = executor
+
+
+def shutdown_offload_pool() -> None:
+    if _offload_pool is not None:
+        _offload_pool.shutdown(cancel_futures=True)
+    set_offload_pool(None)
+
+
+def offload_enabled() -> bool:
+    return _offload_pool is not None
+
+
+async def offload(func: Callable, *args) -> Any:
+    """
+    Runs a CPU-bound function in the offload pool, or inline when there is none.
+    The function and its arguments must be picklable, i.e. module-level functions and plain data.
+    """
+    if _offload_pool is None:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(_offload_pool, func, *args)
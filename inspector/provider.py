@@ -1,11 +1,18 @@
 from web3 import AsyncHTTPProvider, Web3
 
+from inspector.cache import BlockCache, construct_cache_middleware
+from inspector.metrics import construct_metrics_middleware
 from inspector.retry import http_retry_with_backoff_request_middleware
 
 
-def get_base_provider(rpc: str, request_timeout: int = 500) -> Web3.AsyncHTTPProvider:
+def get_base_provider(rpc: str, request_timeout: int = 500, cache: BlockCache = None) -> Web3.AsyncHTTPProvider:
     base_provider = AsyncHTTPProvider(rpc, request_kwargs={"timeout": request_timeout})
     middlewares_list = list(base_provider.middlewares)
+    if cache is not None:
+        # outside the retry middleware, so cache hits never wait on retries
+        middlewares_list.append(construct_cache_middleware(cache))
     middlewares_list.append(http_retry_with_backoff_request_middleware)
+    # innermost, so every attempt sent to the node is measured
+    middlewares_list.append(construct_metrics_middleware(rpc))
     base_provider.middlewares = tuple(middlewares_list)
     return base_provider
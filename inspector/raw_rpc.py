@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import aiohttp
+from web3 import Web3
+
+from inspector.cache import BlockCache
+from inspector.metrics import metrics, observe_rpc
+from inspector.offload import offload, offload_enabled
+from inspector.retry import retry_exceptions
+from inspector.utils import json_loads, json_dumps
+from utils.profiling import span
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+# calls per JSON-RPC batch, nodes commonly cap batches at 100 (e.g. Erigon's --rpc.batch.limit)
+RPC_BATCH_SIZE = 100
+# node errors that mean a block range query has to be split, e.g. geth's "query returned more than 10000 results",
+# Alchemy's "Log response size exceeded" or "exceed maximum block range". Generic words such as "limit" or "exceeded"
+# would also match the rate limit errors, which a smaller range does not fix
+RANGE_LIMIT_HINTS = ("query returned more than", "block range", "too many results", "response size exceeded",
+                     "range is too large", "range too large", "query timeout exceeded")
+
+logger = logging.getLogger(__name__)
+
+
+class RPCError(RuntimeError):
+    pass
+
+
+class RawTransaction(NamedTuple):
+    hash: str
+    from_address: str
+    to_address: Optional[str]  # None for contract creations
+    value: int  # wei
+
+
+class RawBlock(NamedTuple):
+    number: int
+    hash: str
+    parent_hash: str
+    miner: str
+    gas_used: int
+    gas_limit: int
+    base_fee_per_gas: Optional[int]  # None before London
+    transactions: List[RawTransaction]
+
+
+def decode_block(result: Dict) -> RawBlock:
+    """
+    Decodes an eth_getBlockByNumber JSON result (with full transactions) into a compact record.
+    Only the fields used by the inspectors are kept. Addresses are lowercase hex as returned by the node.
+    :param result: The raw JSON-RPC result
+    :return: The compact block record
+    """
+    if result is None:
+        raise RPCError("Block not found")
+    base_fee_per_gas = result.get("baseFeePerGas")
+    return RawBlock(
+        number=int(result["number"], 16),
+        hash=result["hash"],
+        parent_hash=result["parentHash"],
+        miner=result["miner"],
+        gas_used=int(result["gasUsed"], 16),
+        gas_limit=int(result["gasLimit"], 16),
+        base_fee_per_gas=int(base_fee_per_gas, 16) if base_fee_per_gas is not None else None,
+        transactions=[
+            RawTransaction(tx["hash"], tx["from"], tx["to"], int(tx["value"], 16))
+            for tx in result["transactions"]
+        ],
+    )
+
+
+def decode_block_response(payload: bytes) -> RawBlock:
+    """
+    Parses and decodes an eth_getBlockByNumber response body, so that only the compact record
+    has to be sent back when it runs in the offload pool.
+    """
+    response = json_loads(payload)
+    if "error" in response:
+        raise RPCError(f"eth_getBlockByNumber failed: {response['error']}")
+    return decode_block(response["result"])
+
+
+def block_from_web3(block) -> RawBlock:
+    """
+    Converts a block formatted by web3 into the same compact record as decode_block.
+    :param block: The web3 block (AttributeDict) with full transactions
+    :return: The compact block record
+    """
+    return RawBlock(
+        number=block["number"],
+        hash=block["hash"].hex(),
+        parent_hash=block["parentHash"].hex(),
+        miner=block["miner"].lower(),
+        gas_used=block["gasUsed"],
+        gas_limit=block["gasLimit"],
+        base_fee_per_gas=block.get("baseFeePerGas"),
+        transactions=[
+            RawTransaction(
+                tx["hash"].hex(),
+                tx["from"].lower(),
+                tx["to"].lower() if tx["to"] is not None else None,
+                tx["value"],
+            )
+            for tx in block["transactions"]
+        ],
+    )
+
+
+class RawRPCClient:
+    """
+    Minimal JSON-RPC client that skips web3's request and result formatters.
+    Responses are decoded with orjson (if installed) and returned as plain python objects.
+    """
+
+    def __init__(
+            self,
+            rpc_endpoint: str,
+            request_timeout: int = 300,
+            retries: int = 5,
+            backoff_time_seconds: float = 0.1,
+            cache: BlockCache = None,
+    ):
+        self.rpc_endpoint = rpc_endpoint
+        self.cache = cache
+        self.timeout = aiohttp.ClientTimeout(total=request_timeout)
+        self.retries = retries
+        self.backoff_time_seconds = backoff_time_seconds
+        self._session: aiohttp.ClientSession | None = None
+        self._request_id = 0
+
+    def _next_id(self) -> int:
+        self._request_id += 1
+        return self._request_id
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # the session must be created inside the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        return self._session
+
+    async def _post(self, payload: bytes, method: str, decode: bool = True) -> Any:
+        session = await self._get_session()
+        for i in range(self.retries):
+            start = time.perf_counter()
+            try:
+                with span("rpc_request"):
+                    async with session.post(self.rpc_endpoint, data=payload, headers=JSON_HEADERS) as response:
+                        response.raise_for_status()
+                        body = await response.read()
+                    observe_rpc(self.rpc_endpoint, method, time.perf_counter() - start)
+                    return json_loads(body) if decode else body
+            except retry_exceptions:
+                observe_rpc(self.rpc_endpoint, method, time.perf_counter() - start, error=True)
+                logger.error(f"Raw request to {self.rpc_endpoint} failed, retrying: {i}/{self.retries}")
+                if i < (self.retries - 1):
+                    metrics.inc("tlsc_rpc_retries_total", endpoint=self.rpc_endpoint, method=method)
+                    await asyncio.sleep(self.backoff_time_seconds * (random.uniform(5, 10) ** i))
+                    continue
+                raise
+
+    async def request(self, method: str, params: List) -> Any:
+        if self.cache is not None:
+            result = self.cache.get_result(method, params)
+            if result is not None:
+                return result
+
+        response = await self._post(json_dumps({
+            "jsonrpc": "2.0",
+            "id": self._next_id(),
+            "method": method,
+            "params": params,
+        }), method)
+        if "error" in response:
+            metrics.inc("tlsc_rpc_errors_total", endpoint=self.rpc_endpoint, method=method)
+            raise RPCError(f"{method} failed: {response['error']}")
+
+        if self.cache is not None:
+            self.cache.put_result(method, params, response["result"])
+        return response["result"]
+
+    async def request_batch(self, calls: List[Tuple[str, List]]) -> List[Any]:
+        """
+        Sends several calls in one JSON-RPC batch.
+        :param calls: List of (method, params)
+        :return: The results in the same order as the calls
+        """
+        results: List[Any] = [None] * len(calls)
+        missing = list(range(len(calls)))
+        if self.cache is not None:
+            for i, (method, params) in enumerate(calls):
+                results[i] = self.cache.get_result(method, params)
+            missing = [i for i in missing if results[i] is None]
+        if not missing:
+            return results
+
+        first_id = self._request_id + 1
+        payload = [
+            {"jsonrpc": "2.0", "id": self._next_id(), "method": calls[i][0], "params": calls[i][1]}
+            for i in missing
+        ]
+        responses = await self._post(json_dumps(payload), "batch")
+        if isinstance(responses, dict):  # some nodes answer a failed batch with a single error object
+            raise RPCError(f"Batch request failed: {responses.get('error')}")
+
+        for response in responses:
+            if "error" in response:
+                raise RPCError(f"Batch request failed: {response['error']}")
+            i = missing[response["id"] - first_id]
+            results[i] = response["result"]
+            if self.cache is not None:
+                self.cache.put_result(calls[i][0], calls[i][1], results[i])
+        return results
+
+    async def get_block(self, block_number: int) -> RawBlock:
+        params = [hex(block_number), True]
+        if self.cache is None and offload_enabled():
+            payload = await self._post(json_dumps({
+                "jsonrpc": "2.0",
+                "id": self._next_id(),
+                "method": "eth_getBlockByNumber",
+                "params": params,
+            }), "eth_getBlockByNumber", decode=False)
+            return await offload(decode_block_response, payload)
+        return decode_block(await self.request("eth_getBlockByNumber", params))
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+async def fetch_block(w3: Web3, block_number: int, raw_client: RawRPCClient | None = None) -> RawBlock:
+    """
+    Fetches a block with its transactions as a compact record.
+    Uses the raw client when given, otherwise goes through web3.
+    """
+    # includes web3's formatters, unlike the rpc_request span
+    with span("fetch_block"):
+        if raw_client is not None:
+            return await raw_client.get_block(block_number)
+        return block_from_web3(await w3.eth.get_block(block_number, full_transactions=True))
+
+
+async def request_many(w3: Web3, calls: List[Tuple[str, List]], raw_client: RawRPCClient | None = None) -> List[Any]:
+    """
+    Sends many calls and returns their unformatted JSON results in order.
+    Uses JSON-RPC batches with the raw client, otherwise concurrent requests through the web3 provider.
+    Either way at most RPC_BATCH_SIZE calls are in flight.
+    """
+    results: List[Any] = []
+    for i in range(0, len(calls), RPC_BATCH_SIZE):
+        chunk = calls[i:i + RPC_BATCH_SIZE]
+        if raw_client is not None:
+            results.extend(await raw_client.request_batch(chunk))
+        else:
+            results.extend(await asyncio.gather(*[w3.manager.coro_request(method, params) for method, params in chunk]))
+    return results
+
+
+def is_range_limit_error(error: Exception) -> bool:
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    message = str(error).lower()
+    return any(hint in message for hint in RANGE_LIMIT_HINTS)
+
+
+async def request_block_range(
+        w3: Web3,
+        method: str,
+        build_filter: Callable[[int, int], Dict],
+        from_block: int,
+        to_block: int,
+        raw_client: RawRPCClient | None = None,
+) -> List[Any]:
+    """
+    Sends a block range query (e.g. eth_getLogs, trace_filter) over [from_block, to_block],
+    halving the range whenever the node refuses it for returning too many results.
+    :param build_filter: Builds the filter object of a (from_block, to_block) range
+    :return: The concatenated unformatted results in block order
+    """
+    try:
+        result, = await request_many(w3, [(method, [build_filter(from_block, to_block)])], raw_client)
+        return result
+    except (RPCError, ValueError, asyncio.TimeoutError) as e:
+        if from_block == to_block or not is_range_limit_error(e):
+            raise
+    middle = (from_block + to_block) // 2
+    return (await request_block_range(w3, method, build_filter, from_block, middle, raw_client)
+            + await request_block_range(w3, method, build_filter, middle + 1, to_block, raw_client))
@@ -16,6 +16,8 @@ from web3 import Web3
 from web3.middleware.exception_retry_request import DEFAULT_ALLOWLIST
 from web3.types import RPCEndpoint, RPCResponse
 
+from inspector.metrics import metrics
+
 request_exceptions = (ConnectionError, HTTPError, Timeout, TooManyRedirects)
 aiohttp_exceptions = (
     ClientOSError,
@@ -24,6 +26,7 @@ aiohttp_exceptions = (
     ServerDisconnectedError,
     ServerTimeoutError,
 )
+retry_exceptions = request_exceptions + aiohttp_exceptions + (TimeoutError, ConnectionRefusedError)
 
 logger = logging.getLogger(__name__)
 
@@ -40,7 +43,7 @@ def check_if_retry_on_failure(method: RPCEndpoint) -> bool:
 
 async def exception_retry_with_backoff_middleware(
         make_request: Callable[[RPCEndpoint, Any], Any],
-        web3: Web3,  # pylint: disable=unused-argument
+        web3: Web3,
         errors: Collection[Type[BaseException]],
         retries: int = 5,
         backoff_time_seconds: float = 0.1,
@@ -62,6 +65,7 @@ async def exception_retry_with_backoff_middleware(
                         f"Request for method {method}, params: {params}, retrying: {i}/{retries}"
                     )
                     if i < (retries - 1):
+                        metrics.inc("tlsc_rpc_retries_total", endpoint=web3.provider.endpoint_uri, method=method)
                         backoff_time = backoff_time_seconds * (
                                 random.uniform(5, 10) ** i
                         )
@@ -82,9 +86,5 @@ async def http_retry_with_backoff_request_middleware(
     return await exception_retry_with_backoff_middleware(
         make_request,
         web3,
-        (
-                request_exceptions
-                + aiohttp_exceptions
-                + (TimeoutError, ConnectionRefusedError)
-        ),
+        retry_exceptions,
     )
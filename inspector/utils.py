@@ -1,7 +1,16 @@
 import configparser
 import logging
-from logging.handlers import RotatingFileHandler
+import multiprocessing
+import multiprocessing.queues
+import time
+from logging.handlers import QueueHandler, RotatingFileHandler
 from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import orjson
+
+json_loads = orjson.loads
+json_dumps = orjson.dumps
 
 
 def get_log_handler(log_path: Path, formatter: logging.Formatter, rotate: bool = False) -> logging.Handler:
@@ -25,22 +34,165 @@ def clean_up_log_handlers(logger: logging.Logger):
         handler.close()
 
 
-def configure_logger(host: str) -> logging.Logger:
+# names of the per-host loggers, the listener writes each of them to its own file
+HOST_LOGGER_PREFIX = f"{__name__}."
+LOG_FORMAT = '%(asctime)s %(levelname)s:%(message)s'
+
+_log_queue: multiprocessing.queues.Queue | None = None
+_log_listener: multiprocessing.Process | None = None
+# replaces the logs_path of config.ini, e.g. to keep the logs of a benchmark out of the repo
+_logs_path: Path | None = None
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most rate debug records per second for each message template of a logger,
+    so per-block and per-contract debug lines cannot flood the log queue. Other levels always pass.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        # (logger, template) -> (tokens, last refill)
+        self.buckets: Dict[Tuple[str, Any], Tuple[float, float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        tokens, last = self.buckets.get(key, (self.rate, now))
+        tokens = min(self.rate, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return False
+        self.buckets[key] = (tokens - 1, now)
+        return True
+
+
+def _log_config() -> configparser.SectionProxy:
     config = configparser.ConfigParser()
     config.read('config.ini')
+    if _logs_path is not None:
+        config['logs']['logs_path'] = str(_logs_path)
+    return config['logs']
 
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s %(levelname)s:%(message)s')
 
+def set_logs_path(logs_path: Path) -> None:
+    """
+    Writes the logs of this process and of the processes forked from it under logs_path instead of the configured
+    path.
+    """
+    global _logs_path
+    _logs_path = logs_path
+    log_config = _log_config()
+    (Path(log_config['logs_path']) / log_config['inspectors_log_path']).mkdir(parents=True, exist_ok=True)
+
+
+def _listen(queue: multiprocessing.queues.Queue, level: int) -> None:
+    """
+    Owns the console and the log files: writes the records of all processes until it receives None.
+    """
+    log_config = _log_config()
+    formatter = logging.Formatter(LOG_FORMAT)
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
+    inspectors_handler = get_log_handler(Path(log_config['logs_path']) / "inspectors.log", formatter)
+    inspectors_handler.setLevel(level)
+    host_handlers: Dict[str, logging.Handler] = {}
+
+    while True:
+        try:
+            record = queue.get()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if record is None:
+            break
+        if record.name.startswith(HOST_LOGGER_PREFIX):
+            host = record.name[len(HOST_LOGGER_PREFIX):]
+            file_handler = host_handlers.get(host)
+            if file_handler is None:
+                file_handler = host_handlers[host] = get_log_handler(
+                    Path(log_config['logs_path']) / log_config['inspectors_log_path'] / f"inspector_{host}.log",
+                    formatter, rotate=True)
+                file_handler.setLevel(level)
+        else:
+            file_handler = inspectors_handler
+        for handler in (console_handler, file_handler):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    for handler in (console_handler, inspectors_handler, *host_handlers.values()):
+        handler.close()
+
+
+def get_log_level() -> int:
+    return logging.getLevelName(_log_config().get('log_level', 'INFO').upper())
+
+
+def start_log_listener() -> None:
+    """
+    Starts the process that writes the logs of this process and of the processes forked from it.
+    They only enqueue their records through a QueueHandler on the root logger, so logging does no file I/O
+    in the workers.
+    """
+    global _log_queue, _log_listener
+    if _log_listener is not None:
+        return
+    _log_queue = multiprocessing.Queue()
+    _log_listener = multiprocessing.Process(target=_listen, args=(_log_queue, get_log_level()), daemon=True,
+                                            name="log_listener")
+    _log_listener.start()
+    logging.getLogger().addHandler(QueueHandler(_log_queue))
+
+
+def stop_log_listener() -> None:
+    """
+    Flushes the queued records and stops the listener.
+    """
+    global _log_queue, _log_listener
+    if _log_listener is None:
+        return
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, QueueHandler) and handler.queue is _log_queue:
+            root.removeHandler(handler)
+    _log_queue.put(None)
+    _log_listener.join()
+    _log_queue.close()
+    _log_queue, _log_listener = None, None
+
+
+def configure_logger(host: str) -> logging.Logger:
+    """
+    Returns the logger of an inspector. When the log listener runs, the records propagate to its queue,
+    otherwise the console and file handlers are attached once per logger.
+    """
+    log_config = _log_config()
+
+    # one logger per host, as the inspectors may share a process
+    logger = logging.getLogger(f"{HOST_LOGGER_PREFIX}{host}")
+    logger.setLevel(get_log_level())
+    if not any(isinstance(log_filter, RateLimitFilter) for log_filter in logger.filters):
+        logger.addFilter(RateLimitFilter(float(log_config.get('debug_rate', '10'))))
+    if _log_queue is not None:
+        logger.propagate = True
+        return logger
 
-    logger.addHandler(console_handler)
+    formatter = logging.Formatter(LOG_FORMAT)
+    if not any(type(handler) is logging.StreamHandler for handler in logger.handlers):
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(formatter)
+        logger.addHandler(console_handler)
 
-    logs_path = Path(config['logs']['logs_path']) / config['logs']['inspectors_log_path'] / f"inspector_{host}.log"
-    log_file_handler = get_log_handler(logs_path, formatter, rotate=True)
-    logger.addHandler(log_file_handler)
+    if not any(isinstance(handler, logging.FileHandler) for handler in logger.handlers):
+        logs_path = Path(log_config['logs_path']) / log_config['inspectors_log_path'] / f"inspector_{host}.log"
+        file_handler = get_log_handler(logs_path, formatter, rotate=True)
+        file_handler.setLevel(logger.level)
+        logger.addHandler(file_handler)
+    # the root logger would write the records again
+    logger.propagate = False
 
     return logger
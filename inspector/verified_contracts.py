@@ -1,78 +1,110 @@
+import asyncio
 import logging
 from typing import Tuple, List, Dict
 
-import requests
-from sqlalchemy import orm, select
+from sqlalchemy import orm, select, exists, cast, Boolean
 
-from inspector.models.crud import insert_data
+from inspector.etherscan import EtherscanCache, EtherscanClient
+from inspector.models.crud import upsert_data
 from inspector.models.verified_contract.model import VerifiedContract
 from inspector.models.contract_info.model import ContractInfo
 from inspector.models.contract.model import Contract
 
+# contracts per database write
+VERIFIED_CONTRACTS_BATCH_SIZE = 1000
+
 
 def setup_logger():
+    """
+    The records propagate to the log listener started by the controller, which owns the console.
+    """
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
+    return logger
 
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-
-    formatter = logging.Formatter('%(asctime)s %(levelname)s:%(message)s')
-    console_handler.setFormatter(formatter)
-
-    logger.addHandler(console_handler)
 
-    return logger
+def get_verified_contract_row(contract_address: str, source_code: Dict) -> Dict:
+    return {
+        "contract_address": contract_address,
+        "verified": source_code['SourceCode'] != '',
+        "contract_name": source_code['ContractName'],
+        "compiler_version": source_code['CompilerVersion'],
+        'evm_version': source_code['EVMVersion'],
+        'proxy': source_code['Proxy'],
+        'source_code': source_code['SourceCode']
+    }
 
 
-def fetch_verified_contracts(contract_addresses: List[str],
-                             etherscan_api_key: str,
-                             logger: logging.Logger
-                             ) -> List[Dict]:
+async def fetch_verified_contracts(contract_addresses: List[str],
+                                   etherscan_client: EtherscanClient,
+                                   logger: logging.Logger,
+                                   ) -> List[Dict]:
     """
-    Fetches verified contracts from Etherscan API and stores them in the database
+    Fetches verified contracts from Etherscan API concurrently, as fast as the client's key pool allows.
+    A contract whose request fails is logged and skipped, it is fetched again on the next run
     :param contract_addresses:   list of contract addresses
-    :param etherscan_api_key:   Etherscan API key
-    :param logger:   logger
+    :param etherscan_client:   Etherscan client
+    :param logger:  logger
     :return: list of verified contracts
     """
-    # https://docs.etherscan.io/api-endpoints/contracts#get-contract-source-code-for-verified-contract-source-codes
-    etherscan_contract_url = (
-        f"https://api.etherscan.io/api?module=contract&action=getsourcecode&address={{}}&apikey={etherscan_api_key}")
-
-    all_verified_contracts = []
-    batch_size = 20
-    i = 0
-    for contract_address in contract_addresses:
-        etherscan_response = requests.get(etherscan_contract_url.format(contract_address)).json()
-        verified = etherscan_response['result'][0]['SourceCode'] != ''
-        all_verified_contracts.append(
-            {
-                "contract_address": contract_address,
-                "verified": verified,
-                "contract_name": etherscan_response['result'][0]['ContractName'],
-                "compiler_version": etherscan_response['result'][0]['CompilerVersion'],
-                'evm_version': etherscan_response['result'][0]['EVMVersion'],
-                'proxy': etherscan_response['result'][0]['Proxy'],
-                'source_code': etherscan_response['result'][0]['SourceCode']
-            }
-        )
-        i += 1
-        if i % batch_size == 0:
-            logger.info(f"Verified {i} contracts")
-
-    return all_verified_contracts
+    source_codes = await asyncio.gather(*[
+        etherscan_client.get_source_code(contract_address) for contract_address in contract_addresses
+    ], return_exceptions=True)
+    verified_contracts = []
+    for contract_address, source_code in zip(contract_addresses, source_codes):
+        if isinstance(source_code, asyncio.CancelledError):
+            raise source_code
+        if isinstance(source_code, Exception):
+            logger.error(f"Failed to fetch the source code of {contract_address}: {source_code!r}")
+            continue
+        verified_contracts.append(get_verified_contract_row(contract_address, source_code))
+    return verified_contracts
+
+
+async def fetch_many_verified_contracts(inspect_db_session: orm.Session,
+                                        contract_addresses: List[str],
+                                        etherscan_api_keys: List[str],
+                                        logger: logging.Logger,
+                                        etherscan_cache: EtherscanCache = None,
+                                        batch_size: int = VERIFIED_CONTRACTS_BATCH_SIZE,
+                                        ):
+    """
+    Fetches verified contracts in batches and stores each batch in the database
+    :param inspect_db_session:  database session
+    :param contract_addresses:  list of contract addresses
+    :param etherscan_api_keys:  Etherscan API keys, all of them are used
+    :param logger:  logger
+    :param etherscan_cache:  cache of the Etherscan results, consulted before any request
+    :param batch_size:  number of contracts per database write
+    :return:  None
+    """
+    etherscan_client = EtherscanClient(etherscan_api_keys, cache=etherscan_cache)
+    try:
+        for i in range(0, len(contract_addresses), batch_size):
+            batch_addresses = contract_addresses[i:i + batch_size]
+            all_verified_contracts = await fetch_verified_contracts(batch_addresses, etherscan_client, logger)
+            if all_verified_contracts:
+                logger.debug("Writing to DB")
+                # contracts that were not verified on a previous run are re-checked and replaced
+                upsert_data(VerifiedContract, all_verified_contracts, inspect_db_session, keys=["contract_address"])
+                logger.debug("Writing done")
+            logger.info(f"Verified {i + len(batch_addresses)} contracts, "
+                        f"{len(batch_addresses) - len(all_verified_contracts)} failed in the last batch")
+    finally:
+        await etherscan_client.close()
 
 
 def inspect_verified_contracts(inspect_db_session: orm.Session,
                                task_batch: Tuple[int, int],
-                               etherscan_api_key: str
+                               etherscan_api_keys: List[str],
+                               etherscan_cache: EtherscanCache = None
                                ):
     """
     Fetches verified contracts from Etherscan API and stores them in the database
     :param inspect_db_session:  database session
     :param task_batch:  tuple of (start_block, end_block)
-    :param etherscan_api_key:  Etherscan API key
+    :param etherscan_api_keys:  Etherscan API keys, all of them are used
+    :param etherscan_cache:  cache of the Etherscan results
     :return:  None
     """
 
@@ -80,24 +112,17 @@ def inspect_verified_contracts(inspect_db_session: orm.Session,
     logger.info(f"Starting up verified contract inspector for blocks {task_batch[0]} to {task_batch[1]}")
 
     # get contract addresses from the database that were created in the given block range,
-    # are in ContractsInfo db i.e., have non-zero balance, and are not in VerifiedContracts db
+    # are in ContractsInfo db i.e., have non-zero balance, and are not already verified in VerifiedContracts db
     vc_query_response = inspect_db_session.execute(
         select(Contract.contract_address).
         join(ContractInfo, Contract.contract_address == ContractInfo.contract_address).
-        where((task_batch[0] <= Contract.block_number) & (Contract.block_number <= task_batch[1]))
-        #todo: where(~Contract.contract_address.in_(
-        #     inspect_db_session.query(VerifiedContract.contract_address).all()
-        # ))
+        where((task_batch[0] <= Contract.block_number) & (Contract.block_number <= task_batch[1])).
+        where(~exists().where((VerifiedContract.contract_address == Contract.contract_address) &
+                              cast(VerifiedContract.verified, Boolean)))
     ).all()
     contract_addresses = [contract_address for contract_address, in vc_query_response]
 
-    all_verified_contracts = []
-    try:
-        all_verified_contracts = fetch_verified_contracts(contract_addresses, etherscan_api_key, logger)
-    finally:
-        if all_verified_contracts:
-            logger.debug("Writing to DB")
-            insert_data(VerifiedContract, all_verified_contracts, inspect_db_session)
-            logger.debug("Writing done")
+    asyncio.run(fetch_many_verified_contracts(inspect_db_session, contract_addresses, etherscan_api_keys, logger,
+                                              etherscan_cache))
 
     logger.info(f"Finished verified contract inspector for blocks {task_batch[0]} to {task_batch[1]}")
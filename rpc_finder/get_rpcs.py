@@ -38,7 +38,7 @@ def get_number_of_records():
     return json.loads(r.text)['recordsTotal']
 
 
-if __name__ == "__main__":
+def get_synced_hosts():
     total_records = get_number_of_records()
 
     hosts_list = []
@@ -52,7 +52,12 @@ if __name__ == "__main__":
     hosts_df = pd.DataFrame(hosts_list, columns=["id", "host", "port", "client", "clientVersion", "os",
                                                  "lastUpdate", "country", "inSync", "isp"])
     hosts_df.drop(hosts_df[hosts_df['inSync'] == 0].index, inplace=True)
+    return hosts_df['host'].tolist()
+
+
+if __name__ == "__main__":
+    hosts = get_synced_hosts()
 
     with open(f"{client}_hosts.csv", "w", encoding="utf-8") as f:
-        for host in hosts_df['host']:
+        for host in hosts:
             f.write(host + '\n')
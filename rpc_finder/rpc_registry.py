@@ -0,0 +1,145 @@
+import asyncio
+import configparser
+import logging
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from rpc_finder.get_rpcs import get_synced_hosts
+from rpc_finder.rpc_vitals_check import CAPABILITIES, check_hosts, reference_head_block, set_head_lag, sort_hosts
+
+logger = logging.getLogger(__name__)
+
+# seconds between two fetches of the candidate hosts from Ethernodes
+CANDIDATES_REFRESH_INTERVAL = 6 * 3600
+# seconds between two probing rounds
+PROBE_INTERVAL = 60
+# seconds after which a probed host is stale and probed again
+STALE_AFTER = 10 * 60
+# unresponsive hosts are probed again less often
+UNRESPONSIVE_STALE_AFTER = 60 * 60
+# stale hosts probed per round, the most stale first
+MAX_PROBES_PER_ROUND = 2000
+BLOCK_TIME = 12  # seconds
+# responsive hosts a round needs for its head estimate to replace the carried forward one
+MIN_REFERENCE_HOSTS = 20
+# blocks by which a smaller round may raise the carried forward estimate
+MAX_HEAD_RAISE = 5
+
+
+def write_atomically(path: Path, hosts: pd.DataFrame, **to_csv_kwargs) -> None:
+    # readers never see a half written file
+    tmp_path = path.with_name(path.name + ".tmp")
+    hosts.to_csv(tmp_path, index=False, **to_csv_kwargs)
+    os.replace(tmp_path, path)
+
+
+class EndpointRegistryService:
+    """
+    Keeps the ranked RPC endpoints fresh during long runs.
+    Candidates are refreshed periodically, only stale hosts are probed again, and after each round
+    the ranked endpoints are published to the files that the inspectors hot-reload.
+    The registry state is kept in a CSV file so that restarts do not probe every host again.
+    """
+
+    def __init__(self, capabilities_path: Path, sorted_hosts_path: Path, state_path: Path):
+        self.capabilities_path = capabilities_path
+        self.sorted_hosts_path = sorted_hosts_path
+        self.state_path = state_path
+        if state_path.exists():
+            self.hosts = pd.read_csv(state_path).set_index("ip_address", drop=False)
+        else:
+            self.hosts = pd.DataFrame(columns=["ip_address", "checked_at"]).set_index("ip_address", drop=False)
+        self.candidates_refreshed_at = 0.0
+        self.reference_head = 0
+        self.reference_time = 0.0
+
+    def add_candidates(self, ip_addresses) -> None:
+        new_ip_addresses = [ip_address for ip_address in ip_addresses if ip_address not in self.hosts.index]
+        if new_ip_addresses:
+            logger.info(f"Adding {len(new_ip_addresses)} new candidates")
+            new_hosts = pd.DataFrame({"ip_address": new_ip_addresses, "checked_at": 0.0})
+            new_hosts = new_hosts.set_index("ip_address", drop=False)
+            self.hosts = pd.concat([self.hosts, new_hosts]) if not self.hosts.empty else new_hosts
+
+    def stale_hosts(self, now: float) -> list:
+        if self.hosts.empty:
+            return []
+        responsive = self.hosts.get("responsive", pd.Series(False, index=self.hosts.index)).fillna(False)
+        stale_after = np.where(responsive.astype(bool), STALE_AFTER, UNRESPONSIVE_STALE_AFTER)
+        stale = self.hosts[now - self.hosts["checked_at"].astype(float) > stale_after]
+        return stale.sort_values(by="checked_at")["ip_address"].tolist()[:MAX_PROBES_PER_ROUND]
+
+    def update_reference_head(self, probed: pd.DataFrame, now: float) -> int:
+        """
+        Estimates the chain head. Rounds may probe only a few hosts, so the previous estimate is carried forward
+        at one block per BLOCK_TIME. A round of enough responsive hosts replaces it, a smaller round can only
+        raise it by a few blocks, so that one host reporting a bogus head does not mark every other host as lagging.
+        """
+        probed_head = reference_head_block(probed)
+        if not self.reference_head or probed["responsive"].sum() >= MIN_REFERENCE_HOSTS:
+            self.reference_head = probed_head or self.reference_head
+        else:
+            expected_head = self.reference_head + int((now - self.reference_time) / BLOCK_TIME)
+            self.reference_head = max(expected_head, min(probed_head, expected_head + MAX_HEAD_RAISE))
+        self.reference_time = now
+        return self.reference_head
+
+    async def probe_round(self) -> None:
+        now = time.time()
+        if now - self.candidates_refreshed_at > CANDIDATES_REFRESH_INTERVAL:
+            try:
+                self.add_candidates(await asyncio.to_thread(get_synced_hosts))
+                self.candidates_refreshed_at = now
+            except Exception as e:
+                logger.error(f"Failed to refresh the candidates: {type(e)} {e}")
+
+        stale_ip_addresses = self.stale_hosts(now)
+        if not stale_ip_addresses:
+            return
+        logger.info(f"Probing {len(stale_ip_addresses)} stale hosts")
+        probed = await check_hosts(stale_ip_addresses)
+        probed = set_head_lag(probed, self.update_reference_head(probed, now))
+        probed["checked_at"] = now
+
+        probed = probed.set_index("ip_address", drop=False)
+        self.hosts = pd.concat([self.hosts.drop(index=probed.index), probed])
+        self.publish()
+
+    def publish(self) -> None:
+        self.hosts.to_csv(self.state_path, index=False)
+        for capability in CAPABILITIES:
+            self.hosts[capability] = self.hosts[capability].fillna(False).astype(bool)
+        self.hosts["responsive"] = self.hosts["responsive"].fillna(False).astype(bool)
+        self.hosts["synced"] = self.hosts["synced"].fillna(False).astype(bool)
+        ranked = sort_hosts(self.hosts)
+        write_atomically(self.capabilities_path, ranked)
+        write_atomically(self.sorted_hosts_path, ranked[ranked["synced"]][["ip_address"]], header=False)
+        logger.info(f"Published {int(ranked['synced'].sum())} synced endpoints")
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.probe_round()
+            except Exception as e:
+                logger.error(f"Probing round failed: {type(e)} {e}")
+            await asyncio.sleep(PROBE_INTERVAL)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+    logging.getLogger("rpc_finder.rpc_vitals_check").setLevel(logging.WARNING)
+
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    capabilities_path = Path(config['paths']['rpc_capabilities_path'])
+
+    service = EndpointRegistryService(
+        capabilities_path=capabilities_path,
+        sorted_hosts_path=Path(config['paths']['rpc_hosts_ip_path']),
+        state_path=capabilities_path.with_name("registry_state.csv"),
+    )
+    asyncio.run(service.run())
@@ -1,89 +1,171 @@
+import asyncio
 import logging
 import sys
-from multiprocessing import Pool
+import time
+from typing import Any, Dict, List, Tuple
 
+import aiohttp
+import numpy as np
 import pandas as pd
-import requests
-from requests.exceptions import (
-    ConnectionError,
-    ConnectTimeout,
-    ReadTimeout
-)
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 logger = logging.getLogger(__name__)
 PING_CNT = 10
-SESSION = requests.Session()
+REQUEST_TIMEOUT = 2  # seconds, to connect and between two reads of a request
+# hosts checked at once, each of them opens up to one connection per capability check
+MAX_HOSTS = 128
+RPC_PORT = 8545
+# historical block used by the capability checks
+PROBE_BLOCK = 15500000
+# hosts further behind the head than this are not synced
+MAX_HEAD_LAG = 5
+# capabilities that can be required by the inspectors
+CAPABILITIES = ("trace_block", "block_receipts", "batch")
 
 client = "erigon"
 
 
-def check_host(ip_address: str) -> float:
+async def rpc_request(session: aiohttp.ClientSession, url: str, payload: Any) -> Tuple[float, Any]:
     """
-    Checks the latency of the specified host by sending an RPC request to it.
+    Sends a JSON-RPC request (or batch) and returns its latency in milliseconds with the decoded response.
+    """
+    start = time.perf_counter()
+    async with session.post(url, json=payload) as response:
+        data = await response.json(content_type=None)
+    return (time.perf_counter() - start) * 1000, data
+
+
+def _call(method: str, params: List, request_id: int = 1) -> Dict:
+    return {"method": method, "params": params, "id": request_id, "jsonrpc": "2.0"}
+
+
+async def supports(session: aiohttp.ClientSession, url: str, method: str, params: List) -> bool:
+    try:
+        _, data = await rpc_request(session, url, _call(method, params))
+        return isinstance(data, dict) and "error" not in data and data.get("result") is not None
+    except Exception:
+        return False
+
+
+async def supports_batch(session: aiohttp.ClientSession, url: str) -> bool:
+    try:
+        _, data = await rpc_request(session, url, [_call("eth_blockNumber", [], 1), _call("eth_chainId", [], 2)])
+        return isinstance(data, list) and len(data) == 2 and all("result" in response for response in data)
+    except Exception:
+        return False
+
+
+async def check_host(session: aiohttp.ClientSession, ip_address: str, port: int = RPC_PORT) -> Dict:
+    """
+    Checks the latency, head block and capabilities of the specified host.
 
     Args:
+        session (aiohttp.ClientSession): The shared session.
         ip_address (str): The IP address of the host to check.
+        port (int): The JSON-RPC port of the host.
 
     Returns:
-        float: The latency of the host in microseconds, or -1 if the host is unresponsive.
+        Dict: The vitals of the host, with responsive set to False if the host is unresponsive.
     """
-    logger.info(f"{ip_address}: GET")
+    url = f"http://{ip_address}:{port}/"
+    vitals = {"ip_address": ip_address, "responsive": False, "head_block": -1,
+              **{capability: False for capability in CAPABILITIES}}
 
     try:
-        response_times = []
+        latencies = []
         for _ in range(PING_CNT):
-            r = SESSION.get(
-                f"http://{ip_address}:8545/",
-                timeout=2,
-                json={
-                    "method": "trace_block",
-                    "params": [15500000],
-                    "id": 1,
-                    "jsonrpc": "2.0"
-                },
-                headers={'Content-type': 'application/json'}
-            )
-            if 'error' in r.json():
+            latency, data = await rpc_request(session, url, _call("eth_blockNumber", []))
+            if "error" in data:
                 logger.info(f"{ip_address}: RPC Error")
-                return -1
-            response_times.append(r.elapsed.microseconds)
-        avg_latency = sum(response_times) / len(response_times)
-        logger.info(f"{ip_address}: Success")
-        return avg_latency
-
-    except ConnectTimeout:
-        logger.info(f"{ip_address}: Connect Timeout")
-        return -1
-    except ConnectionError:
+                return vitals
+            latencies.append(latency)
+            vitals["head_block"] = max(vitals["head_block"], int(data["result"], 16))
+    except asyncio.TimeoutError:
+        logger.info(f"{ip_address}: Timeout")
+        return vitals
+    except aiohttp.ClientError:
         logger.info(f"{ip_address}: Connect Error")
-        return -1
-    except ReadTimeout:
-        logger.info(f"{ip_address}: Read Timeout")
-        return -1
+        return vitals
     except Exception:
         logger.info(f"{ip_address}: Unknown Error")
-        return -1
+        return vitals
 
+    vitals["responsive"] = True
+    vitals["p50_latency_ms"], vitals["p90_latency_ms"], vitals["p99_latency_ms"] = np.percentile(latencies,
+                                                                                                 [50, 90, 99])
+    vitals["trace_block"], vitals["block_receipts"], vitals["batch"] = await asyncio.gather(
+        supports(session, url, "trace_block", [hex(PROBE_BLOCK)]),
+        supports(session, url, "eth_getBlockReceipts", [hex(PROBE_BLOCK)]),
+        supports_batch(session, url),
+    )
+    logger.info(f"{ip_address}: Success")
+    return vitals
 
-if __name__ == "__main__":
-    logger.info("Collecting hosts")
-    hosts = pd.read_csv(f"{client}_hosts.csv", names=["ip_address"], usecols=[0])
 
-    logger.info("Sorting hosts")
-    with Pool() as p:
-        hosts["avg_latency"] = p.map(check_host, hosts["ip_address"])
+async def check_hosts(ip_addresses: List[str], port: int = RPC_PORT) -> pd.DataFrame:
+    """
+    Checks all hosts concurrently, MAX_HOSTS at a time.
+    A host is only checked once it holds the semaphore, and the connector has room for every connection of the
+    checked hosts, so the latencies and the timeouts only count the requests, never a wait for a free connection.
+    """
+    semaphore = asyncio.Semaphore(MAX_HOSTS)
 
-    # remove unresponsive nodes
-    hosts.drop(hosts[hosts['avg_latency'] == -1].index, inplace=True)
+    async def check_host_bounded(session: aiohttp.ClientSession, ip_address: str) -> Dict:
+        async with semaphore:
+            return await check_host(session, ip_address, port)
 
-    # sort node addresses by response time
-    hosts.sort_values(by=["avg_latency"], inplace=True)
+    async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=REQUEST_TIMEOUT, sock_read=REQUEST_TIMEOUT),
+            connector=aiohttp.TCPConnector(limit=MAX_HOSTS * len(CAPABILITIES)),
+            headers={'Content-type': 'application/json'},
+    ) as session:
+        return pd.DataFrame(await asyncio.gather(*[check_host_bounded(session, ip_address)
+                                                   for ip_address in ip_addresses]))
 
-    hosts.drop(columns=["avg_latency"], inplace=True)
+
+def reference_head_block(hosts: pd.DataFrame) -> int:
+    """
+    Estimates the chain head from the responsive hosts, ignoring the few that may report a bogus head.
+    """
+    head_blocks = hosts.loc[hosts["responsive"], "head_block"]
+    return int(np.percentile(head_blocks, 90)) if len(head_blocks) else 0
+
+
+def set_head_lag(hosts: pd.DataFrame, reference_head: int) -> pd.DataFrame:
+    hosts = hosts.copy()
+    hosts["head_lag"] = (reference_head - hosts["head_block"]).clip(lower=0).astype(int)
+    hosts["synced"] = hosts["responsive"] & (hosts["head_lag"] <= MAX_HEAD_LAG)
+    return hosts
+
+
+def sort_hosts(hosts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Drops the unresponsive hosts and ranks the others: synced first, then by capabilities, then by median latency.
+    """
+    hosts = hosts[hosts["responsive"]].copy()
+    hosts["capability_count"] = hosts[list(CAPABILITIES)].sum(axis=1)
+    hosts.sort_values(by=["synced", "capability_count", "p50_latency_ms"], ascending=[False, False, True],
+                      inplace=True)
+    return hosts.drop(columns=["responsive", "capability_count"])
+
+
+def rank_hosts(hosts: pd.DataFrame) -> pd.DataFrame:
+    return sort_hosts(set_head_lag(hosts, reference_head_block(hosts)))
+
+
+if __name__ == "__main__":
+    logger.info("Collecting hosts")
+    hosts = pd.read_csv(f"{client}_hosts.csv", names=["ip_address"], usecols=[0])
+
+    logger.info("Checking hosts")
+    hosts = rank_hosts(asyncio.run(check_hosts(hosts["ip_address"].tolist())))
 
     logger.info("Writing to file")
+    with open(f"{client}_capabilities.csv", "w") as f:
+        hosts.to_csv(f, index=False)
+
+    # synced hosts sorted by rank, for the inspectors that only need the addresses
     with open(f"{client}_sorted_hosts.csv", "w") as f:
-        hosts.to_csv(f, index=False, header=False)
+        hosts[hosts["synced"]][["ip_address"]].to_csv(f, index=False, header=False)
 
     logger.info("Done")
@@ -0,0 +1,17 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from inspector.models.base import Base
+
+
+@pytest.fixture
+def session():
+    """
+    Session of an in-memory SQLite database with all the tables.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+    engine.dispose()
@@ -0,0 +1,28 @@
+import os
+
+from inspector.cache import BlockCache, cache_key
+
+
+def test_cache_key():
+    assert cache_key("eth_getBlockByNumber", ["0x10", True]) == "block:16:1"
+    assert cache_key("eth_getBlockByNumber", ["latest", True]) is None
+    assert cache_key("eth_blockNumber", []) is None
+
+
+def test_closed_segments_are_evicted(tmp_path):
+    # each run writes less than a segment, which is only sealed when its cache is closed
+    for run in range(4):
+        cache = BlockCache(tmp_path, max_size_bytes=4096, segment_size=1024 * 1024)
+        for i in range(2):
+            # incompressible, so each result takes about 1 kB
+            cache.put_result("eth_getBlockByNumber", [hex(run * 10 + i), True], {"data": os.urandom(512).hex()})
+        cache.close()
+
+    cache = BlockCache(tmp_path, max_size_bytes=4096, segment_size=1024 * 1024)
+    cache.put_result("eth_getBlockByNumber", [hex(40), True], {"run": 4})
+    assert cache.get_result("eth_getBlockByNumber", [hex(0), True]) is None
+    assert cache.get_result("eth_getBlockByNumber", [hex(30), True]) is not None
+    assert cache.get_result("eth_getBlockByNumber", [hex(40), True]) == {"run": 4}
+    segments = sorted(tmp_path.glob("segment_*.bin"))
+    assert sum(segment.stat().st_size for segment in segments) <= 4096 + 2048
+    cache.close()
@@ -0,0 +1,187 @@
+import random
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pytest
+
+from inspector.inspectors.block.columnar import (
+    AddressIndex,
+    build_block_batch,
+    build_transfer_batch,
+    coinbase_transfers_wei,
+    largest_contract_transactions,
+    largest_value_indices,
+    split_wei,
+    touched_contracts,
+)
+from inspector.inspectors.block.inspect_batch import check_largest_transactions
+from inspector.raw_rpc import RawBlock, RawTransaction
+
+CONTRACTS = ["0xC0000000000000000000000000000000000000A1", "0xC0000000000000000000000000000000000000A2",
+             "0xC0000000000000000000000000000000000000A3"]
+CONTRACT_A, CONTRACT_B, CONTRACT_C = (contract.lower() for contract in CONTRACTS)
+MINER = "0x00000000000000000000000000000000000000ee"
+USER = "0x0000000000000000000000000000000000000001"
+OTHER = "0x0000000000000000000000000000000000000002"
+
+
+def make_block(number: int, transactions: List[Tuple[str, str | None, int]], miner: str = MINER) -> RawBlock:
+    return RawBlock(
+        number=number,
+        hash=f"0x{number:064x}",
+        parent_hash=f"0x{number - 1:064x}",
+        miner=miner,
+        gas_used=0,
+        gas_limit=30_000_000,
+        base_fee_per_gas=None,
+        transactions=[RawTransaction(f"0x{number:032x}{i:032x}", from_address, to_address, value)
+                      for i, (from_address, to_address, value) in enumerate(transactions)],
+    )
+
+
+def scalar_check(blocks: List[RawBlock], largest_tx_values: Dict[str, int | None]) -> Tuple[Dict, List[int]]:
+    """
+    The per-transaction loop the columnar checks replaced, on exact wei values.
+    A contract with no recorded largest transaction takes its first one.
+    """
+    largest_tx_values = dict(largest_tx_values)
+    updates = {}
+    coinbase_transfers = []
+    for block in blocks:
+        coinbase_transfer = 0
+        for tx in block.transactions:
+            contract_address = None
+            if tx.to_address in largest_tx_values:
+                contract_address = tx.to_address
+            elif tx.from_address in largest_tx_values:
+                contract_address = tx.from_address
+            if contract_address is not None and (largest_tx_values[contract_address] is None
+                                                 or largest_tx_values[contract_address] < tx.value):
+                updates[contract_address] = (tx.hash, block.number, tx.value)
+                largest_tx_values[contract_address] = tx.value
+            if tx.to_address == block.miner:
+                coinbase_transfer += tx.value
+        coinbase_transfers.append(coinbase_transfer)
+    return updates, coinbase_transfers
+
+
+def columnar_check(blocks: List[RawBlock], largest_tx_values: Dict[str, int | None]) -> Tuple[Dict, List[int]]:
+    address_index = AddressIndex(CONTRACTS)
+    values = [largest_tx_values.get(contract.lower()) for contract in CONTRACTS]
+    batch = build_block_batch(blocks, address_index)
+    updates = {}
+    for contract_id, tx_index in largest_contract_transactions(batch, address_index).items():
+        value = batch.values[tx_index]
+        if values[contract_id] is not None and values[contract_id] >= value:
+            continue
+        updates[CONTRACTS[contract_id].lower()] = (batch.tx_hashes[tx_index],
+                                                   int(batch.block_numbers[batch.tx_block[tx_index]]), value)
+    return updates, coinbase_transfers_wei(batch)
+
+
+@pytest.mark.parametrize("values", [
+    [],
+    [0, 1, (1 << 64) - 1, 1 << 64, (1 << 64) + 1, (1 << 128) - 1, 3 * 10 ** 27],
+])
+def test_split_wei(values):
+    value_hi, value_lo = split_wei(values)
+    assert value_hi.dtype == value_lo.dtype == np.uint64
+    assert [(int(hi) << 64) + int(lo) for hi, lo in zip(value_hi, value_lo)] == values
+    # the (hi, lo) pairs order like the values
+    order = np.lexsort((value_lo, value_hi))
+    assert [values[i] for i in order] == sorted(values)
+
+
+def test_largest_value_indices_over_uint64():
+    values = [(1 << 64) - 1, 1 << 64, 5, (1 << 64) + 1, 7, 7]
+    groups = np.array([0, 0, 1, 0, 2, 2])
+    value_hi, value_lo = split_wei(values)
+    assert largest_value_indices(groups, value_hi, value_lo) == {0: 3, 1: 2, 2: 4}
+
+
+def test_largest_value_indices_ties_go_to_earliest():
+    groups = np.array([1, 0, 1, 0, 1])
+    value_hi, value_lo = split_wei([3, 9, 3, 9, 2])
+    assert largest_value_indices(groups, value_hi, value_lo) == {0: 1, 1: 0}
+
+
+def test_largest_value_indices_empty():
+    value_hi, value_lo = split_wei([])
+    assert largest_value_indices(np.array([], dtype=np.int64), value_hi, value_lo) == {}
+
+
+def test_recipient_contract_takes_precedence_over_sender():
+    blocks = [make_block(10, [(CONTRACT_A, CONTRACT_B, 5), (CONTRACT_A, USER, 3)])]
+    address_index = AddressIndex(CONTRACTS)
+    batch = build_block_batch(blocks, address_index)
+    assert largest_contract_transactions(batch, address_index) == {0: 1, 1: 0}
+
+
+def test_null_largest_value_accepts_first_transaction():
+    blocks = [make_block(10, [(USER, CONTRACT_A, 0)]), make_block(11, [(USER, CONTRACT_A, 0)])]
+    updates, _ = columnar_check(blocks, {CONTRACT_A: None, CONTRACT_B: None, CONTRACT_C: None})
+    assert updates == {CONTRACT_A: (blocks[0].transactions[0].hash, 10, 0)}
+    assert updates == scalar_check(blocks, {CONTRACT_A: None, CONTRACT_B: None, CONTRACT_C: None})[0]
+
+
+def test_coinbase_transfers_over_uint64():
+    blocks = [
+        make_block(10, [(USER, MINER, (1 << 64) - 1), (OTHER, MINER, 2), (USER, OTHER, 1 << 70)]),
+        make_block(11, []),
+        make_block(12, [(USER, None, 1), (USER, MINER, 4)], miner=OTHER),
+    ]
+    batch = build_block_batch(blocks, AddressIndex(CONTRACTS))
+    assert coinbase_transfers_wei(batch) == [(1 << 64) + 1, 0, 0]
+    assert coinbase_transfers_wei(batch) == scalar_check(blocks, {})[1]
+
+
+def test_miner_contract_is_touched():
+    blocks = [make_block(10, [(USER, OTHER, 1)], miner=CONTRACT_C), make_block(11, [(CONTRACT_A, USER, 1)])]
+    address_index = AddressIndex(CONTRACTS)
+    block_positions, contract_ids = touched_contracts(build_block_batch(blocks, address_index), address_index)
+    assert list(zip(block_positions.tolist(), contract_ids.tolist())) == [(0, 2), (1, 0)]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_scalar_loop(seed):
+    rng = random.Random(seed)
+    addresses = [CONTRACT_A, CONTRACT_B, CONTRACT_C, MINER, USER, OTHER]
+    # few distinct values, so that ties are common, spread over both halves of the uint64 split
+    value_choices = [0, 1, 2, (1 << 64) - 1, 1 << 64, (1 << 64) + 1, 1 << 100]
+    blocks = [
+        make_block(100 + number, [(rng.choice(addresses), rng.choice(addresses + [None]), rng.choice(value_choices))
+                                  for _ in range(rng.randrange(6))],
+                   miner=rng.choice([MINER, OTHER, CONTRACT_C]))
+        for number in range(rng.randrange(1, 6))
+    ]
+    largest_tx_values = {contract: rng.choice([None] + value_choices)
+                         for contract in (CONTRACT_A, CONTRACT_B, CONTRACT_C)}
+    assert columnar_check(blocks, largest_tx_values) == scalar_check(blocks, largest_tx_values)
+
+
+def test_check_largest_transactions_updates_values_in_place():
+    blocks = [make_block(10, [(USER, CONTRACT_A, 2 * 10 ** 18), (USER, CONTRACT_B, 10 ** 18)])]
+    address_index = AddressIndex(CONTRACTS)
+    # 10^18 + 1 wei is not representable as a float of ETH
+    largest_tx_values = [10 ** 18 + 1, None, 5 * 10 ** 17]
+    updates = check_largest_transactions(build_block_batch(blocks, address_index), address_index, largest_tx_values)
+    assert [update["contract_address"] for update in updates] == CONTRACTS[:2]
+    assert [update["largest_tx_value"] for update in updates] == [2 * 10 ** 18, 10 ** 18]
+    assert largest_tx_values == [2 * 10 ** 18, 10 ** 18, 5 * 10 ** 17]
+
+
+def test_equal_wei_value_is_not_an_update():
+    blocks = [make_block(10, [(USER, CONTRACT_A, 10 ** 18 + 1)])]
+    address_index = AddressIndex(CONTRACTS)
+    largest_tx_values = [10 ** 18 + 1, 0, 0]
+    assert check_largest_transactions(build_block_batch(blocks, address_index), address_index,
+                                      largest_tx_values) == []
+
+
+def test_transfer_batch():
+    transfers = [(10, RawTransaction("0x01", CONTRACT_A, USER, 1 << 65)),
+                 (11, RawTransaction("0x02", USER, CONTRACT_A, 3))]
+    address_index = AddressIndex(CONTRACTS)
+    batch = build_transfer_batch(transfers, address_index)
+    assert batch.block_numbers.tolist() == [10, 11]
+    assert largest_contract_transactions(batch, address_index) == {0: 0}
@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from inspector.models.crud import insert_data
+from inspector.models.token_progress.model import TokenProgress
+
+
+def test_failed_write_does_not_poison_shared_session(session):
+    async def failing_inspector():
+        with pytest.raises(IntegrityError):
+            insert_data(TokenProgress, [{"after_block": 0, "before_block": 1}] * 2, session)
+        # the error is handled after the other inspector wrote
+        await asyncio.sleep(0.05)
+
+    async def other_inspector():
+        await asyncio.sleep(0)
+        insert_data(TokenProgress, [{"after_block": 5, "before_block": 6}], session)
+
+    async def run():
+        await asyncio.gather(failing_inspector(), other_inspector())
+
+    asyncio.run(run())
+    assert session.execute(select(func.count()).select_from(TokenProgress)).scalar() == 1
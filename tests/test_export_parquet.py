@@ -0,0 +1,154 @@
+import pytest
+from sqlalchemy import delete, update
+
+from inspector.models.block.model import Block
+from inspector.models.contract_info.model import ContractInfo
+from inspector.models.crud import insert_data
+from utils.export_parquet import (
+    MANIFEST_FILE,
+    SNAPSHOT_BATCH_SIZE,
+    chunk_bounds,
+    export_range_table,
+    export_snapshot_table,
+    load_table,
+)
+
+CHUNK_BLOCKS = 100
+MINER = "0x00000000000000000000000000000000000000ee"
+
+
+def insert_blocks(session, block_numbers):
+    insert_data(Block, [{
+        "block_number": block_number,
+        "miner_address": MINER,
+        "coinbase_transfer": 0,
+        "base_fee_per_gas": 10 ** 10,
+        "gas_fee": 3 * 10 ** 16,
+        "gas_used": 15_000_000,
+        "gas_limit": 30_000_000,
+        "tx_count": 0,
+    } for block_number in block_numbers], session)
+
+
+def export(session, export_path, before_block=None, chunk_blocks=CHUNK_BLOCKS):
+    table_dir = export_path / "blocks"
+    table_dir.mkdir(parents=True, exist_ok=True)
+    return export_range_table(session.connection(), Block.__table__, table_dir, chunk_blocks, False, before_block)
+
+
+def exported_blocks(export_path, columns=("block_number",)):
+    return load_table("blocks", list(columns), export_path=export_path).to_dict("list")
+
+
+def test_chunks_split_at_partitions():
+    assert chunk_bounds(250, 100) == (200, 300)
+    assert chunk_bounds(1_000_001, 300_000) == (1_000_000, 1_200_000)
+    assert chunk_bounds(999_999, 300_000) == (900_000, 1_000_000)
+
+
+def test_late_lower_blocks_are_exported(session, tmp_path):
+    insert_blocks(session, [*range(100, 103), *range(200, 205)])
+    assert export(session, tmp_path) == 8
+    # a slower inspector stores the lower blocks after the export
+    insert_blocks(session, range(103, 110))
+    assert export(session, tmp_path) == 10
+    assert sorted(exported_blocks(tmp_path)["block_number"]) == [*range(100, 110), *range(200, 205)]
+
+
+def test_unchanged_chunks_are_not_written_again(session, tmp_path):
+    insert_blocks(session, range(100, 300))
+    assert export(session, tmp_path) == 200
+    assert export(session, tmp_path) == 0
+    insert_blocks(session, [300])
+    assert export(session, tmp_path) == 1
+
+
+def test_backfilled_attributes_are_exported(session, tmp_path):
+    insert_blocks(session, [*range(100, 110), *range(200, 210)])
+    export(session, tmp_path)
+    session.execute(update(Block).where(Block.block_number >= 200).values(tx_count=7))
+    session.commit()
+    # only the chunk of the updated blocks is written again
+    assert export(session, tmp_path) == 10
+    tx_counts = dict(zip(*exported_blocks(tmp_path, ("block_number", "tx_count")).values()))
+    assert [tx_counts[block_number] for block_number in (105, 205)] == [0, 7]
+
+
+def test_deleted_blocks_are_removed(session, tmp_path):
+    insert_blocks(session, [*range(100, 110), *range(200, 210)])
+    export(session, tmp_path)
+    # a reorg drops the last blocks, and all those of a chunk
+    session.execute(delete(Block).where(Block.block_number >= 108))
+    session.commit()
+    assert export(session, tmp_path) == 8
+    assert sorted(exported_blocks(tmp_path)["block_number"]) == list(range(100, 108))
+    assert not list((tmp_path / "blocks").rglob("part-200-300.parquet"))
+
+
+def test_replaced_blocks_are_exported(session, tmp_path):
+    insert_blocks(session, range(100, 110))
+    export(session, tmp_path)
+    # same row count after a reorg that replaced the last block
+    session.execute(delete(Block).where(Block.block_number == 109))
+    session.commit()
+    insert_blocks(session, [109])
+    assert export(session, tmp_path) == 10
+
+
+def test_before_block_exports_part_of_a_chunk(session, tmp_path):
+    insert_blocks(session, range(100, 200))
+    assert export(session, tmp_path, before_block=150) == 50
+    assert max(exported_blocks(tmp_path)["block_number"]) == 149
+    assert export(session, tmp_path) == 100
+    assert sorted(exported_blocks(tmp_path)["block_number"]) == list(range(100, 200))
+
+
+def test_other_chunk_size_needs_a_full_export(session, tmp_path):
+    insert_blocks(session, range(100, 110))
+    export(session, tmp_path)
+    with pytest.raises(ValueError):
+        export(session, tmp_path, chunk_blocks=1000)
+
+
+def test_export_without_manifest_is_written_again(session, tmp_path):
+    insert_blocks(session, range(100, 110))
+    export(session, tmp_path)
+    stale = tmp_path / "blocks" / "block_range=0" / "part-100-105.parquet"
+    stale.write_bytes(b"")
+    (tmp_path / "blocks" / MANIFEST_FILE).unlink()
+    assert export(session, tmp_path) == 10
+    assert not stale.exists()
+
+
+def insert_contracts_info(session, count):
+    insert_data(ContractInfo, [{
+        "contract_address": f"0x{i:040x}",
+        "eth_balance": i * 10 ** 15,
+    } for i in range(count)], session)
+
+
+def export_snapshot(session, export_path, batch_size=SNAPSHOT_BATCH_SIZE):
+    table_dir = export_path / "contracts_info"
+    table_dir.mkdir(parents=True, exist_ok=True)
+    return export_snapshot_table(session.connection(), ContractInfo.__table__, table_dir, batch_size=batch_size)
+
+
+def test_snapshot_is_streamed_in_batches(session, tmp_path):
+    insert_contracts_info(session, 25)
+    assert export_snapshot(session, tmp_path, batch_size=10) == 25
+    contracts_info = load_table("contracts_info", ["contract_address", "eth_balance"], export_path=tmp_path)
+    assert contracts_info["contract_address"].tolist() == [f"0x{i:040x}" for i in range(25)]
+    assert contracts_info["eth_balance"].tolist() == [i * 10 ** 15 for i in range(25)]
+    assert "updated_at" not in load_table("contracts_info", export_path=tmp_path).columns
+
+
+def test_unchanged_snapshot_is_not_written_again(session, tmp_path):
+    insert_contracts_info(session, 5)
+    assert export_snapshot(session, tmp_path) == 5
+    assert export_snapshot(session, tmp_path) == 0
+    session.execute(update(ContractInfo).where(ContractInfo.contract_address == f"0x{3:040x}")
+                    .values(eth_balance=7))
+    session.commit()
+    assert export_snapshot(session, tmp_path) == 5
+    contracts_info = load_table("contracts_info", ["eth_balance"], export_path=tmp_path)
+    assert contracts_info["eth_balance"].tolist()[3] == 7
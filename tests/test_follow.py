@@ -0,0 +1,190 @@
+import asyncio
+import socket
+
+import pytest
+from aiohttp import web
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.mock_node import MockNode, SyntheticChain, _hash
+from inspector import utils
+from inspector.inspectors.block.rollups import rebuild_rollups
+from inspector.inspectors.follow.follow import FollowInspector
+from inspector.inspectors.scan.consumers import BlockEconomicsConsumer
+from inspector.models.base import Base
+from inspector.models.block.model import Block
+from inspector.models.block_rollup.model import BlockRollup, BlockSketch, MinerRollup
+from inspector.models.contract.model import Contract
+
+FIRST_BLOCK = 16_000_000
+FORK_BLOCK = 16_000_025
+
+
+class ForkChain(SyntheticChain):
+    """
+    Chain whose blocks after fork_after are replaced by other blocks, which create no contract, once fork_after is set.
+    """
+    fork_after = None
+
+    def is_creation(self, block_number, index):
+        if self.fork_after is not None and block_number > self.fork_after:
+            return False
+        return super().is_creation(block_number, index)
+
+    def block(self, block_number, full_transactions):
+        block = super().block(block_number, full_transactions)
+        if self.fork_after is not None:
+            if block_number > self.fork_after:
+                block["hash"] = "0x" + _hash("fork", block_number)
+            if block_number - 1 > self.fork_after:
+                block["parentHash"] = "0x" + _hash("fork", block_number - 1)
+        return block
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "_logs_path", None)
+    utils.set_logs_path(tmp_path / "log")
+    engine = create_engine(f"sqlite:///{tmp_path / 'inspect.sqlite'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+    engine.dispose()
+
+
+def stored_contracts(session, before_block):
+    return session.execute(select(Contract.contract_address, Contract.block_number)
+                           .where(Contract.block_number < before_block)
+                           .order_by(Contract.contract_address)).all()
+
+
+def stored_rollups(session):
+    return [
+        [tuple(row) for row in session.execute(select(*model.__table__.columns)
+                                               .order_by(*model.__table__.primary_key.columns))]
+        for model in (BlockRollup, BlockSketch, MinerRollup)
+    ]
+
+
+async def serve(node):
+    port = free_port()
+    runner = web.AppRunner(node.application())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, f"http://127.0.0.1:{port}/"
+
+
+def follow_inspector(rpc_endpoint):
+    inspector = FollowInspector(rpc_endpoint, pool_endpoints=[rpc_endpoint], poll_interval=0.05, raw=True)
+    inspector.etherscan_client.api_url = f"{rpc_endpoint}api"
+    return inspector
+
+
+async def wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.05)
+    raise TimeoutError("the follower did not reach the expected state")
+
+
+def followed(inspector, block_number, block_hash):
+    return (block_number, block_hash) in inspector.recent_hashes
+
+
+async def follow_through_reorg(session):
+    chain = ForkChain(txs_per_block=20, creation_interval=5)
+    node = MockNode(chain, FIRST_BLOCK + 30)
+    runner, rpc_endpoint = await serve(node)
+    inspector = follow_inspector(rpc_endpoint)
+
+    task = asyncio.ensure_future(inspector.inspect_many(session, (FIRST_BLOCK, None)))
+    try:
+        await wait_for(lambda: followed(inspector, FIRST_BLOCK + 30, "0x" + _hash("block", FIRST_BLOCK + 30)))
+        rollups_before_reorg = stored_rollups(session)
+        contracts_before_reorg = stored_contracts(session, FIRST_BLOCK + 31)
+
+        # the blocks after FORK_BLOCK are replaced, and the new chain is 3 blocks longer
+        chain.fork_after = FORK_BLOCK
+        node.head_block = FIRST_BLOCK + 33
+        await wait_for(lambda: followed(inspector, FIRST_BLOCK + 33, "0x" + _hash("fork", FIRST_BLOCK + 33)))
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await runner.cleanup()
+    return inspector, rollups_before_reorg, contracts_before_reorg
+
+
+def test_follow_rolls_back_a_reorg(session):
+    inspector, rollups_before_reorg, contracts_before_reorg = asyncio.run(follow_through_reorg(session))
+
+    # the replaced blocks were dropped and followed again on the new chain
+    assert [block_hash for block_number, block_hash in inspector.recent_hashes if block_number > FORK_BLOCK] == \
+           ["0x" + _hash("fork", block_number) for block_number in range(FORK_BLOCK + 1, FIRST_BLOCK + 34)]
+    assert session.scalars(select(Block.block_number).order_by(Block.block_number)).all() == \
+           list(range(FIRST_BLOCK, FIRST_BLOCK + 34))
+    # the contracts of the dropped blocks were deleted, the new blocks create none
+    assert max(block_number for _, block_number in contracts_before_reorg) > FORK_BLOCK
+    assert stored_contracts(session, FIRST_BLOCK + 34) == \
+           [(address, block_number) for address, block_number in contracts_before_reorg if block_number <= FORK_BLOCK]
+
+    # the rollups of the dropped blocks were subtracted, and the new blocks folded in
+    rollups = stored_rollups(session)
+    assert rollups != rollups_before_reorg
+    rebuild_rollups(session, FIRST_BLOCK)
+    assert rollups == stored_rollups(session)
+
+
+async def follow_through_failure_and_reorg(session):
+    chain = ForkChain(txs_per_block=20, creation_interval=5)
+    node = MockNode(chain, FORK_BLOCK)
+    runner, rpc_endpoint = await serve(node)
+    inspector = follow_inspector(rpc_endpoint)
+    blocks_consumer = next(consumer for consumer in inspector.consumers
+                           if consumer.name == BlockEconomicsConsumer.name)
+    consume_blocks = blocks_consumer.consume_blocks
+    failures = 0
+
+    async def failing_consume_blocks(*args):
+        nonlocal failures
+        if chain.fork_after is None:
+            failures += 1
+            raise RuntimeError("no block reward yet")
+        await consume_blocks(*args)
+
+    task = asyncio.ensure_future(inspector.inspect_many(session, (FIRST_BLOCK, None)))
+    try:
+        await wait_for(lambda: followed(inspector, FORK_BLOCK, "0x" + _hash("block", FORK_BLOCK)))
+        contracts_before_failure = stored_contracts(session, FIRST_BLOCK + 31)
+
+        # the blocks consumer fails on the next batch, after the tlsc consumer stored its contracts
+        blocks_consumer.consume_blocks = failing_consume_blocks
+        node.head_block = FIRST_BLOCK + 30
+        await wait_for(lambda: failures >= 2)
+        # and the blocks of the failed batch are replaced before the retry
+        chain.fork_after = FORK_BLOCK
+        node.head_block = FIRST_BLOCK + 33
+        await wait_for(lambda: followed(inspector, FIRST_BLOCK + 33, "0x" + _hash("fork", FIRST_BLOCK + 33)))
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await runner.cleanup()
+    return contracts_before_failure
+
+
+def test_follow_retries_a_failed_batch_on_the_new_chain(session):
+    contracts_before_failure = asyncio.run(follow_through_failure_and_reorg(session))
+
+    assert session.scalars(select(Block.block_number).order_by(Block.block_number)).all() == \
+           list(range(FIRST_BLOCK, FIRST_BLOCK + 34))
+    # the contracts stored for the failed batch were deleted with it, and the new blocks create none
+    assert stored_contracts(session, FIRST_BLOCK + 34) == contracts_before_failure
+    rollups = stored_rollups(session)
+    rebuild_rollups(session, FIRST_BLOCK)
+    assert rollups == stored_rollups(session)
@@ -0,0 +1,41 @@
+import asyncio
+
+from utils import profiling
+from utils.profiling import Profiler, profile_batch
+
+
+async def sampled_wait():
+    await asyncio.sleep(0.3)
+
+
+async def unsampled_wait():
+    await asyncio.sleep(0.3)
+
+
+async def run_batch(wait):
+    with profile_batch():
+        # the waits run in child tasks, as with gather in the inspectors
+        await asyncio.gather(wait(), wait())
+
+
+async def run_batches(profiler):
+    profiler.start(asyncio.get_running_loop())
+    try:
+        await asyncio.gather(run_batch(sampled_wait), run_batch(unsampled_wait))
+    finally:
+        profiler.stop()
+
+
+def test_only_the_sampled_batches_are_profiled(monkeypatch):
+    profiler = Profiler()
+    profiler.sample_rate = 0.5
+    monkeypatch.setattr(profiling, "profiler", profiler)
+    # the first batch is sampled, the second is not
+    draws = iter([0.0, 0.9])
+    monkeypatch.setattr(profiling.random, "random", lambda: next(draws))
+    asyncio.run(run_batches(profiler))
+
+    stacks = "\n".join(profiler.stacks)
+    assert "sampled_wait" in stacks
+    assert "unsampled_wait" not in stacks
+    assert profiler.stages["batch"][0] == 1
@@ -0,0 +1,108 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from web3._utils.method_formatters import block_formatter
+
+from benchmarks.mock_node import SyntheticChain
+from inspector.raw_rpc import (
+    RPC_BATCH_SIZE,
+    RPCError,
+    RawTransaction,
+    block_from_web3,
+    decode_block,
+    decode_block_response,
+    is_range_limit_error,
+    request_many,
+)
+from inspector.utils import json_dumps
+
+
+@pytest.mark.parametrize("block_number", [16_000_000, 16_000_001, 16_000_025])
+def test_decode_block_matches_web3(block_number):
+    result = SyntheticChain(txs_per_block=30).block(block_number, full_transactions=True)
+    assert decode_block(result) == block_from_web3(block_formatter(result))
+
+
+def test_decode_block_fields():
+    result = SyntheticChain(txs_per_block=30).block(16_000_000, full_transactions=True)
+    block = decode_block(result)
+    assert block.number == 16_000_000
+    assert block.hash == result["hash"]
+    assert block.parent_hash == result["parentHash"]
+    assert block.gas_used == 21000 * 30
+    assert len(block.transactions) == 30
+    # contract creations have no recipient
+    assert any(tx.to_address is None for tx in block.transactions)
+    tx = result["transactions"][0]
+    assert block.transactions[0] == RawTransaction(tx["hash"], tx["from"], tx["to"], int(tx["value"], 16))
+
+
+def test_decode_block_before_london():
+    result = SyntheticChain(txs_per_block=2).block(12_000_000, full_transactions=True)
+    del result["baseFeePerGas"]
+    assert decode_block(result).base_fee_per_gas is None
+    assert decode_block(result) == block_from_web3(block_formatter(result))
+
+
+def test_decode_block_wei_above_uint64():
+    result = SyntheticChain(txs_per_block=1).block(16_000_000, full_transactions=True)
+    result["transactions"][0]["value"] = hex(10 ** 30)
+    assert decode_block(result).transactions[0].value == 10 ** 30
+
+
+def test_decode_missing_block():
+    with pytest.raises(RPCError):
+        decode_block(None)
+
+
+def test_decode_block_response():
+    result = SyntheticChain(txs_per_block=3).block(16_000_000, full_transactions=True)
+    payload = json_dumps({"jsonrpc": "2.0", "id": 1, "result": result})
+    assert decode_block_response(payload) == decode_block(result)
+    with pytest.raises(RPCError):
+        decode_block_response(json_dumps({"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "busy"}}))
+
+
+def test_request_many_bounds_web3_requests():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def coro_request(method, params):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0)
+        in_flight -= 1
+        return params[0]
+
+    w3 = SimpleNamespace(manager=SimpleNamespace(coro_request=coro_request))
+    calls = [("eth_getBlockByNumber", [hex(i), False]) for i in range(5 * RPC_BATCH_SIZE + 3)]
+    assert asyncio.run(request_many(w3, calls)) == [params[0] for _, params in calls]
+    assert max_in_flight == RPC_BATCH_SIZE
+
+
+@pytest.mark.parametrize("message", [
+    "query returned more than 10000 results",
+    "Log response size exceeded. You can make eth_getLogs requests with up to a 2K block range",
+    "exceed maximum block range: 5000",
+    "block range is too wide",
+    "too many results, try a smaller range",
+    "query timeout exceeded",
+])
+def test_range_limit_errors(message):
+    assert is_range_limit_error(RPCError(f"eth_getLogs failed: {{'code': -32005, 'message': '{message}'}}"))
+
+
+@pytest.mark.parametrize("message", [
+    "rate limit exceeded",
+    "Your app has exceeded its compute units per second capacity",
+    "daily request count exceeded, request rate limited",
+    "execution reverted",
+])
+def test_other_errors_are_not_range_limits(message):
+    assert not is_range_limit_error(RPCError(f"eth_getLogs failed: {{'code': 429, 'message': '{message}'}}"))
+
+
+def test_timeouts_are_range_limits():
+    assert is_range_limit_error(asyncio.TimeoutError())
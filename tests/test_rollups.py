@@ -0,0 +1,172 @@
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+from sqlalchemy import delete, select
+
+from inspector.inspectors.block.rollups import (
+    SKETCH_ACCURACY,
+    SKETCH_METRICS,
+    ZERO_BIN,
+    bin_bounds,
+    bin_value,
+    cover,
+    fold_blocks,
+    histogram,
+    quantiles,
+    rebuild_rollups,
+    sketch_bin,
+    subtract_rollups,
+    summarize,
+    top_miners,
+    write_blocks,
+)
+from inspector.models.block.model import Block
+from inspector.models.block_rollup.model import BlockRollup, BlockSketch, MinerRollup
+
+MINERS = ["0x00000000000000000000000000000000000000e1", "0x00000000000000000000000000000000000000e2"]
+
+
+def make_blocks(block_numbers, seed=0):
+    rng = random.Random(seed)
+    # amounts below 2^53, which SQLite sums exactly
+    return [{
+        "block_number": block_number,
+        "miner_address": rng.choice(MINERS),
+        "coinbase_transfer": rng.choice([0, rng.randrange(10 ** 12)]),
+        "base_fee_per_gas": rng.randrange(10 ** 9, 10 ** 11),
+        "gas_fee": rng.randrange(10 ** 12),
+        "gas_used": rng.choice([0, rng.randrange(30_000_000)]),
+        "gas_limit": 30_000_000,
+        "tx_count": rng.randrange(300),
+    } for block_number in block_numbers]
+
+
+def stored_rollups(session):
+    return [
+        [tuple(row) for row in session.execute(select(*model.__table__.columns)
+                                               .order_by(*model.__table__.primary_key.columns))]
+        for model in (BlockRollup, BlockSketch, MinerRollup)
+    ]
+
+
+@pytest.mark.parametrize("fork_block", [199_999, 200_500, 200_999, 201_000, 201_003, 201_498])
+def test_subtracted_rollups_match_rebuilt_ones(session, fork_block):
+    blocks = make_blocks(range(199_500, 201_500))
+    write_blocks(blocks, session)
+    dropped_blocks = [block for block in blocks if block["block_number"] > fork_block]
+    session.execute(delete(Block).where(Block.block_number > fork_block))
+    subtract_rollups(dropped_blocks, session)
+    session.commit()
+    subtracted = stored_rollups(session)
+
+    rebuild_rollups(session, 0)
+    session.commit()
+    assert subtracted == stored_rollups(session)
+
+
+@pytest.mark.parametrize("value", [1, 2, 7, 21_000, 15_000_000, 10 ** 9 + 7, 3 * 10 ** 16, 2 ** 64 + 1, 10 ** 26,
+                                   0.5, 1234.5678])
+def test_sketch_bins_are_accurate(value):
+    sketch_bin_index = sketch_bin(value)
+    lower, upper = bin_bounds(sketch_bin_index)
+    assert lower < value <= upper * (1 + 1e-12)
+    assert bin_value(sketch_bin_index) == pytest.approx(value, rel=SKETCH_ACCURACY)
+
+
+def test_zero_has_its_own_bin():
+    assert sketch_bin(0) == ZERO_BIN
+    assert bin_value(ZERO_BIN) == 0
+    assert bin_bounds(ZERO_BIN) == (0, 0)
+
+
+@pytest.mark.parametrize("after_block, before_block, expected", [
+    (150_500, 400_200, [(100_000, 200_000, 400_000), (1_000, 150_000, 200_000), (1_000, 400_000, 401_000)]),
+    (200_000, 400_000, [(100_000, 200_000, 400_000)]),
+    (199_999, 200_001, [(1_000, 199_000, 201_000)]),
+    (5, 6, [(1_000, 0, 1_000)]),
+    (7, 7, []),
+])
+def test_cover(after_block, before_block, expected):
+    assert cover(after_block, before_block) == expected
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_cover_tiles_the_rounded_range(seed):
+    rng = random.Random(seed)
+    after_block = rng.randrange(1_000_000)
+    before_block = after_block + rng.choice([1, rng.randrange(2_000), rng.randrange(500_000)])
+    buckets = sorted((start, bucket_size) for bucket_size, first, end in cover(after_block, before_block)
+                     for start in range(first, end, bucket_size))
+    # consecutive buckets, from the smallest bucket of the first block to the one of the last block
+    assert buckets[0][0] == after_block // 1_000 * 1_000
+    assert buckets[-1][0] + buckets[-1][1] == -(-before_block // 1_000) * 1_000
+    assert all(start + bucket_size == next_start
+               for (start, bucket_size), (next_start, _) in zip(buckets, buckets[1:]))
+    # a bucket of 100,000 blocks wherever one fits
+    assert sum(bucket_size == 1_000 for _, bucket_size in buckets) < 200
+
+
+def test_fold_blocks_matches_direct_aggregates():
+    blocks = make_blocks(range(99_000, 101_500), seed=1)
+    rollups, sketches, miners = fold_blocks(blocks)
+    for rollup in rollups:
+        bucket = [block for block in blocks if rollup["bucket_start"] <= block["block_number"]
+                  < rollup["bucket_start"] + rollup["bucket_size"]]
+        assert rollup["block_count"] == len(bucket)
+        assert rollup["empty_block_count"] == sum(block["gas_used"] == 0 for block in bucket)
+        assert rollup["tx_count"] == sum(block["tx_count"] for block in bucket)
+        assert rollup["first_block"] == bucket[0]["block_number"]
+        assert rollup["last_block"] == bucket[-1]["block_number"]
+        for attribute in ("gas_used", "base_fee_per_gas", "gas_fee"):
+            values = [block[attribute] for block in bucket]
+            assert (rollup[f"{attribute}_sum"], rollup[f"{attribute}_min"], rollup[f"{attribute}_max"]) == \
+                   (sum(values), min(values), max(values))
+        assert rollup["coinbase_transfer_sum"] == sum(block["coinbase_transfer"] for block in bucket)
+        for metric in SKETCH_METRICS:
+            assert sum(sketch["count"] for sketch in sketches if sketch["metric"] == metric
+                       and (sketch["bucket_size"], sketch["bucket_start"]) ==
+                       (rollup["bucket_size"], rollup["bucket_start"])) == \
+                   sum(SKETCH_METRICS[metric](block) is not None for block in bucket)
+        assert sum(miner["gas_fee_sum"] for miner in miners
+                   if (miner["bucket_size"], miner["bucket_start"]) == (rollup["bucket_size"], rollup["bucket_start"])) \
+               == rollup["gas_fee_sum"]
+    assert [(rollup["bucket_size"], rollup["bucket_start"]) for rollup in rollups] == \
+           [(1_000, 99_000), (1_000, 100_000), (1_000, 101_000), (100_000, 0), (100_000, 100_000)]
+
+
+@pytest.mark.parametrize("after_block, before_block", [(None, None), (199_000, 201_000), (200_000, 200_500)])
+def test_queries_match_numpy(session, after_block, before_block):
+    blocks = make_blocks(range(199_000, 202_000), seed=2)
+    for i in range(0, len(blocks), 500):
+        write_blocks(blocks[i:i + 500], session)
+    # the ends of the range are rounded outwards to 1,000 blocks
+    low = 0 if after_block is None else after_block // 1_000 * 1_000
+    high = 2 ** 31 if before_block is None else -(-before_block // 1_000) * 1_000
+    in_range = [block for block in blocks if low <= block["block_number"] < high]
+
+    for metric in ("gas_used", "gas_fee", "base_fee_per_gas", "gas_price"):
+        values = np.array([value for block in in_range if (value := SKETCH_METRICS[metric](block)) is not None],
+                          dtype=np.float64)
+        qs = [0.0, 0.1, 0.5, 0.75, 0.99, 1.0]
+        expected = np.quantile(values, qs, method="lower")
+        assert quantiles(session, metric, qs, after_block, before_block) == \
+               pytest.approx(expected.tolist(), rel=SKETCH_ACCURACY)
+        assert sum(count for _, _, count in histogram(session, metric, after_block, before_block)) == len(values)
+
+    summary = summarize(session, after_block, before_block)
+    assert summary["block_count"] == len(in_range)
+    assert summary["gas_used_sum"] == sum(block["gas_used"] for block in in_range)
+    assert summary["gas_fee_max"] == max(block["gas_fee"] for block in in_range)
+    assert summary["base_fee_per_gas_min"] == min(block["base_fee_per_gas"] for block in in_range)
+
+    empty_blocks = Counter(block["miner_address"] for block in in_range if block["gas_used"] == 0)
+    assert dict(top_miners(session, after_block, before_block)) == dict(empty_blocks)
+
+
+def test_queries_of_an_empty_range(session):
+    write_blocks(make_blocks(range(199_000, 199_010)), session)
+    assert quantiles(session, "gas_used", [0.5], 300_000, 400_000) == [None]
+    assert summarize(session, 300_000, 400_000)["block_count"] is None
+    assert top_miners(session, 300_000, 400_000) == []
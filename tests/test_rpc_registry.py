@@ -0,0 +1,48 @@
+import pandas as pd
+
+from rpc_finder.rpc_registry import BLOCK_TIME, MAX_HEAD_RAISE, MIN_REFERENCE_HOSTS, EndpointRegistryService
+
+HEAD_BLOCK = 16_000_100
+
+
+def probed_hosts(head_blocks):
+    return pd.DataFrame({
+        "ip_address": [f"10.0.0.{i}" for i in range(len(head_blocks))],
+        "responsive": True,
+        "head_block": head_blocks,
+    })
+
+
+def registry(tmp_path):
+    return EndpointRegistryService(tmp_path / "capabilities.csv", tmp_path / "hosts.txt", tmp_path / "state.csv")
+
+
+def test_large_round_sets_the_reference_head(tmp_path):
+    service = registry(tmp_path)
+    assert service.update_reference_head(probed_hosts([HEAD_BLOCK] * MIN_REFERENCE_HOSTS), 0) == HEAD_BLOCK
+    # a large round also lowers an estimate that ran ahead of the chain
+    assert service.update_reference_head(probed_hosts([HEAD_BLOCK - 3] * MIN_REFERENCE_HOSTS), 0) == HEAD_BLOCK - 3
+
+
+def test_small_round_is_carried_forward(tmp_path):
+    service = registry(tmp_path)
+    service.update_reference_head(probed_hosts([HEAD_BLOCK] * MIN_REFERENCE_HOSTS), 0)
+    # hosts that lag do not lower the estimate, which moves one block per BLOCK_TIME
+    assert service.update_reference_head(probed_hosts([HEAD_BLOCK - 50] * 3), 10 * BLOCK_TIME) == HEAD_BLOCK + 10
+    assert service.update_reference_head(probed_hosts([HEAD_BLOCK + 12]), 10 * BLOCK_TIME) == HEAD_BLOCK + 12
+
+
+def test_bogus_head_of_a_small_round_is_capped(tmp_path):
+    service = registry(tmp_path)
+    service.update_reference_head(probed_hosts([HEAD_BLOCK] * MIN_REFERENCE_HOSTS), 0)
+    assert service.update_reference_head(probed_hosts([HEAD_BLOCK, 10 ** 9]), 0) == HEAD_BLOCK + MAX_HEAD_RAISE
+    # the next full round corrects the estimate
+    assert service.update_reference_head(probed_hosts([HEAD_BLOCK + 1] * MIN_REFERENCE_HOSTS), BLOCK_TIME) == \
+           HEAD_BLOCK + 1
+
+
+def test_round_without_responsive_hosts_keeps_the_estimate(tmp_path):
+    service = registry(tmp_path)
+    service.update_reference_head(probed_hosts([HEAD_BLOCK] * MIN_REFERENCE_HOSTS), 0)
+    unresponsive = probed_hosts([0] * MIN_REFERENCE_HOSTS).assign(responsive=False)
+    assert service.update_reference_head(unresponsive, 2 * BLOCK_TIME) == HEAD_BLOCK + 2
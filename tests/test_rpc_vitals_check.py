@@ -0,0 +1,89 @@
+import asyncio
+import socket
+
+from aiohttp import web
+
+from benchmarks.mock_node import MockNode, SyntheticChain
+from rpc_finder import rpc_vitals_check
+from rpc_finder.rpc_vitals_check import check_hosts, rank_hosts
+
+HEAD_BLOCK = 16_000_100
+
+
+class NoTraceNode(MockNode):
+    def result(self, method, params):
+        if method == "trace_block":
+            raise KeyError(method)
+        return super().result(method, params)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def serve_and_check(nodes, ip_addresses):
+    """
+    Serves each node on its own loopback address, all on the same port, and checks the given addresses.
+    """
+    port = free_port()
+    runners = []
+    for ip_address, node in nodes.items():
+        runner = web.AppRunner(node.application())
+        await runner.setup()
+        await web.TCPSite(runner, ip_address, port).start()
+        runners.append(runner)
+    try:
+        return await check_hosts(ip_addresses, port)
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def test_check_and_rank_hosts():
+    chain = SyntheticChain(txs_per_block=2)
+    nodes = {
+        "127.0.0.2": MockNode(chain, HEAD_BLOCK - 100),
+        "127.0.0.3": NoTraceNode(chain, HEAD_BLOCK),
+        "127.0.0.4": MockNode(chain, HEAD_BLOCK),
+    }
+    # nothing listens on 127.0.0.5
+    hosts = asyncio.run(serve_and_check(nodes, ["127.0.0.2", "127.0.0.3", "127.0.0.4", "127.0.0.5"]))
+
+    assert hosts["responsive"].tolist() == [True, True, True, False]
+    assert hosts["head_block"].tolist() == [HEAD_BLOCK - 100, HEAD_BLOCK, HEAD_BLOCK, -1]
+    assert hosts["trace_block"].tolist() == [True, False, True, False]
+    assert hosts["block_receipts"].tolist() == [True, True, True, False]
+    assert hosts["batch"].tolist() == [True, True, True, False]
+    assert (hosts.loc[:2, "p50_latency_ms"] > 0).all()
+
+    ranked = rank_hosts(hosts)
+    # synced first, then the most capable
+    assert ranked["ip_address"].tolist() == ["127.0.0.4", "127.0.0.3", "127.0.0.2"]
+    assert ranked["synced"].tolist() == [True, True, False]
+    assert ranked["head_lag"].tolist() == [0, 0, 100]
+
+
+def test_slow_host_times_out(monkeypatch):
+    monkeypatch.setattr(rpc_vitals_check, "REQUEST_TIMEOUT", 0.2)
+    nodes = {
+        "127.0.0.2": MockNode(SyntheticChain(txs_per_block=2), HEAD_BLOCK, latency_ms=1000),
+        "127.0.0.3": MockNode(SyntheticChain(txs_per_block=2), HEAD_BLOCK),
+    }
+    hosts = asyncio.run(serve_and_check(nodes, ["127.0.0.2", "127.0.0.3"]))
+    assert hosts["responsive"].tolist() == [False, True]
+
+
+def test_latency_excludes_waiting_for_other_hosts(monkeypatch):
+    # one host checked at a time: the second one waits for the first, slow one, which must not count as latency
+    monkeypatch.setattr(rpc_vitals_check, "MAX_HOSTS", 1)
+    monkeypatch.setattr(rpc_vitals_check, "PING_CNT", 2)
+    nodes = {
+        "127.0.0.2": MockNode(SyntheticChain(txs_per_block=2), HEAD_BLOCK, latency_ms=300),
+        "127.0.0.3": MockNode(SyntheticChain(txs_per_block=2), HEAD_BLOCK),
+    }
+    hosts = asyncio.run(serve_and_check(nodes, ["127.0.0.2", "127.0.0.3"]))
+    assert hosts["responsive"].tolist() == [True, True]
+    assert hosts["p50_latency_ms"][0] >= 300
+    assert hosts["p50_latency_ms"][1] < 100
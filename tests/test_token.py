@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+
+from inspector.inspectors.block.columnar import AddressIndex
+from inspector.inspectors.token.inspect_batch import (
+    TRANSFER_TOPIC,
+    fold_transfers,
+    inspect_many_ranges,
+)
+from inspector.inspectors.token.token import get_last_inspected_block, get_next_batch
+from inspector.models.crud import insert_data
+from inspector.models.token_balance.model import TokenBalance
+from inspector.models.token_progress.model import TokenProgress
+
+TOKEN = "0x00000000000000000000000000000000000000aa"
+HOLDER = "0x00000000000000000000000000000000000000c1"
+OTHER = "0x0000000000000000000000000000000000000001"
+
+
+def fold(session, after_block, before_block):
+    insert_data(TokenProgress, [{"after_block": after_block, "before_block": before_block}], session)
+
+
+def transfer(block_number: int, from_address: str, to_address: str, value: int) -> dict:
+    return {
+        "transactionHash": f"0x{block_number:064x}",
+        "logIndex": "0x0",
+        "address": TOKEN,
+        "blockNumber": hex(block_number),
+        "topics": [TRANSFER_TOPIC, "0x" + "0" * 24 + from_address[2:], "0x" + "0" * 24 + to_address[2:]],
+        "data": hex(value),
+    }
+
+
+def test_resume_from_contiguous_ranges(session):
+    assert get_last_inspected_block(session, 0, 5000) == 0
+    # the batches of two processes, and a batch committed before the one preceding it
+    for after_block, before_block in [(0, 1000), (1000, 2000), (3000, 4000), (10_000, 11_000)]:
+        fold(session, after_block, before_block)
+    assert get_last_inspected_block(session, 0, 5000) == 2000
+    assert get_last_inspected_block(session, 500, 5000) == 2000
+    assert get_last_inspected_block(session, 3000, 5000) == 4000
+    assert get_last_inspected_block(session, 0, 1500) == 1500
+
+
+def test_next_batch_skips_folded_ranges(session):
+    for after_block, before_block in [(0, 1000), (1500, 2000), (2500, 3000)]:
+        fold(session, after_block, before_block)
+    batches = []
+    task_batch = get_next_batch(session, 0, 3200, 1000)
+    while task_batch is not None:
+        batches.append(task_batch)
+        task_batch = get_next_batch(session, task_batch[1], 3200, 1000)
+    assert batches == [(1000, 1500), (2000, 2500), (3000, 3200)]
+
+
+def test_fold_transfers():
+    address_index = AddressIndex([HOLDER])
+    changes = fold_transfers([
+        transfer(10, OTHER, HOLDER, 5),
+        transfer(11, HOLDER, OTHER, 2),
+        transfer(12, OTHER, OTHER, 7),
+    ], address_index)
+    assert changes == [{
+        "token_address": TOKEN,
+        "holder_address": HOLDER,
+        "balance": 3,
+        "inflow": 5,
+        "outflow": 2,
+        "transfer_count": 2,
+        "block_number": 11,
+    }]
+
+
+def test_fold_is_stored_with_its_range(session):
+    logs = [transfer(10, OTHER, HOLDER, 5), transfer(11, HOLDER, OTHER, 2)]
+
+    async def coro_request(method, params):
+        log_filter, = params
+        return [log for log in logs if int(log_filter["fromBlock"], 16) <= int(log["blockNumber"], 16)
+                <= int(log_filter["toBlock"], 16)]
+
+    w3 = SimpleNamespace(manager=SimpleNamespace(coro_request=coro_request))
+    # both the sender and the recipient filters return the logs, they are folded once
+    asyncio.run(inspect_many_ranges(w3, 0, 100, AddressIndex([HOLDER]), logging.getLogger(__name__), session))
+    session.rollback()
+
+    balance = session.execute(select(TokenBalance)).scalar_one()
+    assert (balance.balance, balance.inflow, balance.outflow, balance.transfer_count) == (3, 5, 2, 2)
+    assert get_next_batch(session, 0, 100, 1000) is None
@@ -0,0 +1,25 @@
+import pytest
+
+from inspector.models.types import ZERO_ADDRESS, Address, Hash
+
+ADDRESS = "0x00000000219ab540356cBB839Cbe05303d7705Fa"
+TX_HASH = "0x" + "ab" * 32
+
+
+def test_values_round_trip():
+    assert Address().process_result_value(Address().process_bind_param(ADDRESS, None), None) == ADDRESS.lower()
+    assert Hash().process_result_value(Hash().process_bind_param(TX_HASH, None), None) == TX_HASH
+    assert Address().process_bind_param(ZERO_ADDRESS, None) == bytes(20)
+    assert Address().process_bind_param(None, None) is None
+
+
+@pytest.mark.parametrize("type_, value", [
+    (Address, TX_HASH),
+    (Address, "0x0"),
+    (Address, ADDRESS[:-2]),
+    (Hash, ADDRESS),
+    (Address, bytes(32)),
+])
+def test_values_of_another_size_are_rejected(type_, value):
+    with pytest.raises(ValueError):
+        type_().process_bind_param(value, None)
@@ -0,0 +1,39 @@
+import asyncio
+import logging
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from inspector.etherscan import EtherscanClient
+from inspector.verified_contracts import fetch_verified_contracts
+
+VERIFIED = "0x00000000000000000000000000000000000000c1"
+INVALID = "0x00000000000000000000000000000000000000c2"
+NOT_VERIFIED = "0x00000000000000000000000000000000000000c3"
+
+
+async def handle_etherscan(request: web.Request) -> web.Response:
+    address = request.query["address"]
+    if address == INVALID:
+        return web.json_response({"status": "0", "message": "NOTOK", "result": "Invalid Address format"})
+    source_code = "contract C {}" if address == VERIFIED else ""
+    return web.json_response({"status": "1", "message": "OK", "result": [{
+        "SourceCode": source_code, "ContractName": "C", "CompilerVersion": "v0.8.19", "EVMVersion": "Default",
+        "Proxy": "0",
+    }]})
+
+
+def test_failed_contracts_are_skipped():
+    async def run():
+        app = web.Application()
+        app.router.add_get("/api", handle_etherscan)
+        async with TestServer(app) as server:
+            client = EtherscanClient(["key"], api_url=str(server.make_url("/api")), retries=1)
+            try:
+                return await fetch_verified_contracts([VERIFIED, INVALID, NOT_VERIFIED], client,
+                                                      logging.getLogger(__name__))
+            finally:
+                await client.close()
+
+    rows = asyncio.run(run())
+    assert [(row["contract_address"], row["verified"]) for row in rows] == [(VERIFIED, True), (NOT_VERIFIED, False)]
@@ -0,0 +1,270 @@
+import argparse
+import configparser
+import math
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+from sqlalchemy import Column, Double, Float, Integer, Numeric, Table, func, select
+from sqlalchemy.engine import Connection
+
+from inspector.models.block.model import Block
+from inspector.models.contract.model import Contract
+from inspector.models.contract_info.model import ContractInfo
+from inspector.models.partitions import PARTITION_SIZE
+from inspector.utils import json_dumps, json_loads
+from utils.db import _get_engine, get_inspect_database_uri
+
+# tables exported by block range; the others have no block key and are exported as a whole snapshot
+RANGE_TABLES = {"blocks": Block.__table__, "contracts": Contract.__table__}
+SNAPSHOT_TABLES = {"contracts_info": ContractInfo.__table__}
+# chunk start -> row count and last write time of the exported rows of each chunk of a range table,
+# or the row count and last write time of a snapshot table
+MANIFEST_FILE = "_manifest.json"
+# rows of a snapshot table read from the database and written at a time
+SNAPSHOT_BATCH_SIZE = 100_000
+
+
+def get_export_path() -> Path:
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    return Path(config['export']['export_path'])
+
+
+def arrow_type(column: Column) -> pa.DataType:
+    """
+    Parquet type of a column. Addresses and hashes are kept as the hex strings the models return.
+    """
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, (Double, Float)):
+        return pa.float64()
+    if isinstance(column.type, Numeric):
+        # wei amounts stay exact, 38 digits hold 10^20 ETH
+        return pa.decimal128(38, 0)
+    return pa.string()
+
+
+def arrow_schema(columns: List[Column]) -> pa.Schema:
+    return pa.schema([pa.field(column.name, arrow_type(column), nullable=column.nullable) for column in columns])
+
+
+def export_columns(table: Table, with_bytecode: bool) -> List[Column]:
+    # updated_at only tracks the changes to export
+    return [column for column in table.columns
+            if (with_bytecode or column.name != "bytecode") and column.name != "updated_at"]
+
+
+def to_arrow(rows: List[Tuple], schema: pa.Schema) -> pa.Table:
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.Table.from_arrays([pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                                schema=schema)
+
+
+def write_file(table: pa.Table, path: Path) -> None:
+    """
+    Writes next to the target and renames, so readers never see a partial file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # the dataset readers skip the files starting with a dot
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def read_manifest(table_dir: Path) -> Dict | None:
+    path = table_dir / MANIFEST_FILE
+    return json_loads(path.read_bytes()) if path.exists() else None
+
+
+def write_manifest(table_dir: Path, manifest: Dict) -> None:
+    tmp_path = table_dir / (MANIFEST_FILE + ".tmp")
+    tmp_path.write_bytes(json_dumps(manifest))
+    os.replace(tmp_path, table_dir / MANIFEST_FILE)
+
+
+def chunk_bounds(block_number: int, chunk_blocks: int) -> Tuple[int, int]:
+    """
+    Chunk of a block, on the chunk grid and split at the partition boundaries, so each chunk fits in one partition.
+    """
+    start = max(block_number // chunk_blocks * chunk_blocks, block_number // PARTITION_SIZE * PARTITION_SIZE)
+    end = min((block_number // chunk_blocks + 1) * chunk_blocks, (block_number // PARTITION_SIZE + 1) * PARTITION_SIZE)
+    return start, end
+
+
+def chunk_path(table_dir: Path, chunk_start: int, chunk_end: int) -> Path:
+    partition = chunk_start // PARTITION_SIZE * PARTITION_SIZE
+    return table_dir / f"block_range={partition}" / f"part-{chunk_start}-{chunk_end}.parquet"
+
+
+def chunk_states(connection: Connection, table: Table, chunk_blocks: int, before_block: int = None) -> Dict[str, Dict]:
+    """
+    Reads the state of each chunk of a table: its rows and the time of its last written row.
+    A chunk whose state differs from the exported one gained, lost or changed rows since.
+    :return: Map of chunk start to its end, row count and last write time
+    """
+    block_number = table.c.block_number
+    # the largest unit that both the chunks and the partitions are made of
+    unit = math.gcd(chunk_blocks, PARTITION_SIZE)
+    query = select(block_number // unit, func.count(), func.max(table.c.updated_at)).group_by(block_number // unit)
+    if before_block is not None:
+        query = query.where(block_number < before_block)
+
+    states: Dict[str, Dict] = {}
+    for unit_index, rows, updated_at in connection.execute(query):
+        chunk_start, chunk_end = chunk_bounds(unit_index * unit, chunk_blocks)
+        state = states.setdefault(str(chunk_start), {"end": chunk_end, "rows": 0, "updated_at": None})
+        state["rows"] += rows
+        if updated_at is not None:
+            updated_at = str(updated_at)
+            state["updated_at"] = updated_at if state["updated_at"] is None else max(state["updated_at"], updated_at)
+    return states
+
+
+def export_range_table(connection: Connection, table: Table, table_dir: Path, chunk_blocks: int,
+                       with_bytecode: bool, before_block: int = None) -> int:
+    """
+    Writes the chunks of blocks whose rows changed since the last export, one file per chunk, under a hive-style
+    block_range=<first block of the partition> directory. New blocks, blocks stored out of order by the parallel
+    inspectors, backfilled attributes and the blocks deleted by a reorg are all found by comparing the row count and
+    the last write time of each chunk with the manifest of the export. The file names only depend on the chunk,
+    and the manifest is written after each file, so an interrupted run is redone by the next one.
+    :return: The number of exported rows
+    """
+    manifest = read_manifest(table_dir)
+    if manifest is not None and manifest["chunk_blocks"] != chunk_blocks:
+        raise ValueError(f"{table.name} was exported in chunks of {manifest['chunk_blocks']} blocks, "
+                         f"export it again with -f to change them")
+    if manifest is None:
+        # files without a manifest, e.g. from an export of the former watermark layout, are written again
+        shutil.rmtree(table_dir)
+        table_dir.mkdir(parents=True)
+        manifest = {"chunk_blocks": chunk_blocks, "chunks": {}}
+    exported_chunks = manifest["chunks"]
+    states = chunk_states(connection, table, chunk_blocks, before_block)
+
+    block_number = table.c.block_number
+    columns = export_columns(table, with_bytecode)
+    schema = arrow_schema(columns)
+    exported = 0
+    for chunk_start in sorted(exported_chunks.keys() - states.keys(), key=int):
+        # all the rows of the chunk were deleted
+        chunk_path(table_dir, int(chunk_start), exported_chunks[chunk_start]["end"]).unlink(missing_ok=True)
+        del exported_chunks[chunk_start]
+        write_manifest(table_dir, manifest)
+    for chunk_start, state in sorted(states.items(), key=lambda item: int(item[0])):
+        if exported_chunks.get(chunk_start) == state:
+            continue
+        query = select(*columns).where(block_number >= int(chunk_start), block_number < state["end"])
+        if before_block is not None:
+            query = query.where(block_number < before_block)
+        rows = connection.execute(query.order_by(block_number)).all()
+        write_file(to_arrow(rows, schema), chunk_path(table_dir, int(chunk_start), state["end"]))
+        exported += len(rows)
+        exported_chunks[chunk_start] = state
+        write_manifest(table_dir, manifest)
+    return exported
+
+
+def snapshot_state(connection: Connection, table: Table) -> Dict:
+    """
+    Reads the state of a snapshot table: its rows and the time of its last written row.
+    """
+    rows, updated_at = connection.execute(select(func.count(), func.max(table.c.updated_at))).one()
+    return {"rows": rows, "updated_at": None if updated_at is None else str(updated_at)}
+
+
+def export_snapshot_table(connection: Connection, table: Table, table_dir: Path, with_bytecode: bool = False,
+                          batch_size: int = SNAPSHOT_BATCH_SIZE) -> int:
+    """
+    Replaces the snapshot of a table that is updated in place, such as the contract info, unless its row count and
+    last write time are those of the exported snapshot. The rows are streamed from the database to the file
+    in batches, so the table is never held in memory.
+    :return: The number of exported rows
+    """
+    manifest = read_manifest(table_dir)
+    state = snapshot_state(connection, table)
+    if manifest == state:
+        return 0
+
+    columns = export_columns(table, with_bytecode)
+    schema = arrow_schema(columns)
+    path = table_dir / "snapshot.parquet"
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    query = select(*columns).order_by(*table.primary_key.columns)
+    exported = 0
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+        result = connection.execution_options(yield_per=batch_size).execute(query)
+        for rows in result.partitions():
+            writer.write_table(to_arrow(rows, schema))
+            exported += len(rows)
+    os.replace(tmp_path, path)
+    write_manifest(table_dir, state)
+    return exported
+
+
+def export_tables(export_path: Path, tables: List[str], chunk_blocks: int = 100_000, with_bytecode: bool = False,
+                  before_block: int = None, full: bool = False) -> None:
+    engine = _get_engine(get_inspect_database_uri())
+    with engine.connect() as connection:
+        for name in tables:
+            table_dir = export_path / name
+            if full and table_dir.exists():
+                shutil.rmtree(table_dir)
+            table_dir.mkdir(parents=True, exist_ok=True)
+            if name in RANGE_TABLES:
+                rows = export_range_table(connection, RANGE_TABLES[name], table_dir, chunk_blocks, with_bytecode,
+                                          before_block)
+            else:
+                rows = export_snapshot_table(connection, SNAPSHOT_TABLES[name], table_dir, with_bytecode)
+            print(f"{name}: exported {rows} rows")
+    engine.dispose()
+
+
+def load_table(name: str, columns: List[str] = None, after_block: int = None, before_block: int = None,
+               export_path: Path = None) -> pd.DataFrame:
+    """
+    Loads an exported table for analysis, reading only the requested columns and the partitions of the block range.
+    :param name: Table name, e.g. blocks
+    :param columns: Columns to read (default: all)
+    :param after_block: First block to read, included
+    :param before_block: Last block to read, excluded
+    :param export_path: Export directory (default: the export path of config.ini)
+    """
+    # memory-mapped, so the column chunks that are read are paged in from the page cache without a copy
+    dataset = ds.dataset((export_path or get_export_path()) / name, format="parquet", partitioning="hive",
+                         filesystem=fs.LocalFileSystem(use_mmap=True))
+    row_filter = None
+    if name in RANGE_TABLES:
+        # the block_range conditions prune the partition directories, the block_number ones the row groups
+        if after_block is not None:
+            row_filter = (ds.field("block_range") >= after_block // PARTITION_SIZE * PARTITION_SIZE) & \
+                         (ds.field("block_number") >= after_block)
+        if before_block is not None:
+            before_filter = (ds.field("block_range") < before_block) & (ds.field("block_number") < before_block)
+            row_filter = before_filter if row_filter is None else row_filter & before_filter
+    if columns is None:
+        columns = [field for field in dataset.schema.names if field != "block_range"]
+    return dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exports the inspector tables to a Parquet dataset")
+    parser.add_argument('-t', '--tables', nargs='+', choices=[*RANGE_TABLES, *SNAPSHOT_TABLES],
+                        default=[*RANGE_TABLES, *SNAPSHOT_TABLES], help='Tables to export')
+    parser.add_argument('-cb', '--chunk-blocks', type=int, help='Blocks per exported file', default=100_000)
+    parser.add_argument('-b', '--before', type=int, default=None,
+                        help='Export only the blocks before this one, e.g. to leave out a range still being inspected')
+    parser.add_argument('-wb', '--with-bytecode', action='store_true', default=False,
+                        help='Also export the bytecode of the contracts')
+    parser.add_argument('-f', '--full', action='store_true', default=False,
+                        help='Delete the previous export and export everything again')
+    args = parser.parse_args()
+
+    export_tables(get_export_path(), args.tables, args.chunk_blocks, args.with_bytecode, args.before, args.full)
@@ -0,0 +1,162 @@
+import argparse
+from typing import List
+
+from sqlalchemy import Numeric, Table, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection
+
+from inspector.models.block.model import Block
+from inspector.models.block_rollup.model import BlockRollup, BlockSketch, MinerRollup
+from inspector.models.contract.model import Contract
+from inspector.models.contract_info.model import ContractInfo
+from inspector.models.types import FixedHex
+from inspector.models.verified_contract.model import VerifiedContract
+from utils.db import _get_engine, get_inspect_database_uri
+from utils.rebuild_rollups import rebuild_rollups
+
+MIGRATED_TABLES = (Block.__table__, Contract.__table__, ContractInfo.__table__, VerifiedContract.__table__)
+# derived from the blocks, so they are rebuilt instead of converted
+ROLLUP_TABLES = (BlockRollup.__table__, BlockSketch.__table__, MinerRollup.__table__)
+# the previous layouts stored ETH amounts, the new one stores exact wei
+WEI_PER_ETH = "1000000000000000000"
+
+
+def is_wei(column) -> bool:
+    return isinstance(column.type, Numeric) and column.type.precision == 78 and column.type.scale == 0
+
+
+def _converted_column(column) -> str:
+    """
+    SQL expression that converts a column of the old layout (strings and arbitrary-precision numbers)
+    to the type of the new layout.
+    """
+    if isinstance(column.type, FixedHex):
+        digits = f"regexp_replace({column.name}, '^0[xX]', '')"
+        return f"decode(lpad({digits}, {2 * column.type.size}, '0'), 'hex')"
+    if is_wei(column):
+        return f"round({column.name}::numeric * {WEI_PER_ETH})::numeric(78, 0)"
+    return f"{column.name}::{column.type.compile(dialect=postgresql.dialect())}"
+
+
+def column_type(connection: Connection, table_name: str, column_name: str) -> str | None:
+    """
+    :return: The stored type of a column, None if it or its table does not exist
+    """
+    return connection.execute(
+        text("SELECT data_type FROM information_schema.columns WHERE table_name = :table AND column_name = :column"),
+        {"table": table_name, "column": column_name},
+    ).scalar()
+
+
+def is_migrated(connection: Connection, table: Table) -> bool | None:
+    """
+    :return: None if the table does not exist, otherwise whether it has the new layout
+    """
+    hex_column = next(column for column in table.columns if isinstance(column.type, FixedHex))
+    data_type = column_type(connection, table.name, hex_column.name)
+    return None if data_type is None else data_type == "bytea"
+
+
+def migrate_amounts(connection: Connection, table: Table) -> List[str]:
+    """
+    Converts the ETH amounts of a table that already has the binary layout, which kept them as doubles, to wei.
+    :return: The converted columns
+    """
+    converted = []
+    for column in table.columns:
+        if is_wei(column) and column_type(connection, table.name, column.name) == "double precision":
+            connection.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE numeric(78, 0) "
+                                    f"USING {_converted_column(column)}"))
+            converted.append(column.name)
+    return converted
+
+
+def add_columns(connection: Connection, table: Table) -> List[str]:
+    """
+    Adds the nullable columns that a table with the binary layout does not have yet, e.g. updated_at.
+    The existing rows are left NULL, so the table is not rewritten.
+    :return: The added columns
+    """
+    added = []
+    for column in table.columns:
+        if column.nullable and column_type(connection, table.name, column.name) is None:
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                                    f"{column.type.compile(dialect=postgresql.dialect())}"))
+            added.append(column.name)
+    return added
+
+
+def reset_rollups(connection: Connection) -> bool:
+    """
+    Drops the rollups of ETH amounts, whose sketch bins do not convert to wei, so they can be rebuilt.
+    :return: Whether the rollups were dropped
+    """
+    if column_type(connection, BlockRollup.__tablename__, "gas_fee_sum") != "double precision":
+        return False
+    for table in ROLLUP_TABLES:
+        table.drop(connection)
+        table.create(connection)
+    return True
+
+
+def migrate_table(connection: Connection, table: Table, keep_old: bool) -> int:
+    """
+    Moves the rows of a table to its new layout within one transaction: the old table is renamed,
+    the new one is created with its partitions and indexes, and the rows are converted in a single INSERT ... SELECT.
+    :return: The number of migrated rows
+    """
+    old_name = f"{table.name}_old"
+    connection.execute(text(f"ALTER TABLE {table.name} RENAME TO {old_name}"))
+    # index names share the namespace of the tables
+    connection.execute(text(f"ALTER INDEX IF EXISTS {table.name}_pkey RENAME TO {old_name}_pkey"))
+    table.create(connection)
+    # the columns added since, such as updated_at, are left NULL
+    old_columns = [column for column in table.columns if column_type(connection, old_name, column.name) is not None]
+    names = ", ".join(column.name for column in old_columns)
+    conversions = ", ".join(_converted_column(column) for column in old_columns)
+    rows = connection.execute(text(f"INSERT INTO {table.name} ({names}) SELECT {conversions} FROM {old_name}")).rowcount
+    if not keep_old:
+        connection.execute(text(f"DROP TABLE {old_name}"))
+    connection.execute(text(f"ANALYZE {table.name}"))
+    return rows
+
+
+def migrate_storage(keep_old: bool = False) -> None:
+    """
+    Migrates the blocks, contracts, contracts_info and verified_contracts tables to the partitioned
+    and compactly typed layout, with the ETH amounts converted to wei. The amounts keep the precision they were
+    stored with. The rollups of ETH amounts are rebuilt from the converted blocks.
+    Tables that are already migrated or do not exist yet are skipped, so it can be run again.
+    The inspectors must be stopped, and the database needs room for a second copy of the largest table.
+    """
+    engine = _get_engine(get_inspect_database_uri())
+    for table in MIGRATED_TABLES:
+        with engine.begin() as connection:
+            migrated = is_migrated(connection, table)
+            if migrated is None:
+                print(f"{table.name}: does not exist, it will be created with the new layout")
+                continue
+            if migrated:
+                added, converted = add_columns(connection, table), migrate_amounts(connection, table)
+                if added:
+                    print(f"{table.name}: added {added}")
+                if converted:
+                    print(f"{table.name}: converted {converted} to wei")
+                if not added and not converted:
+                    print(f"{table.name}: already migrated")
+                continue
+            print(f"{table.name}: migrated {migrate_table(connection, table, keep_old)} rows")
+    with engine.begin() as connection:
+        rebuild = reset_rollups(connection)
+    engine.dispose()
+    if rebuild:
+        print("Rollups: rebuilding from the blocks in wei")
+        rebuild_rollups()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrates the inspector tables to the partitioned storage layout")
+    parser.add_argument('-k', '--keep-old', action='store_true', default=False,
+                        help='Keep the old tables as <table>_old instead of dropping them')
+    args = parser.parse_args()
+    migrate_storage(args.keep_old)
@@ -0,0 +1,273 @@
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Awaitable, Dict, List
+
+from inspector.utils import json_dumps, json_loads
+
+# seconds between two stack samples
+SAMPLE_INTERVAL = 0.01
+STAGES_SUFFIX = ".stages.json"
+FOLDED_SUFFIX = ".folded"
+
+# whether the batch of the current task is profiled
+_sampled: ContextVar[bool] = ContextVar("sampled", default=False)
+
+
+class Profiler:
+    """
+    Per-process profiler. A fraction of the batches is sampled: inside them, stage spans are timed,
+    and a background thread samples the stacks of the main thread and of the suspended asyncio tasks of these batches,
+    so time spent waiting on the network shows up next to the CPU-bound stages.
+    Nothing is recorded outside the sampled batches, so it can be left on in production at a low rate.
+    """
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.profile_dir: Path | None = None
+        self.name = ""
+        # stage -> [count, total seconds, max seconds]
+        self.stages: Dict[str, List[float]] = {}
+        self.stacks: Counter = Counter()
+        self.active_batches = 0
+        # tasks created inside the sampled batches, whose await stacks are sampled
+        self.sampled_tasks: weakref.WeakSet = weakref.WeakSet()
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._main_thread_id = None
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def record(self, stage: str, seconds: float) -> None:
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+
+    def start(self, loop: asyncio.AbstractEventLoop = None) -> None:
+        self.loop = loop
+        if loop is not None:
+            loop.set_task_factory(_sampled_task_factory(loop.get_task_factory()))
+        self._main_thread_id = threading.main_thread().ident
+        if self._sampler is None:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+
+    def _sample(self) -> None:
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            if self.active_batches <= 0:
+                continue
+            # the tasks of the batches that are not sampled are left out, on the main thread too
+            running_task = asyncio.current_task(self.loop) if self.loop is not None else None
+            frame = sys._current_frames().get(self._main_thread_id)
+            if frame is not None and (running_task is None or running_task in self.sampled_tasks):
+                stack = _folded_stack(frame)
+                # the event loop waiting in select means that every task is waiting on I/O
+                self.stacks["<loop idle>" if "select" in stack.rsplit(";", 1)[-1] else stack] += 1
+            if self.loop is not None:
+                try:
+                    tasks = list(self.sampled_tasks)
+                except RuntimeError:
+                    continue
+                for task in tasks:
+                    if task.done():
+                        continue
+                    stack = _await_stack(task.get_coro())
+                    if stack:
+                        self.stacks["<await>;" + stack] += 1
+
+    def stop(self) -> None:
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def write(self) -> None:
+        """
+        Writes the stage timings and the folded stacks (flamegraph.pl / speedscope format) of this process.
+        """
+        self.stop()
+        if self.profile_dir is None:
+            return
+        prefix = self.profile_dir / f"{self.name}_{os.getpid()}"
+        prefix.with_name(prefix.name + STAGES_SUFFIX).write_bytes(json_dumps(self.stages))
+        with open(prefix.with_name(prefix.name + FOLDED_SUFFIX), "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+profiler = Profiler()
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _folded_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _await_stack(coro) -> str:
+    names = []
+    while coro is not None and hasattr(coro, "cr_code"):
+        names.append(_frame_name(coro.cr_code))
+        coro = coro.cr_await
+    return ";".join(names)
+
+
+def _sampled_task_factory(task_factory):
+    """
+    Wraps the task factory of a loop to tag the tasks created inside a sampled batch, which inherit its context.
+    """
+    def create_task(loop, coro, **kwargs):
+        if task_factory is not None:
+            task = task_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        if _sampled.get():
+            profiler.sampled_tasks.add(task)
+        return task
+
+    return create_task
+
+
+def configure_profiler(sample_rate: float, profile_dir: Path, name: str) -> None:
+    """
+    Enables the profiler of the current process (and of the processes forked from it).
+    :param sample_rate: Fraction of the batches to profile, in (0, 1]
+    :param profile_dir: Directory of the per-process artifacts
+    :param name: Prefix of the artifacts
+    """
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    profiler.sample_rate = sample_rate
+    profiler.profile_dir = profile_dir
+    profiler.name = name
+
+
+def _current_task() -> asyncio.Task | None:
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+@contextmanager
+def profile_batch():
+    """
+    Marks a batch, which is profiled with probability sample_rate.
+    """
+    if not profiler.enabled or random.random() >= profiler.sample_rate:
+        yield
+        return
+    token = _sampled.set(True)
+    # the task running the batch, untagged after it when it runs other batches, None outside a loop (the analyzers)
+    task = _current_task()
+    tagged = task is not None and task not in profiler.sampled_tasks
+    if tagged:
+        profiler.sampled_tasks.add(task)
+    profiler.active_batches += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.record("batch", time.perf_counter() - start)
+        profiler.active_batches -= 1
+        if tagged:
+            profiler.sampled_tasks.discard(task)
+        _sampled.reset(token)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Times a pipeline stage of the current batch if it is profiled. Spans are inclusive,
+    and spans of concurrent tasks overlap, so the stage totals can exceed the wall time.
+    """
+    if not _sampled.get():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.record(stage, time.perf_counter() - start)
+
+
+async def run_profiled(awaitable: Awaitable):
+    """
+    Awaits with the sampler attached to the running event loop, and writes the artifacts at exit.
+    """
+    if not profiler.enabled:
+        return await awaitable
+    profiler.start(asyncio.get_running_loop())
+    try:
+        return await awaitable
+    finally:
+        profiler.write()
+
+
+def clear_profiles(profile_dir: Path) -> None:
+    for path in profile_dir.glob("*"):
+        if path.is_file():
+            path.unlink()
+
+
+def write_report(profile_dir: Path) -> Path:
+    """
+    Merges the artifacts of all the processes into a stage breakdown report and a single folded stacks file.
+    :return: The path of the report
+    """
+    stages: Dict[str, List[float]] = {}
+    for path in profile_dir.glob(f"*{STAGES_SUFFIX}"):
+        for stage, (count, total, longest) in json_loads(path.read_bytes()).items():
+            merged = stages.setdefault(stage, [0, 0.0, 0.0])
+            merged[0] += count
+            merged[1] += total
+            merged[2] = max(merged[2], longest)
+
+    stacks: Counter = Counter()
+    for path in profile_dir.glob(f"*{FOLDED_SUFFIX}"):
+        if path.name == "merged" + FOLDED_SUFFIX:
+            continue
+        with open(path) as f:
+            for line in f:
+                stack, count = line.rstrip("\n").rsplit(" ", 1)
+                stacks[stack] += int(count)
+    with open(profile_dir / ("merged" + FOLDED_SUFFIX), "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+    batch_total = stages.get("batch", [0, 0.0, 0.0])[1] or 1.0
+    report_path = profile_dir / "stage_report.txt"
+    with open(report_path, "w") as f:
+        f.write(f"{'stage':<40}{'count':>10}{'total s':>12}{'mean ms':>12}{'max ms':>12}{'of batch':>10}\n")
+        for stage, (count, total, longest) in sorted(stages.items(), key=lambda item: -item[1][1]):
+            f.write(f"{stage:<40}{count:>10}{total:>12.2f}{total / count * 1000:>12.2f}{longest * 1000:>12.2f}"
+                    f"{total / batch_total:>10.1%}\n")
+        sample_total = sum(stacks.values())
+        if sample_total:
+            f.write(f"\nmost sampled stacks (leaf frame, share of {sample_total} samples)\n")
+            leaves: Counter = Counter()
+            for stack, count in stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            for leaf, count in leaves.most_common(20):
+                f.write(f"{count / sample_total:>7.1%}  {leaf}\n")
+    return report_path
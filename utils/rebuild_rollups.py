@@ -0,0 +1,39 @@
+import argparse
+
+from sqlalchemy import func, select
+
+from inspector.inspectors.block.rollups import BUCKET_SIZES, rebuild_rollups as rebuild_bucket_rollups
+from inspector.models.block.model import Block
+from utils.db import get_inspect_session
+
+
+def rebuild_rollups(after_block: int = None, before_block: int = None) -> None:
+    """
+    Rebuilds the rollups of a block range from the blocks table, e.g. after backfilling block attributes.
+    The range is rounded outwards to the largest bucket size, and each largest bucket is replaced in its own
+    transaction, so the inspectors can keep writing other blocks meanwhile.
+    """
+    chunk_size = max(BUCKET_SIZES)
+    inspect_db_session = get_inspect_session()
+    first_block, last_block = inspect_db_session.execute(
+        select(func.min(Block.block_number), func.max(Block.block_number))).one()
+    if first_block is None:
+        print("No blocks")
+        return
+    start = max(first_block, after_block or 0) // chunk_size * chunk_size
+    end = min(last_block + 1, before_block or last_block + 1)
+
+    for chunk_start in range(start, end, chunk_size):
+        chunk_end = chunk_start + chunk_size
+        blocks = rebuild_bucket_rollups(inspect_db_session, chunk_start, chunk_end)
+        inspect_db_session.commit()
+        print(f"Blocks {chunk_start} to {chunk_end}: {blocks} blocks")
+    inspect_db_session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuilds the block rollups from the blocks table")
+    parser.add_argument('-a', '--after', type=int, default=None, help='First block (default: the first stored block)')
+    parser.add_argument('-b', '--before', type=int, default=None, help='Last block, excluded (default: all blocks)')
+    args = parser.parse_args()
+    rebuild_rollups(args.after, args.before)